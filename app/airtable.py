@@ -1,58 +1,344 @@
-"""Asset acquisition helpers."""
+"""Airtable post log with a durable outbox and batched, rate-limited writes."""
 
 from __future__ import annotations
 
+import json
 import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
 
-import requests
+from .config import AirtableConfig, AppConfig
+from .http_client import HttpClient, shared_client
+from .metrics import REGISTRY, RunRecord
 
 logger = logging.getLogger(__name__)
 
+# Airtable accepts at most 10 records per create request.
+MAX_BATCH = 10
+# Lease on claimed rows so two processes sharing the outbox never send the same row.
+CLAIM_SECONDS = 120
+SENT_RETENTION_SECONDS = 7 * 86400
 
-def download_pexels_videos(api_key: str, target_dir: Path, query: str = "motivation", count: int = 5) -> List[Path]:
-    if not api_key:
-        return []
-    target_dir.mkdir(parents=True, exist_ok=True)
-
-    headers = {"Authorization": api_key}
-    params = {"query": query, "orientation": "portrait", "per_page": count}
-
-    try:
-        response = requests.get("https://api.pexels.com/videos/search", headers=headers, params=params, timeout=20)
-        response.raise_for_status()
-    except Exception as exc:
-        logger.error("Failed to fetch Pexels videos: %s", exc)
-        return []
-
-    data = response.json().get("videos", [])
-    downloaded: List[Path] = []
-
-    for video in data:
-        video_id = video.get("id")
-        files = video.get("video_files", [])
-        if not files or video_id is None:
-            continue
-        portrait_files = [f for f in files if (f.get("height") or 0) >= 1280]
-        selected = portrait_files[0] if portrait_files else files[0]
-        url = selected.get("link")
-        if not url:
-            continue
-        output_path = target_dir / f"pexels_{video_id}.mp4"
-        if output_path.exists():
-            downloaded.append(output_path)
-            continue
+
+class AirtableError(Exception):
+    def __init__(self, message: str, retryable: bool, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AirtableClient:
+    """Minimal Airtable REST client for creating records."""
+
+    def __init__(self, settings: AirtableConfig, timeout: float = 20, http: Optional[HttpClient] = None):
+        self.settings = settings
+        self.timeout = timeout
+        self.http = http or shared_client()
+
+    @property
+    def table_url(self) -> str:
+        return f"{self.settings.api_url}/{self.settings.base_id}/{quote(self.settings.table_name or '', safe='')}"
+
+    def create_records(self, records: Sequence[Dict[str, Any]]) -> List[str]:
+        import requests
+
+        try:
+            # No retries here: failed rows stay in the outbox and are retried
+            # later instead of holding up the flush thread.
+            response = self.http.post(
+                self.table_url,
+                headers={"Authorization": f"Bearer {self.settings.api_key}"},
+                json={"records": [{"fields": fields} for fields in records], "typecast": True},
+                timeout=self.timeout,
+                retries=0,
+            )
+        except requests.RequestException as exc:
+            raise AirtableError(f"request failed: {exc}", retryable=True) from exc
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise AirtableError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                retryable=True,
+                # Airtable asks clients to back off for 30 seconds after a 429.
+                retry_after=float(retry_after) if retry_after else (30.0 if response.status_code == 429 else None),
+            )
+        if response.status_code >= 400:
+            raise AirtableError(f"HTTP {response.status_code}: {response.text[:500]}", retryable=False)
+        return [record.get("id", "") for record in response.json().get("records", [])]
+
+
+class AirtableOutbox:
+    """SQLite outbox of rows waiting to be written to Airtable.
+
+    Rows move ``pending -> sent`` or, once ``max_attempts`` is used up or
+    Airtable rejects them, ``dead``. Like the job queue, it keeps the rollback
+    journal so the file can live on a network volume.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fields TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_until REAL,
+                    record_id TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add(self, fields: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (fields, next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(fields, default=str), now, now, now),
+            )
+            return int(cursor.lastrowid)
+
+    def claim(self, limit: int) -> List[Tuple[int, Dict[str, Any], int]]:
+        """Claim up to ``limit`` due rows as ``(id, fields, attempts)``."""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, fields, attempts FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                  AND (claimed_until IS NULL OR claimed_until < ?)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_until = ?, updated_at = ? WHERE id = ?",
+                [(now + CLAIM_SECONDS, now, row["id"]) for row in rows],
+            )
+        return [(row["id"], json.loads(row["fields"]), row["attempts"]) for row in rows]
+
+    def mark_sent(self, ids: Sequence[int], record_ids: Sequence[str]) -> None:
+        now = time.time()
+        record_ids = list(record_ids) + [None] * (len(ids) - len(record_ids))
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', record_id = ?, claimed_until = NULL, updated_at = ? WHERE id = ?",
+                [(record_id, now, row_id) for row_id, record_id in zip(ids, record_ids)],
+            )
+            conn.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?", (now - SENT_RETENTION_SECONDS,)
+            )
+
+    def mark_failed(self, ids: Sequence[int], error: str, delay: float, max_attempts: int, dead: bool = False) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                UPDATE outbox SET attempts = attempts + 1,
+                    status = CASE WHEN ? OR attempts + 1 >= ? THEN 'dead' ELSE 'pending' END,
+                    next_attempt_at = ?, claimed_until = NULL, last_error = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                [(int(dead), max_attempts, now + delay, error[:2000], now, row_id) for row_id in ids],
+            )
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+def post_fields(record: RunRecord, post: Dict[str, Any]) -> Dict[str, Any]:
+    """Airtable row for one run: content, assets, stage timings and upload status."""
+    stages = {name: round(seconds, 3) for name, seconds in record.stages.items()}
+    inline = post.get("inline_images") or []
+    return {
+        "Run ID": record.run_id,
+        "Account": record.account,
+        "Started At": record.started_at,
+        "Finished At": record.finished_at,
+        "Status": record.status,
+        "Quote": post.get("quote", ""),
+        "Caption": post.get("caption", ""),
+        "Background": Path(post["background"]).name if post.get("background") else "",
+        "Music": Path(post["music"]).name if post.get("music") else "",
+        "Featured Image": Path(post["featured_image"]).name if post.get("featured_image") else "",
+        "Inline Images": ", ".join(Path(path).name for path in inline),
+        "Output": str(post.get("output") or ""),
+        "Render Seconds": stages.get("render"),
+        "Upload Seconds": stages.get("upload"),
+        "Total Seconds": stages.get("total"),
+        "Stage Timings": json.dumps(stages),
+    }
+
+
+class AirtableSync:
+    """Queues post rows locally and flushes them to Airtable on a background thread.
+
+    :meth:`record_post` only writes to the outbox, so posting never waits on
+    Airtable. Rows that are not flushed before the process exits are sent by
+    the next process that uses the same outbox.
+    """
+
+    def __init__(self, config: AppConfig, client: Optional[AirtableClient] = None):
+        self.config = config
+        self.outbox = AirtableOutbox(config.paths.base_dir / "airtable_outbox.db")
+        self.client = client
+        self._bucket: Optional[TokenBucket] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> AirtableConfig:
+        # Read through the shared config so hot-reloaded settings apply.
+        return self.config.airtable
+
+    def _client(self) -> AirtableClient:
+        if self.client is None or self.client.settings is not self.settings:
+            self.client = AirtableClient(self.settings)
+        return self.client
+
+    def _limiter(self) -> TokenBucket:
+        rate = self.settings.requests_per_second
+        if self._bucket is None or self._bucket.rate != rate:
+            self._bucket = TokenBucket(rate)
+        return self._bucket
+
+    def record_post(self, record: RunRecord, post: Dict[str, Any]) -> None:
+        if not self.settings.configured:
+            return
         try:
-            logger.info("Downloading Pexels video %s", video_id)
-            file_bytes = requests.get(url, timeout=60)
-            file_bytes.raise_for_status()
-            output_path.write_bytes(file_bytes.content)
-            downloaded.append(output_path)
+            self.outbox.add(post_fields(record, post))
         except Exception as exc:
-            logger.warning("Unable to download Pexels video %s: %s", video_id, exc)
+            logger.warning("Unable to queue Airtable row for run %s: %s", record.run_id, exc)
+            return
+        self.start()
+        self._wake.set()
+
+    def flush(self, max_batches: Optional[int] = None) -> int:
+        """Send due rows in batches of up to 10; returns the number of rows sent."""
+        if not self.settings.configured:
+            return 0
+        sent = 0
+        batches = 0
+        with self._lock:
+            while max_batches is None or batches < max_batches:
+                rows = self.outbox.claim(MAX_BATCH)
+                if not rows:
+                    break
+                batches += 1
+                sent += self._send(rows)
+        return sent
+
+    def _send(self, rows: List[Tuple[int, Dict[str, Any], int]]) -> int:
+        ids = [row_id for row_id, _, _ in rows]
+        self._limiter().acquire()
+        try:
+            record_ids = self._client().create_records([fields for _, fields, _ in rows])
+        except AirtableError as exc:
+            REGISTRY.inc("airtable_requests_total", result="retry" if exc.retryable else "rejected")
+            if not exc.retryable and len(rows) > 1:
+                # One bad row rejects the whole batch; resend individually so
+                # only the offending row is dropped.
+                return sum(self._send([row]) for row in rows)
+            attempts = max(attempts for _, _, attempts in rows)
+            delay = exc.retry_after if exc.retry_after is not None else min(600.0, 2.0 ** (attempts + 1))
+            if exc.retryable:
+                logger.warning("Airtable write of %s row(s) failed (%s); retrying in %.0fs.", len(rows), exc, delay)
+            else:
+                logger.error("Airtable rejected row %s (%s); dropping it.", ids[0], exc)
+            self.outbox.mark_failed(ids, str(exc), delay, self.settings.max_attempts, dead=not exc.retryable)
+            return 0
+        REGISTRY.inc("airtable_requests_total", result="ok")
+        REGISTRY.inc("airtable_rows_sent_total", len(ids))
+        self.outbox.mark_sent(ids, record_ids)
+        return len(ids)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="airtable-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = False) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if flush:
+            self.flush()
 
-    return downloaded
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.exception("Airtable flush failed: %s", exc)
+            self._wake.wait(self.settings.flush_interval_seconds)
+            self._wake.clear()
 
 
-__all__ = ["download_pexels_videos"]
+__all__ = ["AirtableClient", "AirtableError", "AirtableOutbox", "AirtableSync", "TokenBucket", "post_fields"]
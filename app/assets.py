@@ -4,23 +4,34 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-import requests
+from .http_client import HttpClient, shared_client
 
 logger = logging.getLogger(__name__)
 
+PEXELS_API_URL = "https://api.pexels.com"
 
-def download_pexels_videos(api_key: str, target_dir: Path, query: str = "motivation", count: int = 5) -> List[Path]:
+
+def download_pexels_videos(
+    api_key: str,
+    target_dir: Path,
+    query: str = "motivation",
+    count: int = 5,
+    page: int = 1,
+    client: Optional[HttpClient] = None,
+    api_url: str = PEXELS_API_URL,
+) -> List[Path]:
     if not api_key:
         return []
+    client = client or shared_client()
     target_dir.mkdir(parents=True, exist_ok=True)
 
     headers = {"Authorization": api_key}
-    params = {"query": query, "orientation": "portrait", "per_page": count}
+    params = {"query": query, "orientation": "portrait", "per_page": count, "page": page}
 
     try:
-        response = requests.get("https://api.pexels.com/videos/search", headers=headers, params=params, timeout=20)
+        response = client.get(f"{api_url}/videos/search", headers=headers, params=params, timeout=20, cache=True)
         response.raise_for_status()
     except Exception as exc:
         logger.error("Failed to fetch Pexels videos: %s", exc)
@@ -45,9 +56,8 @@ def download_pexels_videos(api_key: str, target_dir: Path, query: str = "motivat
             continue
         try:
             logger.info("Downloading Pexels video %s", video_id)
-            file_bytes = requests.get(url, timeout=60)
-            file_bytes.raise_for_status()
-            output_path.write_bytes(file_bytes.content)
+            # Streams to a temporary name first so pick_background never sees a partial clip.
+            client.download(url, output_path, timeout=60)
             downloaded.append(output_path)
         except Exception as exc:
             logger.warning("Unable to download Pexels video %s: %s", video_id, exc)
@@ -6,8 +6,6 @@ import logging
 from dataclasses import dataclass
 from typing import Dict, Optional
 
-from openai import OpenAI
-
 from .config import AppConfig
 
 logger = logging.getLogger(__name__)
@@ -34,9 +32,17 @@ class OpenAIClient:
         self._config = config
         if not config.openai_api_key:
             raise ValueError("OPENAI_API_KEY is required for OpenAIClient")
-        self._client = OpenAI(api_key=config.openai_api_key)
+        self._client = None
         self._usage = OpenAIUsage()
 
+    def _get_client(self):
+        # The openai package is heavy to import; only load it when generating.
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=self._config.openai_api_key, base_url=self._config.openai_base_url)
+        return self._client
+
     @property
     def usage(self) -> OpenAIUsage:
         return self._usage
@@ -57,7 +63,7 @@ class OpenAIClient:
             return None
 
         try:
-            response = self._client.responses.create(
+            response = self._get_client().responses.create(
                 model=self._config.openai_model,
                 input=prompt,
                 max_output_tokens=self._config.openai_max_tokens,
@@ -0,0 +1,318 @@
+"""Benchmark suite for the render hot path and state bookkeeping."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import AppConfig, load_config
+from .fonts import bundled_font
+from .state import PostHistory, StateManager
+from .synthetic import DEFAULT_BACKGROUNDS, LONG_QUOTE, SHORT_QUOTE, SyntheticAssets, generate_assets
+from .upload import UploadRecord, UploadRegistry, VideoUploader
+
+logger = logging.getLogger(__name__)
+
+BENCH_FONT_FAMILY = "DejaVu Sans"
+BENCH_FONT_WEIGHT = "400"
+
+
+@dataclass
+class BenchResult:
+    name: str
+    samples: List[float]
+    extra: Dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "repeats": len(self.samples),
+            "min": min(self.samples),
+            "median": statistics.median(self.samples),
+            "mean": statistics.fmean(self.samples),
+            "samples": self.samples,
+            **self.extra,
+        }
+
+
+def _measure(fn: Callable[[], object], repeats: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_config(root: Path) -> AppConfig:
+    """An offline config rooted at ``root`` with a pre-seeded font (no network I/O)."""
+    base = load_config()
+    paths = dataclasses.replace(
+        base.paths,
+        base_dir=root,
+        assets_dir=root / "assets",
+        videos_dir=root / "videos",
+        music_dir=root / "music",
+        fonts_dir=root / "fonts",
+        featured_images_dir=root / "featured",
+        inline_images_dir=root / "inline",
+        output_dir=root / "output",
+        logs_dir=root / "logs",
+        backups_dir=root / "backups",
+        state_file=root / "state.json",
+        http_cache_dir=root / "http_cache",
+        frame_cache_dir=root / "frame_cache",
+        clip_analysis_file=root / "background_analysis.json",
+        templates_dir=root / "templates",
+    )
+    font = bundled_font()
+    seeded = paths.fonts_dir / f"{BENCH_FONT_FAMILY.replace(' ', '_')}_{BENCH_FONT_WEIGHT}.ttf"
+    if font and not seeded.exists():
+        seeded.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(font, seeded)
+    return dataclasses.replace(
+        base,
+        paths=paths,
+        openai_api_key=None,
+        tiktok_session_id=None,
+        google_font_family=BENCH_FONT_FAMILY,
+        google_font_weight=BENCH_FONT_WEIGHT,
+        replenish=dataclasses.replace(base.replenish, enabled=False),
+        frame_cache_mb=0,
+        video_template="default",
+    )
+
+
+def _bench_rendering(
+    config: AppConfig, assets: SyntheticAssets, repeats: int, render_repeats: int
+) -> List[BenchResult]:
+    from moviepy.editor import VideoFileClip
+
+    from .video_processor import RENDER_FPS, VideoProcessor
+    from .video_templates import compile_plan
+
+    processor = VideoProcessor(config)
+    results: List[BenchResult] = []
+    template = processor.template()
+
+    # Resolving the layout to pixels: compiled from the template versus the cached plan.
+    for label, compile_fn in (("compiled", compile_plan.__wrapped__), ("cached", compile_plan)):
+
+        def plans() -> None:
+            for _ in range(1000):
+                compile_fn(template, (1080, 1920), 15.0, True, len(assets.inline))
+
+        results.append(BenchResult(f"template_plan.{label}", _measure(plans, repeats), extra={"calls": 1000}))
+
+    plan = processor.render_plan(template, 1080, 1920, 15, assets.featured[0], assets.inline)
+    for label, quote in (("short", SHORT_QUOTE), ("long", LONG_QUOTE)):
+        samples = _measure(lambda: processor._create_caption_image(quote, plan.caption), repeats)
+        results.append(BenchResult(f"caption_image.{label}", samples))
+
+    def build_overlays() -> None:
+        processor._build_overlays(LONG_QUOTE, plan, assets.featured[0], assets.inline)
+
+    results.append(BenchResult("overlays.build", _measure(build_overlays, repeats)))
+    short_plan = processor.render_plan(template, 1080, 1920, 10, None, [])
+
+    # Per-frame caption cost over a 10s clip, including the mask moviepy composites with.
+    for mode in ("static", "animated"):
+        caption_processor = VideoProcessor(dataclasses.replace(config, caption_mode=mode))
+
+        def caption_frames() -> None:
+            clip = caption_processor._build_caption_clip(LONG_QUOTE, short_plan.caption)
+            for index in range(10 * RENDER_FPS):
+                clip.get_frame(index / RENDER_FPS)
+                clip.mask.get_frame(index / RENDER_FPS)
+
+        results.append(BenchResult(f"caption_frames.{mode}", _measure(caption_frames, repeats)))
+
+    # Reading every prepared background frame: decoded and scaled versus memory-mapped.
+    name, background = next(iter(assets.backgrounds.items()))
+    cached_processor = VideoProcessor(dataclasses.replace(config, frame_cache_mb=16 * 1024, frame_cache_min_uses=1))
+    cached_processor.refresh_frame_cache({background.name: 1}, wait=True)
+    for label, reader in (("decoded", processor), ("cached", cached_processor)):
+
+        def read_frames() -> None:
+            with reader._open_background(background) as clip:
+                for index in range(int(clip.duration * RENDER_FPS)):
+                    clip.get_frame(index / RENDER_FPS)
+
+        results.append(BenchResult(f"background_frames.{label}.{name}", _measure(read_frames, repeats)))
+
+    for name, background in assets.backgrounds.items():
+        output = config.paths.output_dir / f"bench_{name}.mp4"
+
+        def render() -> None:
+            processor.render_video(
+                quote=LONG_QUOTE,
+                caption="benchmark",
+                background_path=background,
+                output_path=output,
+                music_path=assets.music[0],
+                featured_image=assets.featured[0],
+                inline_images=assets.inline,
+            )
+
+        samples = _measure(render, render_repeats, warmup=0)
+        with VideoFileClip(str(output)) as clip:
+            frames = clip.duration * RENDER_FPS
+        results.append(
+            BenchResult(
+                f"render_video.{name}",
+                samples,
+                extra={"frames": frames, "fps": frames / statistics.median(samples), "bytes": output.stat().st_size},
+            )
+        )
+
+    from .video_processor import FEED_CROP, RenderVariant
+
+    name, background = next(iter(assets.backgrounds.items()))
+    variants = [
+        RenderVariant("full", LONG_QUOTE, featured_image=assets.featured[0], inline_images=assets.inline),
+        RenderVariant("short", SHORT_QUOTE),
+        RenderVariant("feed", LONG_QUOTE, size=FEED_CROP),
+    ]
+    variant_dir = config.paths.output_dir / "variants"
+    samples = _measure(
+        lambda: processor.render_variants(background, variants, variant_dir, music_path=assets.music[0]),
+        render_repeats,
+        warmup=0,
+    )
+    with VideoFileClip(str(variant_dir / "full.mp4")) as clip:
+        frames = clip.duration * RENDER_FPS * len(variants)
+    results.append(
+        BenchResult(
+            f"render_variants.{name}",
+            samples,
+            extra={"variants": len(variants), "fps": frames / statistics.median(samples)},
+        )
+    )
+    return results
+
+
+def _bench_bookkeeping(config: AppConfig, repeats: int) -> List[BenchResult]:
+    results: List[BenchResult] = []
+    scratch = config.paths.base_dir / "bookkeeping"
+    scratch.mkdir(parents=True, exist_ok=True)
+
+    def registry_adds() -> None:
+        registry_path = scratch / "uploads_registry.json"
+        if registry_path.exists():
+            registry_path.unlink()
+        registry = UploadRegistry(registry_path)
+        for index in range(200):
+            registry.add(UploadRecord(f"{index:064x}", f"/videos/{index}.mp4", "caption " * 20))
+
+    results.append(BenchResult("upload_registry.add_200", _measure(registry_adds, repeats)))
+
+    registry = UploadRegistry(scratch / "uploads_registry.json")
+    results.append(
+        BenchResult(
+            "upload_registry.has_10k",
+            _measure(lambda: [registry.has(f"{i % 400:064x}") for i in range(10_000)], repeats),
+        )
+    )
+
+    manager = StateManager(scratch / "state.json", scratch / "state_backups")
+    history = PostHistory(
+        last_post_date=datetime.utcnow().date().isoformat(),
+        posts_today=5,
+        used_videos=[f"pexels_{i}.mp4" for i in range(50)],
+        used_quotes=[LONG_QUOTE] * 50,
+    )
+
+    def state_roundtrip() -> None:
+        manager.save(history)
+        manager.load()
+
+    results.append(BenchResult("state_manager.save_load", _measure(state_roundtrip, repeats)))
+
+    uploader = VideoUploader(config)
+    # Fingerprints only read the name and size, so any file will do.
+    video = scratch / "fingerprint.mp4"
+    video.write_bytes(b"\0" * 1024 * 1024)
+    results.append(
+        BenchResult(
+            "fingerprint.1k",
+            _measure(lambda: [uploader._fingerprint(video, LONG_QUOTE) for _ in range(1000)], repeats),
+        )
+    )
+    return results
+
+
+def run_suite(
+    work_dir: Optional[Path] = None,
+    repeats: int = 5,
+    render_repeats: int = 1,
+    backgrounds: Tuple[Tuple[int, int, float], ...] = DEFAULT_BACKGROUNDS,
+    include_render: bool = True,
+) -> Dict[str, object]:
+    """Run the benchmarks; without ``work_dir`` everything happens in a temporary directory."""
+    if work_dir is None:
+        with tempfile.TemporaryDirectory(prefix="tiktok-bench-") as tmp:
+            return run_suite(Path(tmp), repeats, render_repeats, backgrounds, include_render)
+
+    config = bench_config(work_dir)
+    results: List[BenchResult] = []
+    if include_render:
+        # Synthetic inputs are only needed (and only worth generating) for the render benchmarks.
+        assets = generate_assets(work_dir / "synthetic", backgrounds=backgrounds)
+        results.extend(_bench_rendering(config, assets, repeats, render_repeats))
+    results.extend(_bench_bookkeeping(config, repeats))
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+        },
+        "results": {result.name: result.as_dict() for result in results},
+    }
+
+
+def save_results(results: Dict[str, object], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2))
+
+
+def load_results(path: Path) -> Dict[str, object]:
+    return json.loads(path.read_text())
+
+
+def compare(
+    baseline: Dict[str, object], current: Dict[str, object], threshold: float = 0.10
+) -> Tuple[str, List[str]]:
+    """Compare median timings; returns a report and the names that regressed by more than ``threshold``."""
+    base_results: Dict[str, dict] = baseline.get("results", {})  # type: ignore[assignment]
+    current_results: Dict[str, dict] = current.get("results", {})  # type: ignore[assignment]
+    lines = [f"{'benchmark':40} {'baseline':>10} {'current':>10} {'change':>8}"]
+    regressions: List[str] = []
+    for name in sorted(set(base_results) | set(current_results)):
+        if name not in base_results or name not in current_results:
+            lines.append(f"{name:40} {'-':>10} {'-':>10} {'new' if name in current_results else 'gone':>8}")
+            continue
+        before = base_results[name]["median"]
+        after = current_results[name]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        lines.append(f"{name:40} {before:10.4f} {after:10.4f} {change:+8.1%}{flag}")
+    return "\n".join(lines), regressions
+
+
+__all__ = ["BenchResult", "bench_config", "compare", "load_results", "run_suite", "save_results"]
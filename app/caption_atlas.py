@@ -0,0 +1,250 @@
+"""Word-by-word animated captions composited from a pre-rasterized sprite atlas."""
+
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import ImageFont
+
+NORMAL_FILL = (255, 255, 255, 255)
+HIGHLIGHT_FILL = (255, 212, 59, 255)
+# Reading pace for the word timeline; longer words stay lit a little longer.
+SECONDS_PER_CHAR = 0.06
+SECONDS_PER_WORD = 0.12
+LEAD_IN_SECONDS = 0.4
+ATLAS_WIDTH = 1024
+BACKING_PADDING = 24
+# Lines wrap this many pixels short of the caption box, as in the static caption.
+WRAP_PADDING = 40
+
+
+@dataclass(frozen=True)
+class WordPlacement:
+    """Where one word sits in the caption box and which atlas sprites draw it."""
+
+    word: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class CaptionAtlas:
+    """Caption layout plus one RGBA atlas holding every word in both states.
+
+    ``regions[(word, highlighted)]`` is the ``(x, y)`` of that sprite in
+    ``atlas``; a sprite has the same size as its placement, so highlighting a
+    word is a straight slice copy over the same pixels.
+    """
+
+    size: Tuple[int, int]
+    placements: Tuple[WordPlacement, ...]
+    atlas: "np.ndarray"
+    regions: Dict[Tuple[str, bool], Tuple[int, int]]
+
+
+def wrap_words(words: Sequence[str], font: "ImageFont.FreeTypeFont", max_width: int) -> List[List[str]]:
+    """Greedy line wrap matching the static caption."""
+    lines: List[List[str]] = []
+    current: List[str] = []
+    for word in words:
+        test = " ".join([*current, word])
+        left, _, right, _ = font.getbbox(test)
+        if right - left > max_width and current:
+            lines.append(current)
+            current = [word]
+        else:
+            current.append(word)
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _layout(
+    words: Sequence[str], font: "ImageFont.FreeTypeFont", box: Tuple[int, int], padding: int = WRAP_PADDING
+) -> List[Tuple[str, int, int, Tuple[int, int, int, int]]]:
+    box_width, box_height = box
+    lines = wrap_words(words, font, box_width - padding)
+    line_boxes = [font.getbbox(" ".join(line)) for line in lines]
+    total_height = sum(bottom - top for _, top, _, bottom in line_boxes)
+
+    laid_out = []
+    y = (box_height - total_height) // 2
+    for line, (left, top, right, bottom) in zip(lines, line_boxes):
+        x = (box_width - (right - left)) // 2
+        prefix = ""
+        for word in line:
+            offset = int(round(font.getlength(prefix))) if prefix else 0
+            laid_out.append((word, x + offset, y, font.getbbox(word)))
+            prefix = f"{prefix}{word} "
+        y += bottom - top
+    return laid_out
+
+
+@lru_cache(maxsize=16)
+def build_atlas(
+    text: str,
+    font_path: str,
+    font_size: int,
+    box: Tuple[int, int],
+    fill: Tuple[int, int, int, int] = NORMAL_FILL,
+    highlight: Tuple[int, int, int, int] = HIGHLIGHT_FILL,
+    padding: int = WRAP_PADDING,
+) -> CaptionAtlas:
+    """Lay out ``text`` in ``box`` and rasterize each distinct word once per state.
+
+    Cached so variants and segment workers rendering the same quote share it.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    from .video_processor import load_font
+
+    font = load_font(font_path, font_size)
+    placements: List[WordPlacement] = []
+    sprites: Dict[Tuple[str, bool], "np.ndarray"] = {}
+    for word, x, y, (left, top, right, bottom) in _layout(text.split(), font, box, padding):
+        # Sprites are cropped to the word's ink so neighbouring words and lines
+        # never overlap; both states of a word share one rectangle.
+        width, height = max(1, right - left), max(1, bottom - top)
+        placements.append(WordPlacement(word, x + left, y + top, width, height))
+        for highlighted in (False, True):
+            if (word, highlighted) in sprites:
+                continue
+            image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+            ImageDraw.Draw(image).text((-left, -top), word, font=font, fill=highlight if highlighted else fill)
+            sprites[(word, highlighted)] = np.asarray(image)
+
+    # Shelf packing, tallest first so each shelf wastes little height.
+    atlas_width = max([ATLAS_WIDTH, *(sprite.shape[1] for sprite in sprites.values())])
+    regions: Dict[Tuple[str, bool], Tuple[int, int]] = {}
+    x = y = shelf = 0
+    for key, sprite in sorted(sprites.items(), key=lambda item: -item[1].shape[0]):
+        if x + sprite.shape[1] > atlas_width:
+            x, y, shelf = 0, y + shelf, 0
+        regions[key] = (x, y)
+        x += sprite.shape[1]
+        shelf = max(shelf, sprite.shape[0])
+    atlas = np.zeros((y + shelf, atlas_width, 4), dtype=np.uint8)
+    for key, sprite in sprites.items():
+        ax, ay = regions[key]
+        atlas[ay : ay + sprite.shape[0], ax : ax + sprite.shape[1]] = sprite
+    atlas.flags.writeable = False
+    return CaptionAtlas(size=box, placements=tuple(placements), atlas=atlas, regions=regions)
+
+
+def word_timeline(words: Sequence[str], duration: float) -> List[float]:
+    """Time at which each word lights up, paced by word length and fitted into ``duration``."""
+    if not words:
+        return []
+    weights = [SECONDS_PER_WORD + SECONDS_PER_CHAR * len(word) for word in words]
+    window = max(0.0, duration * 0.9 - LEAD_IN_SECONDS)
+    scale = min(1.0, window / sum(weights)) if sum(weights) else 0.0
+    starts: List[float] = []
+    t = LEAD_IN_SECONDS
+    for weight in weights:
+        starts.append(t)
+        t += weight * scale
+    return starts
+
+
+def _over(top: "np.ndarray", bottom: "np.ndarray") -> "np.ndarray":
+    """Straight-alpha RGBA ``top`` composited over ``bottom``."""
+    import numpy as np
+
+    top_alpha = top[..., 3:4] / 255.0
+    bottom_alpha = bottom[..., 3:4] / 255.0 * (1 - top_alpha)
+    alpha = top_alpha + bottom_alpha
+    rgb = (top[..., :3] * top_alpha + bottom[..., :3] * bottom_alpha) / np.maximum(alpha, 1e-6)
+    return np.concatenate([rgb, alpha * 255], axis=-1).round().astype(np.uint8)
+
+
+class AnimatedCaption:
+    """Per-frame caption image: words before ``t`` are highlighted.
+
+    Frames are produced by blitting atlas slices into one RGBA buffer, and
+    only when the number of lit words changes, so a frame costs a bisect
+    and, a handful of times per video, a few small slice copies. With a
+    ``backing`` colour the words sit on a box around the text block.
+    """
+
+    def __init__(
+        self,
+        atlas: CaptionAtlas,
+        starts: Sequence[float],
+        backing: Optional[Tuple[int, int, int, int]] = None,
+    ):
+        import numpy as np
+
+        self.atlas = atlas
+        self.starts = list(starts)
+        width, height = atlas.size
+        self._backing: Optional["np.ndarray"] = None
+        if backing is not None and atlas.placements:
+            from PIL import Image, ImageDraw
+
+            box = (
+                max(0, min(p.x for p in atlas.placements) - BACKING_PADDING),
+                max(0, min(p.y for p in atlas.placements) - BACKING_PADDING),
+                min(width - 1, max(p.x + p.width for p in atlas.placements) + BACKING_PADDING),
+                min(height - 1, max(p.y + p.height for p in atlas.placements) + BACKING_PADDING),
+            )
+            layer = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+            ImageDraw.Draw(layer).rounded_rectangle(box, radius=BACKING_PADDING, fill=backing)
+            self._backing = np.asarray(layer)
+        self._base = np.zeros((height, width, 4), dtype=np.uint8)
+        if self._backing is not None:
+            self._base[:] = self._backing
+        for placement in atlas.placements:
+            self._blit(self._base, placement, highlighted=False)
+        self._buffer = self._base.copy()
+        self._mask = self._buffer[..., 3] / 255.0
+        self._lit = 0
+
+    def _blit(self, target: "np.ndarray", placement: WordPlacement, highlighted: bool) -> Optional[Tuple[slice, slice]]:
+        x, y = self.atlas.regions[(placement.word, highlighted)]
+        height, width = target.shape[:2]
+        # Clip to the caption box; very long words can overhang it.
+        x0, y0 = max(0, placement.x), max(0, placement.y)
+        x1, y1 = min(width, placement.x + placement.width), min(height, placement.y + placement.height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        sx, sy = x + x0 - placement.x, y + y0 - placement.y
+        sprite = self.atlas.atlas[sy : sy + y1 - y0, sx : sx + x1 - x0]
+        if self._backing is not None:
+            # Over the box alone, so a highlighted word replaces its plain state.
+            sprite = _over(sprite, self._backing[y0:y1, x0:x1])
+        target[y0:y1, x0:x1] = sprite
+        return slice(y0, y1), slice(x0, x1)
+
+    def _advance(self, t: float) -> None:
+        lit = bisect.bisect_right(self.starts, t)
+        if lit == self._lit:
+            return
+        if lit < self._lit:
+            # Seeking backwards (a segment worker starting mid-video): start over.
+            self._buffer[:] = self._base
+            self._mask = self._buffer[..., 3] / 255.0
+            self._lit = 0
+        for placement in self.atlas.placements[self._lit : lit]:
+            region = self._blit(self._buffer, placement, highlighted=True)
+            if region is not None:
+                self._mask[region] = self._buffer[region + (3,)] / 255.0
+        self._lit = lit
+
+    def rgb(self, t: float) -> "np.ndarray":
+        self._advance(t)
+        return self._buffer[..., :3]
+
+    def mask(self, t: float) -> "np.ndarray":
+        self._advance(t)
+        return self._mask
+
+
+__all__ = ["AnimatedCaption", "CaptionAtlas", "WordPlacement", "build_atlas", "word_timeline", "wrap_words"]
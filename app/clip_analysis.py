@@ -0,0 +1,248 @@
+"""Per-clip luminance and motion index, and caption styling chosen from it."""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+from .montage import probe_clip
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Clips are sampled at SAMPLE_FPS on a SAMPLE_WIDTH x SAMPLE_HEIGHT grey grid,
+# reduced to ROWS horizontal bands: the caption spans nearly the full width,
+# so only the vertical layout matters.
+SAMPLE_FPS = 2
+SAMPLE_WIDTH = 36
+SAMPLE_HEIGHT = 64
+ROWS = 16
+MAX_SECONDS = 60
+
+CAPTION_HEIGHT = 0.28
+CAPTION_MARGIN = 0.08
+
+
+def caption_slots(height: float, margin: float) -> Dict[str, Tuple[float, float]]:
+    """Candidate caption slots as (top, bottom) fractions of the visible frame.
+
+    The first is the default and wins ties by PLACEMENT_BIAS.
+    """
+    return {
+        "bottom": (1 - margin - height, 1 - margin),
+        "center": ((1 - height) / 2, (1 + height) / 2),
+        "top": (margin, margin + height),
+    }
+
+
+PLACEMENTS = caption_slots(CAPTION_HEIGHT, CAPTION_MARGIN)
+PLACEMENT_BIAS = 6.0
+# White text needs the background behind it darker than this (most of the
+# time); dark text needs it brighter than LIGHT_LUMA.
+DARK_LUMA = 110
+LIGHT_LUMA = 170
+# Above this busyness (motion plus texture) a backing box is added anyway.
+BUSY_THRESHOLD = 28.0
+
+WHITE = (255, 255, 255, 255)
+YELLOW = (255, 212, 59, 255)
+INK = (20, 20, 20, 255)
+CRIMSON = (190, 20, 60, 255)
+
+
+@dataclass(frozen=True)
+class CaptionStyle:
+    """Where the caption goes and how it is drawn."""
+
+    placement: str = "bottom"
+    text_color: Tuple[int, int, int, int] = WHITE
+    highlight_color: Tuple[int, int, int, int] = YELLOW
+    # RGBA fill of a rounded box behind the text, or ``None``.
+    backing: Optional[Tuple[int, int, int, int]] = None
+
+
+DEFAULT_STYLE = CaptionStyle()
+
+
+@dataclass(frozen=True)
+class ClipAnalysis:
+    """Per-band statistics over time: arrays of ``samples x ROWS`` (``motion`` has one row fewer)."""
+
+    luma: "np.ndarray"
+    detail: "np.ndarray"
+    motion: "np.ndarray"
+
+    def window(self, top: float, bottom: float) -> "Tuple[np.ndarray, np.ndarray, np.ndarray]":
+        """Luma, detail and motion of the bands covering rows ``top``..``bottom`` (fractions)."""
+        first = min(ROWS - 1, int(top * ROWS))
+        last = max(first + 1, min(ROWS, int(round(bottom * ROWS))))
+        return self.luma[:, first:last], self.detail[:, first:last], self.motion[:, first:last]
+
+
+def _encode(array: "np.ndarray") -> str:
+    return base64.b64encode(array.astype("uint8").tobytes()).decode("ascii")
+
+
+def _decode(text: str) -> "np.ndarray":
+    import numpy as np
+
+    return np.frombuffer(base64.b64decode(text), dtype=np.uint8).reshape(-1, ROWS)
+
+
+def analyse_clip(path: Path) -> Dict[str, str]:
+    """Sample ``path`` once and reduce it to per-band luma, texture and motion series."""
+    import numpy as np
+    from moviepy.config import get_setting
+
+    if probe_clip(path) is None:
+        raise OSError(f"Unreadable clip {path.name}")
+    command = [get_setting("FFMPEG_BINARY"), "-v", "error", "-t", str(MAX_SECONDS), "-i", str(path)]
+    # ffmpeg scales down while decoding; Python only sees a few KB per second of video.
+    command += ["-vf", f"fps={SAMPLE_FPS},scale={SAMPLE_WIDTH}:{SAMPLE_HEIGHT}:flags=area,format=gray"]
+    command += ["-f", "rawvideo", "-"]
+    result = subprocess.run(command, capture_output=True)
+    frame_bytes = SAMPLE_WIDTH * SAMPLE_HEIGHT
+    samples = len(result.stdout) // frame_bytes
+    if result.returncode != 0 or samples == 0:
+        raise OSError(f"Could not analyse {path.name}: {result.stderr.decode(errors='replace').strip()}")
+
+    frames = np.frombuffer(result.stdout[: samples * frame_bytes], dtype=np.uint8).astype(np.float32)
+    bands = frames.reshape(samples, ROWS, (SAMPLE_HEIGHT // ROWS) * SAMPLE_WIDTH)
+    luma = bands.mean(axis=2)
+    detail = bands.std(axis=2)
+    if samples > 1:
+        motion = np.abs(np.diff(bands, axis=0)).mean(axis=2)
+    else:
+        motion = np.zeros((1, ROWS), dtype=np.float32)
+    return {
+        "luma": _encode(np.clip(np.rint(luma), 0, 255)),
+        "detail": _encode(np.clip(np.rint(detail), 0, 255)),
+        "motion": _encode(np.clip(np.rint(motion), 0, 255)),
+    }
+
+
+class ClipAnalysisIndex:
+    """Persistent analyses keyed by clip name; entries are redone when the file changes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except Exception as exc:
+            logger.warning("Failed to read clip analysis index %s: %s", self.path, exc)
+
+    def save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial = self.path.with_name(self.path.name + ".part")
+            partial.write_text(json.dumps(self.entries))
+            partial.replace(self.path)
+        except Exception as exc:
+            logger.warning("Unable to persist clip analysis index: %s", exc)
+
+    def is_current(self, path: Path) -> bool:
+        entry = self.entries.get(path.name)
+        if entry is None:
+            return False
+        stat = path.stat()
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def get(self, path: Path) -> Optional[ClipAnalysis]:
+        try:
+            if not self.is_current(path):
+                return None
+        except OSError:
+            return None
+        entry = self.entries[path.name]
+        return ClipAnalysis(_decode(entry["luma"]), _decode(entry["detail"]), _decode(entry["motion"]))
+
+    def refresh(self, clips: Iterable[Path]) -> int:
+        """Analyse clips that are new or changed and forget deleted ones; returns how many were analysed."""
+        clips = list(clips)
+        for name in set(self.entries) - {clip.name for clip in clips}:
+            del self.entries[name]
+        analysed = 0
+        for clip in clips:
+            if self.is_current(clip):
+                continue
+            try:
+                entry = analyse_clip(clip)
+            except OSError as exc:
+                logger.warning("Skipping analysis of %s: %s", clip.name, exc)
+                continue
+            stat = clip.stat()
+            self.entries[clip.name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **entry}
+            analysed += 1
+        return analysed
+
+
+def choose_caption_style(
+    analyses: Sequence[ClipAnalysis],
+    visible: Tuple[float, float] = (0.0, 1.0),
+    avoid: Iterable[str] = (),
+    slots: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> CaptionStyle:
+    """Pick the calmest caption slot and a text colour that reads on it.
+
+    ``analyses`` are the clips played back to back; ``visible`` is the span
+    of rows (fractions of the prepared frame) left after cropping; ``avoid``
+    names slots other overlays occupy, though the first of ``slots``
+    (default :data:`PLACEMENTS`) is always allowed. Pure array arithmetic on
+    the index.
+    """
+    import numpy as np
+
+    if not analyses:
+        return DEFAULT_STYLE
+    span = visible[1] - visible[0]
+    best: Optional[Tuple[float, str, np.ndarray, float]] = None
+    for rank, (name, (top, bottom)) in enumerate((slots or PLACEMENTS).items()):
+        if name in avoid and rank > 0:
+            continue
+        windows = [analysis.window(visible[0] + top * span, visible[0] + bottom * span) for analysis in analyses]
+        luma = np.concatenate([window[0] for window in windows]).astype(np.float32)
+        detail = float(np.concatenate([window[1] for window in windows]).mean())
+        motion = float(np.concatenate([window[2] for window in windows]).mean())
+        busyness = motion + detail
+        # Text is hardest to read where brightness swings over time or across the slot.
+        score = busyness + float(luma.std()) + rank * PLACEMENT_BIAS
+        if best is None or score < best[0]:
+            best = (score, name, luma, busyness)
+
+    _, placement, luma, busyness = best  # type: ignore[misc]
+    bright, dark = float(np.percentile(luma, 90)), float(np.percentile(luma, 10))
+    if bright <= DARK_LUMA:
+        style = CaptionStyle(placement, WHITE, YELLOW)
+    elif dark >= LIGHT_LUMA:
+        style = CaptionStyle(placement, INK, CRIMSON)
+    else:
+        # Mixed brightness: no text colour is safe on its own.
+        style = CaptionStyle(placement, WHITE, YELLOW, backing=(0, 0, 0, 150))
+    if style.backing is None and busyness > BUSY_THRESHOLD:
+        backing = (255, 255, 255, 170) if style.text_color == INK else (0, 0, 0, 150)
+        style = CaptionStyle(placement, style.text_color, style.highlight_color, backing)
+    return style
+
+
+__all__ = [
+    "CaptionStyle",
+    "ClipAnalysis",
+    "ClipAnalysisIndex",
+    "DEFAULT_STYLE",
+    "analyse_clip",
+    "caption_slots",
+    "choose_caption_style",
+]
@@ -8,9 +8,22 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from dotenv import load_dotenv
+_dotenv_loaded = False
 
-load_dotenv(override=False)
+CAPTION_MODES = ("static", "animated")
+CAPTION_PLACEMENTS = ("auto", "fixed")
+DEDUP_MODES = ("off", "flag", "skip")
+
+
+def _load_dotenv_once() -> None:
+    # Deferred from import time so commands that never build a config stay cheap.
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv(override=False)
+    _dotenv_loaded = True
 
 
 def _read_config_file(path: Path) -> Dict[str, str]:
@@ -56,6 +69,60 @@ class PathConfig:
     logs_dir: Path
     backups_dir: Path
     state_file: Path
+    http_cache_dir: Optional[Path] = None
+    frame_cache_dir: Optional[Path] = None
+    clip_analysis_file: Optional[Path] = None
+    templates_dir: Optional[Path] = None
+
+
+@dataclass
+class ReplenishConfig:
+    enabled: bool = True
+    low_watermark: int = 5
+    clips_per_fetch: int = 5
+    check_interval_minutes: int = 30
+    queries: List[str] = field(
+        default_factory=lambda: ["motivation inspiration", "sunrise", "city timelapse", "ocean waves", "mountains"]
+    )
+    # off | flag | skip: what to do with a new clip that looks like one we have.
+    dedup: str = "skip"
+    dedup_max_distance: int = 24
+
+
+@dataclass
+class JobQueueConfig:
+    enabled: bool = False
+    url: str = ""
+    lease_seconds: int = 900
+    heartbeat_seconds: int = 30
+    max_attempts: int = 3
+    poll_seconds: int = 5
+
+
+@dataclass
+class StageBudgetConfig:
+    """Wall-clock budgets (seconds) enforced by the watchdog; 0 disables a budget."""
+
+    content_seconds: int = 120
+    download_seconds: int = 600
+    render_seconds: int = 1200
+    upload_seconds: int = 600
+    render_attempts: int = 3
+
+
+@dataclass
+class GovernorConfig:
+    """How renders are sized against the container's CPU quota and memory limit."""
+
+    enabled: bool = True
+    # Expected peak memory of one render (Python plus its ffmpeg processes).
+    render_memory_mb: int = 1200
+    # Memory kept free for everything else; new renders wait below it.
+    memory_headroom_mb: int = 512
+    cpus_per_render: float = 2.0
+    # New renders wait while CPU use is above this fraction of the quota; 0 disables.
+    cpu_saturation: float = 0.9
+    poll_seconds: float = 2.0
 
 
 @dataclass
@@ -63,6 +130,14 @@ class AirtableConfig:
     api_key: Optional[str] = None
     base_id: Optional[str] = None
     table_name: Optional[str] = None
+    api_url: str = "https://api.airtable.com/v0"
+    requests_per_second: float = 4.0
+    max_attempts: int = 8
+    flush_interval_seconds: int = 10
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.base_id and self.table_name)
 
 
 @dataclass
@@ -80,11 +155,49 @@ class AppConfig:
     google_font_weight: str
     max_posts_per_day: int
     airtable: AirtableConfig
+    replenish: ReplenishConfig = field(default_factory=ReplenishConfig)
+    font_max_age_days: int = 30
+    account_name: str = "default"
+    render_workers: int = 2
+    render_segments: int = 1
+    caption_mode: str = "static"
+    caption_placement: str = "auto"
+    # Layout of rendered videos: TEMPLATES_DIR/<name>.json, or the built-in "default".
+    video_template: str = "default"
+    montage_seconds: int = 0
+    montage_max_clips: int = 6
+    # Disk budget for decoded frames of the most used backgrounds; 0 disables the cache.
+    frame_cache_mb: int = 0
+    frame_cache_fps: int = 30
+    frame_cache_min_uses: int = 2
+    # Service endpoints; overridden to point at local stand-ins for load tests.
+    openai_base_url: Optional[str] = None
+    pexels_api_url: str = "https://api.pexels.com"
+    tiktok_upload_url: Optional[str] = None
+    job_queue: JobQueueConfig = field(default_factory=JobQueueConfig)
+    budgets: StageBudgetConfig = field(default_factory=StageBudgetConfig)
+    governor: GovernorConfig = field(default_factory=GovernorConfig)
+    metrics_port: int = 0
+    config_poll_seconds: int = 5
+    config_file: Optional[Path] = None
+    prefer_file: bool = False
 
     @property
     def config_json(self) -> str:
         """Useful for debugging."""
         payload = {
+            "account_name": self.account_name,
+            "render_workers": self.render_workers,
+            "render_segments": self.render_segments,
+            "caption_mode": self.caption_mode,
+            "caption_placement": self.caption_placement,
+            "video_template": self.video_template,
+            "montage_seconds": self.montage_seconds,
+            "montage_max_clips": self.montage_max_clips,
+            "frame_cache_mb": self.frame_cache_mb,
+            "frame_cache_fps": self.frame_cache_fps,
+            "frame_cache_min_uses": self.frame_cache_min_uses,
+            "metrics_port": self.metrics_port,
             "schedule": self.schedule.__dict__,
             "caption": {
                 "template": self.caption.template,
@@ -93,27 +206,46 @@ class AppConfig:
             },
             "paths": {k: str(v) for k, v in self.paths.__dict__.items()},
             "openai_model": self.openai_model,
+            "openai_base_url": self.openai_base_url,
+            "pexels_api_url": self.pexels_api_url,
+            "tiktok_upload_url": self.tiktok_upload_url,
             "openai_max_tokens": self.openai_max_tokens,
             "openai_max_cost": self.openai_max_cost,
             "max_posts_per_day": self.max_posts_per_day,
-            "airtable_configured": bool(
-                self.airtable.api_key and self.airtable.base_id and self.airtable.table_name
-            ),
+            "replenish": self.replenish.__dict__,
+            "job_queue": self.job_queue.__dict__,
+            "budgets": self.budgets.__dict__,
+            "governor": self.governor.__dict__,
+            "airtable_configured": self.airtable.configured,
         }
         return json.dumps(payload, indent=2)
 
 
-DEFAULT_CONFIG_FILE = Path(os.getenv("CONFIG_FILE", "config.txt"))
+def default_config_file() -> Path:
+    _load_dotenv_once()
+    return Path(os.getenv("CONFIG_FILE", "config.txt"))
+
 
+def load_config(config_path: Optional[Path] = None, prefer_file: bool = False) -> AppConfig:
+    """Build an :class:`AppConfig` from ``config_path`` and the environment.
 
-def load_config(config_path: Optional[Path] = None) -> AppConfig:
-    config_path = config_path or DEFAULT_CONFIG_FILE
+    Environment variables normally win over the file. Per-account files loaded
+    with ``prefer_file=True`` override the environment instead, so shared
+    container settings such as ``DATA_ROOT`` do not leak across accounts.
+    """
+    _load_dotenv_once()
+    config_path = config_path or default_config_file()
     file_values = _read_config_file(config_path)
 
     def _get(key: str, default: Optional[str] = None) -> Optional[str]:
+        if prefer_file and key in file_values:
+            return file_values[key]
         return os.getenv(key, file_values.get(key, default))
 
     base_dir = Path(_get("DATA_ROOT", str(Path.cwd() / "data")))
+    account_name = _get("ACCOUNT_NAME", config_path.stem if config_path.name != "config.txt" else "default")
+    # Accounts sharing a DATA_ROOT keep their own post history, backups and upload registry.
+    account_dir = base_dir if account_name == "default" else base_dir / "accounts" / account_name
     assets_dir = Path(_get("ASSETS_DIR", str(base_dir / "assets")))
     videos_dir = Path(_get("VIDEOS_DIR", "/app/videos"))
     music_dir = Path(_get("MUSIC_DIR", str(assets_dir / "music")))
@@ -122,8 +254,12 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
     inline_dir = Path(_get("INLINE_IMAGES_DIR", str(assets_dir / "inline")))
     output_dir = Path(_get("OUTPUT_DIR", str(base_dir / "output")))
     logs_dir = Path(_get("LOGS_DIR", str(base_dir / "logs")))
-    backups_dir = Path(_get("BACKUPS_DIR", str(base_dir / "backups")))
-    state_file = Path(_get("STATE_FILE", str(base_dir / "state.json")))
+    backups_dir = Path(_get("BACKUPS_DIR", str(account_dir / "backups")))
+    state_file = Path(_get("STATE_FILE", str(account_dir / "state.json")))
+    http_cache_dir = Path(_get("HTTP_CACHE_DIR", str(base_dir / "http_cache")))
+    frame_cache_dir = Path(_get("FRAME_CACHE_DIR", str(base_dir / "frame_cache")))
+    clip_analysis_file = Path(_get("CLIP_ANALYSIS_FILE", str(base_dir / "background_analysis.json")))
+    templates_dir = Path(_get("TEMPLATES_DIR", str(assets_dir / "templates")))
 
     openai_api_key = _get("OPENAI_API_KEY")
     openai_model = _get("OPENAI_MODEL", "gpt-4.0-mini")
@@ -132,6 +268,9 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
 
     pexels_api_key = _get("PEXELS_API_KEY")
     tiktok_session_id = _get("TIKTOK_SESSION_ID")
+    openai_base_url = _get("OPENAI_BASE_URL") or None
+    pexels_api_url = (_get("PEXELS_API_URL") or "https://api.pexels.com").rstrip("/")
+    tiktok_upload_url = _get("TIKTOK_UPLOAD_URL") or None
 
     hashtags = [h.strip() for h in _get("CAPTION_HASHTAGS", "#motivation,#inspiration,#mindset").split(",") if h.strip()]
     seo_keywords = [k.strip() for k in _get("SEO_KEYWORDS", "motivation,success,inspiration").split(",") if k.strip()]
@@ -144,6 +283,25 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
 
     google_font_family = _get("GOOGLE_FONT_FAMILY", "Poppins")
     google_font_weight = _get("GOOGLE_FONT_WEIGHT", "600")
+    font_max_age_days = max(1, int(_get("FONT_MAX_AGE_DAYS", "30")))
+    render_workers = max(1, int(_get("RENDER_WORKERS", "2")))
+    render_segments = max(1, int(_get("RENDER_SEGMENTS", "1")))
+    caption_mode = _get("CAPTION_MODE", "static").strip().lower()
+    if caption_mode not in CAPTION_MODES:
+        raise ValueError(f"CAPTION_MODE must be one of {', '.join(CAPTION_MODES)}; got {caption_mode!r}")
+    caption_placement = _get("CAPTION_PLACEMENT", "auto").strip().lower()
+    if caption_placement not in CAPTION_PLACEMENTS:
+        raise ValueError(
+            f"CAPTION_PLACEMENT must be one of {', '.join(CAPTION_PLACEMENTS)}; got {caption_placement!r}"
+        )
+    video_template = (_get("VIDEO_TEMPLATE", "default") or "default").strip()
+    montage_seconds = max(0, int(_get("MONTAGE_SECONDS", "0")))
+    montage_max_clips = max(1, int(_get("MONTAGE_MAX_CLIPS", "6")))
+    frame_cache_mb = max(0, int(_get("FRAME_CACHE_MB", "0")))
+    frame_cache_fps = max(1, int(_get("FRAME_CACHE_FPS", "30")))
+    frame_cache_min_uses = max(1, int(_get("FRAME_CACHE_MIN_USES", "2")))
+    metrics_port = max(0, int(_get("METRICS_PORT", "0")))
+    config_poll_seconds = max(1, int(_get("CONFIG_POLL_SECONDS", "5")))
 
     paths = PathConfig(
         base_dir=base_dir,
@@ -157,6 +315,10 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
         logs_dir=logs_dir,
         backups_dir=backups_dir,
         state_file=state_file,
+        http_cache_dir=http_cache_dir,
+        frame_cache_dir=frame_cache_dir,
+        clip_analysis_file=clip_analysis_file,
+        templates_dir=templates_dir,
     )
 
     schedule_cfg = ScheduleConfig(
@@ -176,6 +338,54 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
         api_key=_get("AIRTABLE_API_KEY"),
         base_id=_get("AIRTABLE_BASE_ID"),
         table_name=_get("AIRTABLE_TABLE_NAME", "tiktok posts"),
+        api_url=_get("AIRTABLE_API_URL", "https://api.airtable.com/v0").rstrip("/"),
+        requests_per_second=max(0.1, float(_get("AIRTABLE_REQUESTS_PER_SECOND", "4"))),
+        max_attempts=max(1, int(_get("AIRTABLE_MAX_ATTEMPTS", "8"))),
+        flush_interval_seconds=max(1, int(_get("AIRTABLE_FLUSH_INTERVAL_SECONDS", "10"))),
+    )
+
+    replenish_cfg = ReplenishConfig(
+        enabled=_get("REPLENISH_ENABLED", "true").lower() in {"1", "true", "yes"},
+        low_watermark=max(0, int(_get("REPLENISH_LOW_WATERMARK", "5"))),
+        clips_per_fetch=max(1, int(_get("REPLENISH_CLIPS_PER_FETCH", "5"))),
+        check_interval_minutes=max(1, int(_get("REPLENISH_INTERVAL_MINUTES", "30"))),
+        queries=[
+            q.strip()
+            for q in _get(
+                "REPLENISH_QUERIES", "motivation inspiration,sunrise,city timelapse,ocean waves,mountains"
+            ).split(",")
+            if q.strip()
+        ],
+        dedup=_get("REPLENISH_DEDUP", "skip").strip().lower(),
+        dedup_max_distance=max(0, int(_get("REPLENISH_DEDUP_MAX_DISTANCE", "24"))),
+    )
+    if replenish_cfg.dedup not in DEDUP_MODES:
+        raise ValueError(f"REPLENISH_DEDUP must be one of {', '.join(DEDUP_MODES)}; got {replenish_cfg.dedup!r}")
+
+    job_queue_cfg = JobQueueConfig(
+        enabled=_get("JOB_QUEUE_ENABLED", "false").lower() in {"1", "true", "yes"},
+        url=_get("JOB_QUEUE_URL", f"sqlite:///{base_dir / 'jobs.db'}"),
+        lease_seconds=max(30, int(_get("JOB_LEASE_SECONDS", "900"))),
+        heartbeat_seconds=max(1, int(_get("JOB_HEARTBEAT_SECONDS", "30"))),
+        max_attempts=max(1, int(_get("JOB_MAX_ATTEMPTS", "3"))),
+        poll_seconds=max(1, int(_get("JOB_POLL_SECONDS", "5"))),
+    )
+
+    budgets_cfg = StageBudgetConfig(
+        content_seconds=max(0, int(_get("BUDGET_CONTENT_SECONDS", "120"))),
+        download_seconds=max(0, int(_get("BUDGET_DOWNLOAD_SECONDS", "600"))),
+        render_seconds=max(0, int(_get("BUDGET_RENDER_SECONDS", "1200"))),
+        upload_seconds=max(0, int(_get("BUDGET_UPLOAD_SECONDS", "600"))),
+        render_attempts=max(1, int(_get("RENDER_ATTEMPTS", "3"))),
+    )
+
+    governor_cfg = GovernorConfig(
+        enabled=_get("GOVERNOR_ENABLED", "true").lower() in {"1", "true", "yes"},
+        render_memory_mb=max(64, int(_get("RENDER_MEMORY_MB", "1200"))),
+        memory_headroom_mb=max(0, int(_get("MEMORY_HEADROOM_MB", "512"))),
+        cpus_per_render=max(0.1, float(_get("CPUS_PER_RENDER", "2"))),
+        cpu_saturation=max(0.0, float(_get("CPU_SATURATION", "0.9"))),
+        poll_seconds=max(0.1, float(_get("GOVERNOR_POLL_SECONDS", "2"))),
     )
 
     return AppConfig(
@@ -188,10 +398,33 @@ def load_config(config_path: Optional[Path] = None) -> AppConfig:
         openai_max_cost=openai_max_cost,
         pexels_api_key=pexels_api_key,
         tiktok_session_id=tiktok_session_id,
+        openai_base_url=openai_base_url,
+        pexels_api_url=pexels_api_url,
+        tiktok_upload_url=tiktok_upload_url,
         google_font_family=google_font_family,
         google_font_weight=google_font_weight,
         max_posts_per_day=max_posts_per_day,
         airtable=airtable_cfg,
+        replenish=replenish_cfg,
+        font_max_age_days=font_max_age_days,
+        account_name=account_name,
+        render_workers=render_workers,
+        render_segments=render_segments,
+        caption_mode=caption_mode,
+        caption_placement=caption_placement,
+        video_template=video_template,
+        montage_seconds=montage_seconds,
+        montage_max_clips=montage_max_clips,
+        frame_cache_mb=frame_cache_mb,
+        frame_cache_fps=frame_cache_fps,
+        frame_cache_min_uses=frame_cache_min_uses,
+        job_queue=job_queue_cfg,
+        budgets=budgets_cfg,
+        governor=governor_cfg,
+        metrics_port=metrics_port,
+        config_poll_seconds=config_poll_seconds,
+        config_file=config_path,
+        prefer_file=prefer_file,
     )
 
 
@@ -201,5 +434,10 @@ __all__ = [
     "CaptionConfig",
     "PathConfig",
     "AirtableConfig",
+    "ReplenishConfig",
+    "JobQueueConfig",
+    "StageBudgetConfig",
+    "GovernorConfig",
+    "default_config_file",
     "load_config",
 ]
@@ -0,0 +1,189 @@
+"""Cached configuration with mtime-based hot reload."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .config import AppConfig, default_config_file, load_config
+
+logger = logging.getLogger(__name__)
+
+# Fields that can change on a running process. Paths, queue and worker
+# settings are bound at startup and need a restart.
+RELOADABLE_FIELDS = (
+    "schedule",
+    "caption",
+    "max_posts_per_day",
+    "openai_api_key",
+    "openai_model",
+    "openai_max_tokens",
+    "openai_max_cost",
+    "pexels_api_key",
+    "tiktok_session_id",
+    "google_font_family",
+    "google_font_weight",
+    "font_max_age_days",
+    "render_segments",
+    "caption_mode",
+    "caption_placement",
+    "video_template",
+    "montage_seconds",
+    "montage_max_clips",
+    "replenish",
+    "airtable",
+    "budgets",
+)
+RESTART_FIELDS = (
+    "paths",
+    "account_name",
+    "render_workers",
+    "governor",
+    "frame_cache_mb",
+    "frame_cache_fps",
+    "frame_cache_min_uses",
+    "job_queue",
+    "metrics_port",
+    "config_poll_seconds",
+)
+
+ConfigListener = Callable[[AppConfig, Set[str]], None]
+
+
+def validate_config(config: AppConfig) -> None:
+    """Raise ``ValueError`` if ``config`` should not be applied to a running service."""
+    from pytz import UnknownTimeZoneError, timezone
+
+    try:
+        timezone(config.schedule.timezone)
+    except UnknownTimeZoneError as exc:
+        raise ValueError(f"Unknown SCHEDULE_TIMEZONE '{config.schedule.timezone}'") from exc
+    if config.max_posts_per_day < 0:
+        raise ValueError("MAX_POSTS_PER_DAY must not be negative")
+    if config.openai_max_tokens <= 0:
+        raise ValueError("OPENAI_MAX_TOKENS must be positive")
+    try:
+        config.caption.template.format(quote="", hashtags="")
+    except (KeyError, IndexError, ValueError) as exc:
+        raise ValueError(f"Invalid CAPTION_TEMPLATE: {exc}") from exc
+    from .video_templates import load_template
+
+    # TemplateError is a ValueError naming the template, layer and key.
+    load_template(config.paths.templates_dir, config.video_template)
+
+
+def apply_config(target: AppConfig, new: AppConfig) -> Set[str]:
+    """Copy reloadable fields from ``new`` onto ``target`` in place.
+
+    Every component holds a reference to the same ``AppConfig`` object, so
+    updating its attributes is enough for the next run to see the changes.
+    """
+    changed = {name for name in RELOADABLE_FIELDS if getattr(target, name) != getattr(new, name)}
+    for name in changed:
+        setattr(target, name, getattr(new, name))
+    ignored = [name for name in RESTART_FIELDS if getattr(target, name) != getattr(new, name)]
+    if ignored:
+        logger.warning("Config changes to %s require a restart and were not applied.", ", ".join(ignored))
+    return changed
+
+
+class ConfigService:
+    """Parses the config once and re-parses only when the file's mtime changes."""
+
+    def __init__(
+        self,
+        config_path: Optional[Path] = None,
+        prefer_file: bool = False,
+        poll_seconds: Optional[float] = None,
+        config: Optional[AppConfig] = None,
+    ):
+        if config_path is None and config is not None:
+            config_path = config.config_file
+        self.config_path = config_path or default_config_file()
+        self.prefer_file = config.prefer_file if config else prefer_file
+        self._config = config or load_config(self.config_path, prefer_file=self.prefer_file)
+        self.poll_seconds = poll_seconds or self._config.config_poll_seconds
+        self._mtime = self._stat()
+        self._listeners: List[ConfigListener] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return self.config_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def get(self) -> AppConfig:
+        return self._config
+
+    def add_listener(self, listener: ConfigListener) -> None:
+        self._listeners.append(listener)
+
+    def refresh(self) -> Set[str]:
+        """Reload if the file changed; returns the names of applied fields."""
+        with self._lock:
+            mtime = self._stat()
+            if mtime == self._mtime:
+                return set()
+            self._mtime = mtime
+            try:
+                new = load_config(self.config_path, prefer_file=self.prefer_file)
+                validate_config(new)
+            except Exception as exc:
+                logger.error("Ignoring invalid config change in %s: %s", self.config_path, exc)
+                return set()
+            changed = apply_config(self._config, new)
+        if changed:
+            logger.info("Reloaded %s: %s", self.config_path, ", ".join(sorted(changed)))
+            for listener in self._listeners:
+                try:
+                    listener(self._config, changed)
+                except Exception as exc:
+                    logger.exception("Config listener failed: %s", exc)
+        return changed
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            self.refresh()
+
+
+_services: Dict[Tuple[str, bool], ConfigService] = {}
+_services_lock = threading.Lock()
+
+
+def get_config_service(config_path: Optional[Path] = None, prefer_file: bool = False) -> ConfigService:
+    """Process-wide cached :class:`ConfigService` for ``config_path``."""
+    path = config_path or default_config_file()
+    key = (str(path.resolve()), prefer_file)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = ConfigService(path, prefer_file=prefer_file)
+            _services[key] = service
+    service.refresh()
+    return service
+
+
+__all__ = [
+    "ConfigService",
+    "RELOADABLE_FIELDS",
+    "apply_config",
+    "get_config_service",
+    "validate_config",
+]
@@ -0,0 +1,162 @@
+"""Perceptual signatures for background clips and a Hamming-distance index over them."""
+
+from __future__ import annotations
+
+import json
+import logging
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .montage import probe_clip
+
+logger = logging.getLogger(__name__)
+
+# Four frames, each an 8x8 difference hash: 4 x 64 bits = 32 bytes per clip.
+SAMPLE_POSITIONS = (0.15, 0.38, 0.62, 0.85)
+HASH_SIZE = 8
+SIGNATURE_BYTES = len(SAMPLE_POSITIONS) * HASH_SIZE * HASH_SIZE // 8
+# One band per signature byte. Two signatures within BANDS - 1 bits of each
+# other differ in at most BANDS - 1 bytes, so they share at least one band.
+BANDS = SIGNATURE_BYTES
+
+
+def _frame_hash(path: Path, seconds: float) -> bytes:
+    import numpy as np
+    from moviepy.config import get_setting
+
+    command = [get_setting("FFMPEG_BINARY"), "-v", "error", "-ss", f"{seconds:.3f}", "-i", str(path)]
+    # Let ffmpeg do the downscale: it only decodes up to the sampled frame and
+    # hands back 72 grey bytes instead of a full frame.
+    command += ["-frames:v", "1", "-vf", f"scale={HASH_SIZE + 1}:{HASH_SIZE}:flags=area,format=gray"]
+    command += ["-f", "rawvideo", "-"]
+    result = subprocess.run(command, capture_output=True)
+    expected = (HASH_SIZE + 1) * HASH_SIZE
+    if result.returncode != 0 or len(result.stdout) < expected:
+        raise OSError(f"Could not sample {path.name} at {seconds:.2f}s: {result.stderr.decode(errors='replace').strip()}")
+    grey = np.frombuffer(result.stdout[:expected], dtype=np.uint8).reshape(HASH_SIZE, HASH_SIZE + 1)
+    # Difference hash: is each pixel brighter than its left neighbour.
+    return np.packbits(grey[:, 1:] > grey[:, :-1]).tobytes()
+
+
+def clip_signature(path: Path) -> bytes:
+    """Signature of a clip from a few frames spread over its length."""
+    info = probe_clip(path)
+    if info is None or info.duration <= 0:
+        raise OSError(f"Unreadable clip {path.name}")
+    return b"".join(_frame_hash(path, info.duration * position) for position in SAMPLE_POSITIONS)
+
+
+class SignatureIndex:
+    """Persistent clip signatures with banded lookup of near duplicates.
+
+    ``nearest`` only compares against clips sharing a band with the query,
+    then verifies candidates with a vectorised popcount; distances above
+    ``BANDS - 1`` fall back to a full scan.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self._bands: Dict[Tuple[int, int], Set[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            entries = json.loads(self.path.read_text())
+        except Exception as exc:
+            logger.warning("Failed to read clip signatures %s: %s", self.path, exc)
+            return
+        for name, entry in entries.items():
+            self._insert(name, entry)
+
+    def save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial = self.path.with_name(self.path.name + ".part")
+            partial.write_text(json.dumps(self.entries, indent=2))
+            partial.replace(self.path)
+        except Exception as exc:
+            logger.warning("Unable to persist clip signatures: %s", exc)
+
+    def _insert(self, name: str, entry: dict) -> None:
+        self.remove(name)
+        self.entries[name] = entry
+        for band, value in enumerate(bytes.fromhex(entry["signature"])):
+            self._bands.setdefault((band, value), set()).add(name)
+
+    def remove(self, name: str) -> None:
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        for band, value in enumerate(bytes.fromhex(entry["signature"])):
+            bucket = self._bands.get((band, value))
+            if bucket is not None:
+                bucket.discard(name)
+                if not bucket:
+                    del self._bands[(band, value)]
+
+    def add(self, path: Path, signature: bytes, duplicate_of: Optional[str] = None) -> None:
+        stat = path.stat()
+        entry = {"signature": signature.hex(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if duplicate_of:
+            entry["duplicate_of"] = duplicate_of
+        self._insert(path.name, entry)
+
+    def is_current(self, path: Path) -> bool:
+        entry = self.entries.get(path.name)
+        if entry is None:
+            return False
+        stat = path.stat()
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def duplicates(self) -> Set[str]:
+        """Clips kept but flagged as near duplicates of another clip."""
+        return {name for name, entry in self.entries.items() if entry.get("duplicate_of")}
+
+    def refresh(self, clips: Iterable[Path]) -> int:
+        """Sign clips that are new or changed and forget deleted ones; returns how many were signed."""
+        clips = list(clips)
+        for name in set(self.entries) - {clip.name for clip in clips}:
+            self.remove(name)
+        signed = 0
+        for clip in clips:
+            if self.is_current(clip):
+                continue
+            try:
+                self.add(clip, clip_signature(clip))
+                signed += 1
+            except OSError as exc:
+                logger.warning("Skipping signature for %s: %s", clip.name, exc)
+        return signed
+
+    def nearest(
+        self, signature: bytes, max_distance: int, exclude: Iterable[str] = ()
+    ) -> Optional[Tuple[str, int]]:
+        """Closest indexed clip within ``max_distance`` bits, as ``(name, distance)``."""
+        import numpy as np
+
+        excluded = set(exclude)
+        if max_distance < BANDS:
+            candidates: Set[str] = set()
+            for band, value in enumerate(signature):
+                candidates |= self._bands.get((band, value), set())
+        else:
+            candidates = set(self.entries)
+        names: List[str] = sorted(candidates - excluded)
+        if not names:
+            return None
+        matrix = np.frombuffer(
+            b"".join(bytes.fromhex(self.entries[name]["signature"]) for name in names), dtype=np.uint8
+        ).reshape(len(names), SIGNATURE_BYTES)
+        query = np.frombuffer(signature, dtype=np.uint8)
+        distances = np.unpackbits(matrix ^ query, axis=1).sum(axis=1)
+        best = int(distances.argmin())
+        if distances[best] > max_distance:
+            return None
+        return names[best], int(distances[best])
+
+
+__all__ = ["SignatureIndex", "clip_signature"]
@@ -0,0 +1,77 @@
+"""Non-blocking locks on shared data directories, within and across processes."""
+
+from __future__ import annotations
+
+import errno
+import logging
+import threading
+from pathlib import Path
+from typing import IO, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryLock:
+    """Non-blocking lock on one directory.
+
+    Shared by every user in the process (see :func:`directory_lock`), and
+    backed by ``flock`` on a file in the directory so other processes (render
+    workers, other schedulers) take turns too.
+    """
+
+    def __init__(self, directory: Path, name: str):
+        self.path = directory / name
+        self._thread_lock = threading.Lock()
+        self._handle: Optional[IO[str]] = None
+
+    def acquire(self) -> bool:
+        import fcntl
+
+        if not self._thread_lock.acquire(blocking=False):
+            return False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(self.path, "a")
+        except OSError as exc:
+            # Nothing can be written to an unwritable directory anyway; still serialise this process.
+            logger.debug("No lock file in %s: %s", self.path.parent, exc)
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as exc:
+            handle.close()
+            self._thread_lock.release()
+            if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                logger.warning("Could not lock %s: %s", self.path, exc)
+            return False
+        self._handle = handle
+        return True
+
+    def release(self) -> None:
+        import fcntl
+
+        if self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+        self._thread_lock.release()
+
+    def locked(self) -> bool:
+        return self._thread_lock.locked()
+
+
+_locks: Dict[Tuple[str, str], DirectoryLock] = {}
+_locks_guard = threading.Lock()
+
+
+def directory_lock(directory: Path, name: str) -> DirectoryLock:
+    """The process-wide lock named ``name`` for ``directory``."""
+    key = (str(directory.resolve()), name)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = DirectoryLock(directory, name)
+        return lock
+
+
+__all__ = ["DirectoryLock", "directory_lock"]
@@ -2,61 +2,243 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-import requests
+from .http_client import HttpClient, shared_client
 
 logger = logging.getLogger(__name__)
 
 CSS_URL = "https://fonts.googleapis.com/css2"
+MANIFEST_NAME = "fonts_manifest.json"
+DEFAULT_MAX_AGE_DAYS = 30
+# After a failed refresh of a stale font, wait this long before trying again.
+RETRY_BACKOFF = timedelta(hours=1)
+# Renders wait on font downloads; fail over to the cached or bundled font
+# quickly instead of sitting through the client's full retry sequence.
+FONT_RETRIES = 1
 
+# Fonts shipped with the container image (fonts-dejavu-core) used when the
+# requested Google Font is neither cached nor downloadable.
+BUNDLED_FONTS = (
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+)
 
-def ensure_google_font(
-    fonts_dir: Path,
-    family: str,
-    weight: str = "400",
-) -> Optional[Path]:
-    fonts_dir.mkdir(parents=True, exist_ok=True)
+# Manifest-verified fonts resolved in this process, shared by every
+# VideoProcessor (and account), as (path, monotonic expiry). Entries expire so
+# a long-running process re-checks the manifest and refreshes stale fonts.
+RESOLVED_SECONDS = 3600
+_resolved_fonts: Dict[Tuple[str, str, str], Tuple[Path, float]] = {}
+_resolved_lock = threading.Lock()
+# One lock per font, so a slow download only holds up renders that need that font.
+_font_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+
+@dataclass
+class FontEntry:
+    family: str
+    weight: str
+    file: str
+    sha256: str
+    fetched_at: str
+    checked_at: str = ""
+    # Last failed refresh; unlike checked_at it does not make the entry fresh.
+    failed_at: str = ""
+
+    def is_stale(self, max_age_days: int) -> bool:
+        last_seen = max(self.fetched_at, self.checked_at)
+        try:
+            seen_at = datetime.fromisoformat(last_seen)
+        except ValueError:
+            return True
+        return datetime.utcnow() - seen_at > timedelta(days=max_age_days)
+
+    def retry_due(self) -> bool:
+        """Whether a stale entry may be refreshed now, backing off after a failure."""
+        try:
+            failed_at = datetime.fromisoformat(self.failed_at)
+        except ValueError:
+            return True
+        return datetime.utcnow() - failed_at > RETRY_BACKOFF
+
+
+class FontManifest:
+    """Local record of downloaded fonts keyed by family and weight."""
+
+    def __init__(self, manifest_path: Path):
+        self.manifest_path = manifest_path
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except Exception as exc:
+            logger.warning("Failed to read font manifest: %s", exc)
+            return {}
+
+    def save(self) -> None:
+        try:
+            self.manifest_path.write_text(json.dumps(self._entries, indent=2))
+        except Exception as exc:
+            logger.warning("Unable to persist font manifest: %s", exc)
+
+    @staticmethod
+    def _key(family: str, weight: str) -> str:
+        return f"{family}:{weight}"
+
+    def get(self, family: str, weight: str) -> Optional[FontEntry]:
+        data = self._entries.get(self._key(family, weight))
+        if not data:
+            return None
+        try:
+            return FontEntry(**data)
+        except TypeError:
+            return None
+
+    def put(self, entry: FontEntry) -> None:
+        self._entries[self._key(entry.family, entry.weight)] = asdict(entry)
+        self.save()
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def bundled_font() -> Optional[Path]:
+    for path in BUNDLED_FONTS:
+        if path.exists():
+            return path
+    return None
+
+
+def _fetch_ttf_url(family: str, weight: str, client: HttpClient) -> Optional[str]:
     normalized_family = family.replace(" ", "+")
     css_params = {"family": f"{normalized_family}:wght@{weight}"}
 
     try:
-        response = requests.get(CSS_URL, params=css_params, timeout=15)
+        response = client.get(CSS_URL, params=css_params, timeout=15, cache=True, retries=FONT_RETRIES)
         response.raise_for_status()
     except Exception as exc:
         logger.warning("Failed to fetch Google Fonts CSS for %s: %s", family, exc)
         return None
 
-    ttf_url = None
     for line in response.text.splitlines():
         line = line.strip()
         if line.startswith("src:") and "https://" in line:
             start = line.find("https://")
             end = line.find(")", start)
-            ttf_url = line[start:end]
-            break
+            return line[start:end]
 
-    if not ttf_url:
-        logger.warning("No TTF URL found in Google Fonts CSS for %s", family)
-        return None
+    logger.warning("No TTF URL found in Google Fonts CSS for %s", family)
+    return None
 
-    font_filename = f"{family.replace(' ', '_')}_{weight}.ttf"
-    font_path = fonts_dir / font_filename
 
-    if font_path.exists():
-        return font_path
+def _download_font(font_path: Path, family: str, weight: str, client: HttpClient) -> Optional[bytes]:
+    ttf_url = _fetch_ttf_url(family, weight, client)
+    if not ttf_url:
+        return None
 
     try:
         logger.info("Downloading Google Font %s (%s)", family, weight)
-        font_bytes = requests.get(ttf_url, timeout=30)
+        # Cached with its validators: a stale-manifest refresh of an unchanged
+        # font is answered with 304 and served from disk.
+        font_bytes = client.get(ttf_url, timeout=30, cache=True, retries=FONT_RETRIES)
         font_bytes.raise_for_status()
-        font_path.write_bytes(font_bytes.content)
-        return font_path
+        partial_path = font_path.with_suffix(".part")
+        partial_path.write_bytes(font_bytes.content)
+        partial_path.replace(font_path)
     except Exception as exc:
         logger.warning("Unable to download font %s: %s", family, exc)
         return None
+    return font_bytes.content
+
+
+def ensure_google_font(
+    fonts_dir: Path,
+    family: str,
+    weight: str = "400",
+    max_age_days: int = DEFAULT_MAX_AGE_DAYS,
+    client: Optional[HttpClient] = None,
+) -> Optional[Path]:
+    """Return a local TTF for ``family``/``weight``, hitting the network only if needed.
+
+    The manifest in ``fonts_dir`` is consulted first; a present, hash-verified
+    and fresh entry is returned without any network I/O. Stale entries are
+    refreshed but still served if the refresh fails. When nothing usable is
+    cached and the download fails, a bundled system font is returned; it is
+    not remembered, so the next call tries the download again.
+    """
+    key = (str(fonts_dir), family, weight)
+    with _resolved_lock:
+        cached = _resolved_from_cache(key)
+        if cached:
+            return cached
+        font_lock = _font_locks.setdefault(key, threading.Lock())
+    with font_lock:
+        # Another thread may have resolved it while this one waited.
+        with _resolved_lock:
+            cached = _resolved_from_cache(key)
+        if cached:
+            return cached
+        resolved = _ensure_google_font(fonts_dir, family, weight, max_age_days, client or shared_client())
+        with _resolved_lock:
+            if resolved and resolved not in BUNDLED_FONTS:
+                _resolved_fonts[key] = (resolved, time.monotonic() + RESOLVED_SECONDS)
+            else:
+                _resolved_fonts.pop(key, None)
+        return resolved
+
+
+def _resolved_from_cache(key: Tuple[str, str, str]) -> Optional[Path]:
+    cached = _resolved_fonts.get(key)
+    if cached and cached[1] > time.monotonic() and cached[0].exists():
+        return cached[0]
+    return None
+
+
+def _ensure_google_font(
+    fonts_dir: Path, family: str, weight: str, max_age_days: int, client: HttpClient
+) -> Optional[Path]:
+    fonts_dir.mkdir(parents=True, exist_ok=True)
+    manifest = FontManifest(fonts_dir / MANIFEST_NAME)
+    font_path = fonts_dir / f"{family.replace(' ', '_')}_{weight}.ttf"
+    now = datetime.utcnow().isoformat(timespec="seconds")
+
+    entry = manifest.get(family, weight)
+    if entry and font_path.exists() and entry.file == font_path.name and _sha256(font_path) == entry.sha256:
+        if not entry.is_stale(max_age_days) or not entry.retry_due():
+            return font_path
+        if _download_font(font_path, family, weight, client):
+            manifest.put(FontEntry(family, weight, font_path.name, _sha256(font_path), now, now))
+        else:
+            # Still stale: retried after RETRY_BACKOFF rather than max_age_days.
+            entry.failed_at = now
+            manifest.put(entry)
+        return font_path
+
+    if font_path.exists() and not entry:
+        # Adopt fonts downloaded before the manifest existed.
+        manifest.put(FontEntry(family, weight, font_path.name, _sha256(font_path), now, now))
+        return font_path
+
+    if _download_font(font_path, family, weight, client):
+        manifest.put(FontEntry(family, weight, font_path.name, _sha256(font_path), now, now))
+        return font_path
+
+    fallback = bundled_font()
+    if fallback:
+        logger.warning("Using bundled font %s instead of %s (%s)", fallback.name, family, weight)
+    return fallback
 
 
-__all__ = ["ensure_google_font"]
+__all__ = ["ensure_google_font", "bundled_font", "FontManifest", "FontEntry"]
@@ -0,0 +1,345 @@
+"""Memory-mapped cache of prepared background frames for the most used clips."""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, ContextManager, Collection, Dict, Iterable, List, Optional, Tuple
+
+from .dirlock import directory_lock
+from .montage import probe_clip
+
+if TYPE_CHECKING:
+    import numpy as np
+    from moviepy.editor import VideoClip
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prepared frames change (size, trim) so old entries are not reused.
+FORMAT_VERSION = 1
+PREPARED_HEIGHT = 1920
+PREPARED_WIDTH = 1080
+MAX_SECONDS = 60
+# Each account's latest usage counts, so a refresh plans for everyone sharing the directory.
+USAGE_DIR = "usage"
+LOCK_NAME = ".refresh.lock"
+
+
+def prepared_size(width: int, height: int) -> Tuple[int, int]:
+    """Frame size ``VideoProcessor._prepare_background`` produces for a ``width`` x ``height`` clip."""
+    width, height = int(width * PREPARED_HEIGHT / height), PREPARED_HEIGHT
+    if width != PREPARED_WIDTH:
+        width, height = PREPARED_WIDTH, int(height * PREPARED_WIDTH / width)
+    return width, height
+
+
+@dataclass(frozen=True)
+class CachedBackground:
+    """One cached clip: ``frames`` uint8 RGB frames of ``size`` sampled at ``fps``."""
+
+    frames_path: Path
+    source: str
+    fps: float
+    frames: int
+    size: Tuple[int, int]
+    duration: float
+    audio: bool
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames * self.size[0] * self.size[1] * 3
+
+    def array(self) -> "np.ndarray":
+        """The frames, mapped read-only: reads come from the page cache, not a decoder."""
+        import numpy as np
+
+        width, height = self.size
+        return np.memmap(self.frames_path, dtype=np.uint8, mode="r", shape=(self.frames, height, width, 3))
+
+    def clip(self) -> "VideoClip":
+        from moviepy.editor import VideoClip
+
+        frames = self.array()
+        last = self.frames - 1
+
+        def make_frame(t: float) -> "np.ndarray":
+            # Same rounding as moviepy's reader, so frame n/fps is frame n.
+            return frames[min(last, max(0, int(self.fps * t + 0.00001)))]
+
+        return VideoClip(make_frame, duration=self.duration)
+
+
+class FrameCache:
+    """Prepared (scaled, trimmed, resampled) frames of hot backgrounds on disk.
+
+    Each entry is a raw ``frames x height x width x 3`` file plus a JSON
+    sidecar written after it, so a sidecar always describes a complete file.
+    Entries are keyed by the source's name, size and mtime and by the cache
+    fps; a replaced source simply misses. :meth:`refresh` keeps the clips
+    with the highest usage counts that fit within ``budget_bytes``.
+
+    Accounts may share the directory: each refresh records its ``account``'s
+    usage there and plans from the counts of all of them, and refreshes take
+    turns through a lock shared with other instances and processes.
+    """
+
+    def __init__(self, directory: Path, budget_bytes: int, fps: float, min_uses: int = 1, account: str = "default"):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.fps = fps
+        self.min_uses = min_uses
+        self.account = account
+        self._lock = directory_lock(directory, LOCK_NAME)
+
+    def _key(self, source: Path) -> Optional[str]:
+        try:
+            stat = source.stat()
+        except OSError:
+            return None
+        identity = f"{source.name}|{stat.st_size}|{stat.st_mtime_ns}|{self.fps}|{FORMAT_VERSION}"
+        return f"{source.stem}-{hashlib.sha1(identity.encode()).hexdigest()[:12]}"
+
+    def _sidecar(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load(self, sidecar: Path) -> Optional[CachedBackground]:
+        try:
+            meta = json.loads(sidecar.read_text())
+            entry = CachedBackground(
+                frames_path=sidecar.with_suffix(".frames"),
+                source=meta["source"],
+                fps=meta["fps"],
+                frames=meta["frames"],
+                size=tuple(meta["size"]),  # type: ignore[arg-type]
+                duration=meta["duration"],
+                audio=meta["audio"],
+            )
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Ignoring unreadable frame cache entry %s: %s", sidecar.name, exc)
+            return None
+        if not entry.frames_path.exists() or entry.frames_path.stat().st_size != entry.nbytes:
+            return None
+        return entry
+
+    def lookup(self, source: Path) -> Optional[CachedBackground]:
+        key = self._key(source)
+        if key is None:
+            return None
+        sidecar = self._sidecar(key)
+        return self._load(sidecar) if sidecar.exists() else None
+
+    def entries(self) -> Dict[str, CachedBackground]:
+        """Complete entries by key."""
+        if not self.directory.exists():
+            return {}
+        found = {}
+        for sidecar in self.directory.glob("*.json"):
+            entry = self._load(sidecar)
+            if entry is not None:
+                found[sidecar.stem] = entry
+        return found
+
+    def size_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self.entries().values())
+
+    def estimate_bytes(self, source: Path) -> Optional[int]:
+        info = probe_clip(source)
+        if info is None or not info.width or not info.height or info.duration <= 0:
+            return None
+        width, height = prepared_size(info.width, info.height)
+        frames = max(1, int(min(info.duration, MAX_SECONDS) * self.fps))
+        return frames * width * height * 3
+
+    def plan(self, usage: Dict[str, int], sources: Iterable[Path]) -> List[Path]:
+        """Most used ``sources`` (at least ``min_uses``) whose frames fit in the budget together."""
+        by_name = {source.name: source for source in sources}
+        ranked = sorted(
+            (name for name, uses in usage.items() if uses >= self.min_uses and name in by_name),
+            key=lambda name: (-usage[name], name),
+        )
+        wanted: List[Path] = []
+        total = 0
+        for name in ranked:
+            estimate = self.estimate_bytes(by_name[name])
+            if estimate is None or total + estimate > self.budget_bytes:
+                continue
+            wanted.append(by_name[name])
+            total += estimate
+        return wanted
+
+    def combined_usage(self, usage: Dict[str, int]) -> Dict[str, int]:
+        """``usage`` plus the last recorded usage of every other account sharing the directory."""
+        combined = dict(usage)
+        folder = self.directory / USAGE_DIR
+        for path in sorted(folder.glob("*.json")) if folder.exists() else []:
+            if path.stem == self.account:
+                continue
+            try:
+                other = json.loads(path.read_text())
+            except (OSError, ValueError) as exc:
+                logger.warning("Ignoring unreadable frame cache usage %s: %s", path.name, exc)
+                continue
+            for name, uses in other.items():
+                combined[name] = combined.get(name, 0) + int(uses)
+        return combined
+
+    def record_usage(self, usage: Dict[str, int]) -> None:
+        path = self.directory / USAGE_DIR / f"{self.account}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.part")
+        partial.write_text(json.dumps(usage, indent=2))
+        os.replace(partial, path)
+
+    def evict(self, keep: Iterable[Path] = (), owned: Optional[Collection[str]] = None) -> int:
+        """Delete every entry (and stale partial file) not for ``keep``; returns bytes freed.
+
+        With ``owned``, only entries for sources of those names are candidates:
+        another account's clips in a different videos directory are left alone.
+        """
+        if not self.directory.exists():
+            return 0
+        keys = {key for key in (self._key(source) for source in keep) if key}
+        freed = 0
+        for key, entry in self.entries().items():
+            if key in keys or (owned is not None and entry.source not in owned):
+                continue
+            freed += entry.nbytes
+            # Unlinking is safe while a render has the file mapped.
+            self._sidecar(key).unlink(missing_ok=True)
+            entry.frames_path.unlink(missing_ok=True)
+        for orphan in self.directory.glob("*.frames"):
+            if orphan.stem not in keys and not self._sidecar(orphan.stem).exists():
+                orphan.unlink(missing_ok=True)
+        for partial in self.directory.glob("*.part"):
+            # "<key>.frames.<pid>.part": left behind if that process died mid-write.
+            pid = partial.suffixes[-2].lstrip(".") if len(partial.suffixes) >= 2 else ""
+            if pid.isdigit() and not _alive(int(pid)):
+                partial.unlink(missing_ok=True)
+        return freed
+
+    def store(self, source: Path, clip: "VideoClip", audio: bool) -> Optional[CachedBackground]:
+        """Write the frames of prepared ``clip`` for ``source``; ``None`` if over budget."""
+        import numpy as np
+
+        key = self._key(source)
+        if key is None:
+            return None
+        duration = clip.duration or 0.0
+        frames = max(1, int(duration * self.fps))
+        width, height = clip.size
+        entry = CachedBackground(
+            frames_path=self.directory / f"{key}.frames",
+            source=source.name,
+            fps=self.fps,
+            frames=frames,
+            size=(width, height),
+            duration=duration,
+            audio=audio,
+        )
+        if self.size_bytes() + entry.nbytes > self.budget_bytes:
+            logger.info("Not caching %s: %.0f MiB would exceed the frame cache budget.", source.name, entry.nbytes / 2**20)
+            return None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        partial = entry.frames_path.with_name(f"{entry.frames_path.name}.{os.getpid()}.part")
+        try:
+            array = np.memmap(partial, dtype=np.uint8, mode="w+", shape=(frames, height, width, 3))
+            for index in range(frames):
+                array[index] = clip.get_frame(index / self.fps)
+            array.flush()
+            del array
+            os.replace(partial, entry.frames_path)
+        finally:
+            partial.unlink(missing_ok=True)
+        meta = {
+            "source": entry.source,
+            "fps": entry.fps,
+            "frames": entry.frames,
+            "size": list(entry.size),
+            "duration": entry.duration,
+            "audio": entry.audio,
+        }
+        self._sidecar(key).write_text(json.dumps(meta, indent=2))
+        return entry
+
+    def refresh(
+        self, usage: Dict[str, int], sources: Iterable[Path], open_prepared: Callable[[Path], ContextManager]
+    ) -> int:
+        """Evict clips that fell out of the plan, then cache the missing ones; returns how many were added.
+
+        ``open_prepared(source)`` yields ``(prepared_clip, has_audio)``.
+        """
+        if not self._lock.acquire():
+            return 0
+        try:
+            sources = list(sources)
+            try:
+                self.record_usage(usage)
+            except OSError as exc:
+                logger.warning("Could not record frame cache usage for %s: %s", self.account, exc)
+            wanted = self.plan(self.combined_usage(usage), sources)
+            freed = self.evict(wanted, owned={source.name for source in sources})
+            if freed:
+                logger.info("Evicted %.0f MiB of cached background frames.", freed / 2**20)
+            added = 0
+            for source in wanted:
+                if self.lookup(source) is not None:
+                    continue
+                try:
+                    with open_prepared(source) as (clip, audio):
+                        if self.store(source, clip, audio) is not None:
+                            added += 1
+                            logger.info("Cached decoded frames of %s.", source.name)
+                except (OSError, ValueError) as exc:
+                    logger.warning("Could not cache frames of %s: %s", source.name, exc)
+            return added
+        finally:
+            self._lock.release()
+
+    def request_refresh(
+        self, usage: Dict[str, int], sources: Iterable[Path], open_prepared: Callable[[Path], ContextManager]
+    ) -> None:
+        """Run :meth:`refresh` in a background thread without blocking the caller.
+
+        The thread is not a daemon: a one-shot run finishes filling the cache before the process exits.
+        """
+        if self._lock.locked():
+            return
+        sources = list(sources)
+        threading.Thread(target=self.refresh, args=(dict(usage), sources, open_prepared), name="frame-cache").start()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def open_cached(entry: CachedBackground, source: Path):
+    """A prepared-background clip served from ``entry``, with the source's audio if it had any."""
+    from moviepy.editor import AudioFileClip
+
+    clip = entry.clip()
+    audio = None
+    if entry.audio:
+        audio = AudioFileClip(str(source))
+        clip = clip.set_audio(audio.subclip(0, min(entry.duration, audio.duration)))
+    try:
+        yield clip
+    finally:
+        if audio is not None:
+            audio.close()
+
+
+__all__ = ["CachedBackground", "FrameCache", "open_cached", "prepared_size"]
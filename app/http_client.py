@@ -0,0 +1,269 @@
+"""Shared HTTP client: pooled connections, retries and a revalidating disk cache."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+from .metrics import REGISTRY, record_count
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+PER_HOST_CONNECTIONS = 4
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Headers that change what a response means; part of the cache key.
+VARY_HEADERS = ("authorization", "accept", "user-agent")
+
+
+def _retry_after(response: "requests.Response") -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """Stores GET bodies with their validators and revalidates them with conditional requests."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, url: str, headers: Mapping[str, str]) -> str:
+        digest = hashlib.sha256(url.encode("utf-8"))
+        for name in VARY_HEADERS:
+            for header, value in headers.items():
+                if header.lower() == name:
+                    digest.update(f"\n{name}:{value}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        meta_path = self.cache_dir / f"{key}.json"
+        body_path = self.cache_dir / f"{key}.body"
+        if not meta_path.exists() or not body_path.exists():
+            return None
+        try:
+            return json.loads(meta_path.read_text())
+        except ValueError:
+            return None
+
+    def body(self, key: str) -> bytes:
+        return (self.cache_dir / f"{key}.body").read_bytes()
+
+    def store(self, key: str, response: "requests.Response") -> None:
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if not any(validators.values()):
+            return
+        meta = {
+            "url": response.url,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() in ("content-type", "etag", "last-modified")},
+            "stored_at": time.time(),
+            **validators,
+        }
+        # Body first, then metadata, each via rename: a reader never pairs new
+        # validators with an old or partial body.
+        for suffix, payload in ((".body", response.content), (".json", json.dumps(meta).encode("utf-8"))):
+            target = self.cache_dir / f"{key}{suffix}"
+            partial = target.with_name(target.name + ".part")
+            partial.write_bytes(payload)
+            partial.replace(target)
+
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def _shared_session() -> "requests.Session":
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=PER_HOST_CONNECTIONS, pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+class HttpClient:
+    """HTTP access for fonts, Pexels and Airtable over one pooled session.
+
+    * Connections are kept alive and limited to ``PER_HOST_CONNECTIONS`` per
+      host; extra callers wait for a free connection.
+    * 429/5xx responses and connection errors are retried with exponential
+      backoff and jitter, honouring ``Retry-After``. Non-idempotent requests
+      (POST) are only retried on 429, which means the request was not processed.
+    * ``GET`` requests made with ``cache=True`` are stored on disk with their
+      ``ETag``/``Last-Modified`` and revalidated; a ``304`` is served from disk.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_retries: int = 4,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    @property
+    def session(self) -> "requests.Session":
+        return _shared_session()
+
+    def _delay(self, attempt: int, response: Optional["requests.Response"]) -> float:
+        retry_after = _retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff_seconds)
+        backoff = min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+        return backoff * random.uniform(0.5, 1.0)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        cache: bool = False,
+        retries: Optional[int] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        **kwargs: Any,
+    ) -> "requests.Response":
+        """Send a request; returns the final response without raising for its status."""
+        import requests
+
+        method = method.upper()
+        retries = self.max_retries if retries is None else retries
+        headers = dict(headers or {})
+        host = urlsplit(url).hostname or ""
+
+        cache_key = meta = None
+        if cache and method == "GET" and self.cache is not None:
+            prepared_url = requests.Request("GET", url, params=kwargs.get("params")).prepare().url or url
+            cache_key = self.cache.key(prepared_url, headers)
+            meta = self.cache.load(cache_key)
+            if meta and meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta and meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        attempt = 0
+        while True:
+            response: Optional[requests.Response] = None
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= retries or method not in IDEMPOTENT_METHODS:
+                    REGISTRY.inc("http_requests_total", host=host, status="error")
+                    raise
+                logger.debug("%s %s failed (%s); retrying.", method, url, exc)
+            else:
+                REGISTRY.inc("http_requests_total", host=host, status=str(response.status_code))
+                retryable = response.status_code in RETRY_STATUSES and (
+                    method in IDEMPOTENT_METHODS or response.status_code == 429
+                )
+                if not retryable or attempt >= retries:
+                    break
+            delay = self._delay(attempt, response)
+            if response is not None:
+                response.close()
+            attempt += 1
+            REGISTRY.inc("http_retries_total", host=host)
+            logger.info(
+                "%s %s returned %s; retry %s/%s in %.1fs.",
+                method,
+                host,
+                response.status_code if response is not None else "a connection error",
+                attempt,
+                retries,
+                delay,
+            )
+            time.sleep(delay)
+
+        if cache_key is not None and self.cache is not None:
+            if response.status_code == 304 and meta:
+                REGISTRY.inc("http_cache_hits_total", host=host)
+                record_count("http_cache_hits")
+                return self._cached_response(cache_key, meta, response)
+            if response.status_code == 200:
+                self.cache.store(cache_key, response)
+        return response
+
+    def _cached_response(
+        self, key: str, meta: Dict[str, Any], revalidation: "requests.Response"
+    ) -> "requests.Response":
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = meta.get("url") or revalidation.url
+        response.headers = CaseInsensitiveDict(meta.get("headers", {}))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = self.cache.body(key)  # type: ignore[union-attr]
+        response.request = revalidation.request
+        response.from_cache = True  # type: ignore[attr-defined]
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> "requests.Response":
+        return self.request("POST", url, **kwargs)
+
+    def download(self, url: str, target: Path, timeout: float = 60, chunk_size: int = 1 << 20) -> Path:
+        """Stream ``url`` into ``target`` via a ``.part`` file so readers never see a partial file."""
+        response = self.request("GET", url, timeout=timeout, stream=True)
+        with response:
+            response.raise_for_status()
+            partial = target.with_suffix(".part")
+            with partial.open("wb") as handle:
+                for chunk in response.iter_content(chunk_size):
+                    handle.write(chunk)
+        partial.replace(target)
+        return target
+
+
+_clients: Dict[Optional[str], HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(cache_dir: Optional[Path] = None) -> HttpClient:
+    """Process-wide client for ``cache_dir`` (``None``: no disk cache)."""
+    key = str(cache_dir) if cache_dir else None
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = HttpClient(cache_dir)
+            _clients[key] = client
+        return client
+
+
+__all__ = ["HttpClient", "ResponseCache", "shared_client"]
@@ -0,0 +1,75 @@
+"""Summarised ``python -X importtime`` reports for CLI commands."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+REPORT_PREFIX = "import time:"
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(lines: Sequence[str]) -> List[ImportTiming]:
+    timings: List[ImportTiming] = []
+    for line in lines:
+        if not line.startswith(REPORT_PREFIX):
+            continue
+        parts = line[len(REPORT_PREFIX):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        timings.append(ImportTiming(stripped, self_us, cumulative_us, depth))
+    return timings
+
+
+def summarize(timings: Sequence[ImportTiming], top: int = 15) -> str:
+    total_us = sum(t.cumulative_us for t in timings if t.depth == 0)
+    by_package: Dict[str, int] = {}
+    for timing in timings:
+        package = timing.module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + timing.self_us
+
+    lines = [f"Import time report: {len(timings)} modules, {total_us / 1000:.1f} ms total"]
+    lines.append("Top packages (self time):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        share = (self_us / total_us * 100) if total_us else 0.0
+        lines.append(f"  {self_us / 1000:9.1f} ms  {share:5.1f}%  {package}")
+    lines.append("Slowest top-level imports (cumulative):")
+    roots = sorted((t for t in timings if t.depth == 0), key=lambda t: t.cumulative_us, reverse=True)
+    for timing in roots[:top]:
+        lines.append(f"  {timing.cumulative_us / 1000:9.1f} ms  {timing.module}")
+    return "\n".join(lines)
+
+
+def run_with_import_report(argv: Sequence[str], top: int = 15) -> int:
+    """Re-run ``argv`` under ``-X importtime`` and print a summary to stderr."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    stderr_lines = result.stderr.splitlines()
+    passthrough = [line for line in stderr_lines if not line.startswith(REPORT_PREFIX)]
+    if passthrough:
+        print("\n".join(passthrough), file=sys.stderr)
+    print(summarize(parse_importtime(stderr_lines), top=top), file=sys.stderr)
+    return result.returncode
+
+
+__all__ = ["ImportTiming", "parse_importtime", "summarize", "run_with_import_report"]
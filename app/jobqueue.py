@@ -0,0 +1,241 @@
+"""Durable job queue shared by the scheduler and render workers."""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from .config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: int
+    account: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue(ABC):
+    """Interface implemented by queue backends.
+
+    Jobs move ``queued -> leased -> done``. A leased job belongs to one worker
+    until its lease expires; workers extend it with :meth:`heartbeat`. Expired
+    leases are returned to the queue (or marked ``failed`` once
+    ``max_attempts`` is used up). At most one job per account is leased at a
+    time so a single account's state file is never written concurrently.
+    """
+
+    @abstractmethod
+    def enqueue(self, account: str, payload: dict, max_attempts: int = 3) -> int:
+        ...
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: int) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: int) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, job_id: int, worker_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def fail(self, job_id: int, worker_id: str, error: str) -> None:
+        ...
+
+    @abstractmethod
+    def has_pending(self, account: str) -> bool:
+        ...
+
+    @abstractmethod
+    def depth(self) -> int:
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    """SQLite-backed queue usable by every node that mounts the data volume.
+
+    The rollback journal is kept (no WAL) because WAL needs shared memory that
+    network filesystems do not provide; writers serialise on ``BEGIN IMMEDIATE``.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    account TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    heartbeat_at REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def enqueue(self, account: str, payload: dict, max_attempts: int = 3) -> int:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (account, payload, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (account, json.dumps(payload), max_attempts, now, now),
+            )
+            return int(cursor.lastrowid)
+
+    def _reap_expired(self, conn: sqlite3.Connection, now: float) -> None:
+        expired = conn.execute(
+            "SELECT id, account, lease_owner, attempts, max_attempts FROM jobs WHERE status = 'leased' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            status = "queued" if row["attempts"] < row["max_attempts"] else "failed"
+            logger.warning(
+                "Lease on job %s (%s) held by %s expired - marking %s.",
+                row["id"],
+                row["account"],
+                row["lease_owner"],
+                status,
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = 'lease expired', updated_at = ? WHERE id = ?",
+                (status, now, row["id"]),
+            )
+
+    def lease(self, worker_id: str, lease_seconds: int) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as conn:
+            self._reap_expired(conn, now)
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE status = 'queued'
+                  AND account NOT IN (SELECT account FROM jobs WHERE status = 'leased')
+                ORDER BY id
+                LIMIT 1
+                """
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, now, row["id"]),
+            )
+            return Job(
+                id=row["id"],
+                account=row["account"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1,
+                max_attempts=row["max_attempts"],
+            )
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: int) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, heartbeat_at = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (now + lease_seconds, now, now, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (time.time(), job_id, worker_id),
+            )
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "lease_owner = NULL, lease_expires = NULL, last_error = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (error[:2000], time.time(), job_id, worker_id),
+            )
+
+    def has_pending(self, account: str) -> bool:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE account = ? AND status IN ('queued', 'leased')", (account,)
+        ).fetchone()
+        return bool(row[0])
+
+    def depth(self) -> int:
+        row = self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'leased')").fetchone()
+        return int(row[0])
+
+
+QueueFactory = Callable[[str], JobQueue]
+
+_BACKENDS: Dict[str, QueueFactory] = {
+    "sqlite": lambda location: SQLiteJobQueue(Path(location)),
+}
+
+
+def register_backend(scheme: str, factory: QueueFactory) -> None:
+    """Register a queue backend for ``JOB_QUEUE_URL`` values starting with ``scheme://``."""
+    _BACKENDS[scheme] = factory
+
+
+def open_queue(config: AppConfig) -> JobQueue:
+    url = config.job_queue.url
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        scheme, location = "sqlite", url
+    elif scheme == "sqlite" and location.startswith("/"):
+        # SQLAlchemy-style URLs: sqlite:///relative/jobs.db, sqlite:////abs/jobs.db
+        location = location[1:]
+    factory = _BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"Unsupported JOB_QUEUE_URL scheme '{scheme}'")
+    return factory(location)
+
+
+__all__ = ["Job", "JobQueue", "SQLiteJobQueue", "open_queue", "register_backend"]
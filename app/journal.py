@@ -0,0 +1,142 @@
+"""Crash-safe journal of the stages a post run has completed."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# In run order; a resumed run skips every stage already recorded.
+STAGES = ("content", "assets", "render", "backup", "upload")
+# A run that keeps crashing at the same point is dropped instead of resumed forever.
+MAX_RESUMES = 3
+MAX_AGE = timedelta(days=1)
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_durably(path: Path, payload: str) -> None:
+    # Write, fsync, rename, fsync the directory: after a crash the journal is
+    # either the previous version or this one, never a torn mix.
+    partial = path.with_name(path.name + ".part")
+    with partial.open("w") as handle:
+        handle.write(payload)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(partial, path)
+    try:
+        fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class RunJournal:
+    """Stages completed by one run, persisted after each stage."""
+
+    def __init__(self, path: Path, data: Dict[str, Any]):
+        self.path = path
+        self.data = data
+
+    @property
+    def run_id(self) -> str:
+        return self.data["run_id"]
+
+    @property
+    def resumes(self) -> int:
+        return self.data.get("resumes", 0)
+
+    @property
+    def last_stage(self) -> Optional[str]:
+        done = [stage for stage in STAGES if stage in self.data["stages"]]
+        return done[-1] if done else None
+
+    def done(self, stage: str) -> bool:
+        return stage in self.data["stages"]
+
+    def get(self, stage: str) -> Dict[str, Any]:
+        return self.data["stages"][stage]
+
+    def record(self, stage: str, **values: Any) -> None:
+        """Durably mark ``stage`` complete with the values needed to skip it on resume."""
+        self.data["stages"][stage] = {
+            key: str(value) if isinstance(value, Path) else value for key, value in values.items()
+        }
+        self._save()
+
+    def close(self) -> None:
+        """The run reached a final outcome; nothing is left to resume."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save(self) -> None:
+        self.data["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+        _write_durably(self.path, json.dumps(self.data, indent=2))
+
+
+class Journal:
+    """The one in-progress run of an account (runs of an account never overlap)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def start(self, run_id: str) -> RunJournal:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        journal = RunJournal(self.path, {"run_id": run_id, "started_at": now, "resumes": 0, "stages": {}})
+        journal._save()
+        return journal
+
+    def pending(self) -> bool:
+        return self.path.exists()
+
+    def resume(self) -> Optional[RunJournal]:
+        """Load an interrupted run, or ``None`` if there is nothing worth resuming."""
+        if not self.path.exists():
+            return None
+        try:
+            data = json.loads(self.path.read_text())
+            started = datetime.fromisoformat(data["started_at"])
+            data["stages"]
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.error("Discarding unreadable run journal %s: %s", self.path, exc)
+            self.path.unlink(missing_ok=True)
+            return None
+
+        journal = RunJournal(self.path, data)
+        if datetime.utcnow() - started > MAX_AGE:
+            logger.warning("Discarding run %s: started %s, too old to resume.", journal.run_id, data["started_at"])
+            journal.close()
+            return None
+        if journal.resumes >= MAX_RESUMES:
+            logger.error(
+                "Discarding run %s after %s resumes (last stage: %s).",
+                journal.run_id,
+                journal.resumes,
+                journal.last_stage,
+            )
+            journal.close()
+            return None
+        data["resumes"] = journal.resumes + 1
+        journal._save()
+        return journal
+
+
+__all__ = ["Journal", "RunJournal", "STAGES", "file_sha256"]
@@ -0,0 +1,462 @@
+"""End-to-end load tests against local stand-ins for OpenAI, Pexels and the upload endpoint."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from .benchmarks import bench_config
+from .config import AppConfig
+from .metrics import percentile
+from .resources import child_pids, rss_bytes
+from .synthetic import generate_assets, make_background
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("openai", "pexels_search", "pexels_download", "upload")
+# Distinct ffmpeg test patterns, so stand-in downloads are not near duplicates of each other.
+CLIP_SOURCES = ("testsrc", "smptebars", "rgbtestsrc", "yuvtestsrc", "smptehdbars")
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class EndpointProfile:
+    """How one stand-in endpoint behaves: added latency, injected errors and throughput."""
+
+    latency_seconds: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Response (download) or request (upload) body throughput; 0 is unthrottled.
+    bandwidth_bytes_per_second: float = 0.0
+
+
+class StandInServices:
+    """One local HTTP server emulating every external service the pipeline calls.
+
+    * ``POST /v1/responses``: OpenAI Responses API returning a JSON post payload.
+    * ``GET /videos/search`` and ``GET /files/<id>.mp4``: Pexels search and downloads,
+      serving ``clips`` round-robin under unique ids.
+    * ``POST /upload``: the upload endpoint; reads and discards the video.
+    """
+
+    def __init__(self, clips: Sequence[Path], profiles: Optional[Dict[str, EndpointProfile]] = None, seed: int = 0):
+        self.clips = [clip.read_bytes() for clip in clips]
+        self.profiles = {name: EndpointProfile() for name in ENDPOINTS}
+        self.profiles.update(profiles or {})
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None, "stand-ins are not running"
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> "StandInServices":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler signature
+                logger.debug("stand-in: " + format, *args)
+
+            def do_GET(self):
+                services._handle(self, "GET")
+
+            def do_POST(self):
+                services._handle(self, "POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stand-in-services", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"requests": self.requests[name], "errors": self.errors[name], "bytes": self.bytes[name]}
+            for name in ENDPOINTS
+        }
+
+    # ----------------------------
+    # Request handling
+    # ----------------------------
+    def _route(self, method: str, path: str) -> Optional[str]:
+        if method == "POST" and path.rstrip("/").endswith("/responses"):
+            return "openai"
+        if method == "GET" and path == "/videos/search":
+            return "pexels_search"
+        if method == "GET" and path.startswith("/files/"):
+            return "pexels_download"
+        if method == "POST" and path == "/upload":
+            return "upload"
+        return None
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlsplit(handler.path)
+        endpoint = self._route(method, url.path)
+        if endpoint is None:
+            self._send(handler, 404, b'{"error": "not found"}')
+            return
+        profile = self.profiles[endpoint]
+        with self._lock:
+            self.requests[endpoint] += 1
+            failed = self._random.random() < profile.error_rate
+        if profile.latency_seconds:
+            time.sleep(profile.latency_seconds)
+
+        body = self._read_body(handler, profile)
+        self.bytes[endpoint] += len(body)
+        if failed:
+            with self._lock:
+                self.errors[endpoint] += 1
+            self._send(handler, profile.error_status, b'{"error": "injected"}', headers={"Retry-After": "1"})
+            return
+
+        if endpoint == "openai":
+            self._send(handler, 200, self._openai_response())
+        elif endpoint == "pexels_search":
+            self._send(handler, 200, self._pexels_search(parse_qs(url.query)))
+        elif endpoint == "pexels_download":
+            clip_id = int(Path(url.path).stem)
+            payload = self.clips[clip_id % len(self.clips)]
+            self.bytes[endpoint] += len(payload)
+            self._send(handler, 200, payload, content_type="video/mp4", profile=profile)
+        else:
+            self._send(handler, 200, json.dumps({"ok": True, "bytes": len(body)}).encode("utf-8"))
+
+    def _read_body(self, handler: BaseHTTPRequestHandler, profile: EndpointProfile) -> bytes:
+        remaining = int(handler.headers.get("Content-Length") or 0)
+        chunks: List[bytes] = []
+        while remaining > 0:
+            chunk = handler.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            if profile.bandwidth_bytes_per_second:
+                time.sleep(len(chunk) / profile.bandwidth_bytes_per_second)
+        return b"".join(chunks)
+
+    def _send(
+        self,
+        handler: BaseHTTPRequestHandler,
+        status: int,
+        payload: bytes,
+        content_type: str = "application/json",
+        headers: Optional[Dict[str, str]] = None,
+        profile: Optional[EndpointProfile] = None,
+    ) -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        rate = profile.bandwidth_bytes_per_second if profile else 0
+        for offset in range(0, len(payload), CHUNK_SIZE):
+            chunk = payload[offset : offset + CHUNK_SIZE]
+            handler.wfile.write(chunk)
+            if rate:
+                time.sleep(len(chunk) / rate)
+
+    def _openai_response(self) -> bytes:
+        with self._lock:
+            number = self._random.randrange(1_000_000)
+        post = {
+            "quote": f"Small steps every day add up to big results ({number}).",
+            "caption": f"Keep going. #motivation #mindset #loadtest{number}",
+            "keywords": ["motivation", "mindset", "discipline", "growth", "focus"],
+        }
+        response = {
+            "id": f"resp_{number}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": "stand-in",
+            "output": [
+                {
+                    "type": "message",
+                    "id": f"msg_{number}",
+                    "status": "completed",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": json.dumps(post), "annotations": []}],
+                }
+            ],
+            "usage": {"input_tokens": 120, "output_tokens": 80, "total_tokens": 200},
+        }
+        return json.dumps(response).encode("utf-8")
+
+    def _pexels_search(self, query: Dict[str, List[str]]) -> bytes:
+        term = query.get("query", [""])[0]
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["5"])[0])
+        # Stable, unique ids per (query, page, slot) so each fetch brings new clips.
+        base = (sum(map(ord, term)) * 10_000 + page * per_page) * 100
+        videos = [
+            {
+                "id": base + slot,
+                "video_files": [
+                    {"link": f"{self.base_url}/files/{base + slot}.mp4", "width": 1080, "height": 1920},
+                ],
+            }
+            for slot in range(per_page)
+        ]
+        return json.dumps({"page": page, "per_page": per_page, "videos": videos}).encode("utf-8")
+
+
+class _MemorySampler:
+    """Peak RSS of this process and of its child processes (ffmpeg) while running."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_self = 0
+        self.peak_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="loadtest-memory", daemon=True)
+
+    def __enter__(self) -> "_MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        pid = os.getpid()
+        while not self._stop.is_set():
+            own = rss_bytes(pid)
+            total = own + sum(rss_bytes(child) for child in child_pids())
+            self.peak_self = max(self.peak_self, own)
+            self.peak_total = max(self.peak_total, total)
+            self._stop.wait(self.interval)
+
+
+@dataclass
+class LoadReport:
+    posts_requested: int
+    rate_per_hour: float
+    accounts: int
+    wall_seconds: float
+    statuses: Dict[str, int]
+    missed_slots: int
+    errors: List[str]
+    stage_seconds: Dict[str, List[float]]
+    peak_rss_bytes: int
+    peak_total_rss_bytes: int
+    services: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    @property
+    def posts_per_hour(self) -> float:
+        return self.statuses.get("posted", 0) / self.wall_seconds * 3600 if self.wall_seconds else 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "posts_requested": self.posts_requested,
+            "rate_per_hour": self.rate_per_hour,
+            "accounts": self.accounts,
+            "wall_seconds": self.wall_seconds,
+            "posts_per_hour": self.posts_per_hour,
+            "statuses": self.statuses,
+            "missed_slots": self.missed_slots,
+            "errors": self.errors,
+            "stages": {
+                name: {
+                    "count": len(values),
+                    "p50": percentile(values, 0.5),
+                    "p90": percentile(values, 0.9),
+                    "p99": percentile(values, 0.99),
+                    "max": max(values),
+                }
+                for name, values in sorted(self.stage_seconds.items())
+            },
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_total_rss_bytes": self.peak_total_rss_bytes,
+            "services": self.services,
+        }
+
+    def format(self) -> str:
+        data = self.as_dict()
+        lines = [
+            f"Load test: {self.posts_requested} post(s) at {self.rate_per_hour:g}/h over {self.accounts} account(s)",
+            f"  wall time       {self.wall_seconds:.1f}s",
+            f"  posts/hour      {self.posts_per_hour:.1f}",
+            f"  outcomes        {', '.join(f'{k}={v}' for k, v in sorted(self.statuses.items())) or 'none'}",
+            f"  missed slots    {self.missed_slots}",
+            f"  peak RSS        {self.peak_rss_bytes / 2**20:.0f} MiB (with children {self.peak_total_rss_bytes / 2**20:.0f} MiB)",
+            "  stage latency (s)           count      p50      p90      p99      max",
+        ]
+        for name, stats in data["stages"].items():  # type: ignore[union-attr]
+            lines.append(
+                f"    {name:<26}{stats['count']:>6}{stats['p50']:>9.2f}{stats['p90']:>9.2f}"
+                f"{stats['p99']:>9.2f}{stats['max']:>9.2f}"
+            )
+        lines.append("  stand-ins                   requests   errors        MiB")
+        for name, stats in self.services.items():
+            lines.append(f"    {name:<26}{stats['requests']:>8}{stats['errors']:>9}{stats['bytes'] / 2**20:>11.1f}")
+        for error in self.errors[:5]:
+            lines.append(f"  error: {error}")
+        return "\n".join(lines)
+
+
+def loadtest_config(root: Path, base_url: str) -> AppConfig:
+    """An offline config whose OpenAI, Pexels and upload endpoints are the stand-ins."""
+    config = bench_config(root)
+    return dataclasses.replace(
+        config,
+        openai_api_key="stand-in",
+        openai_base_url=f"{base_url}/v1",
+        openai_max_cost=1e9,
+        pexels_api_key="stand-in",
+        pexels_api_url=base_url,
+        tiktok_session_id="stand-in",
+        tiktok_upload_url=f"{base_url}/upload",
+        max_posts_per_day=10**6,
+        replenish=dataclasses.replace(config.replenish, enabled=True, low_watermark=3, clips_per_fetch=2),
+        metrics_port=0,
+    )
+
+
+def run_load_test(
+    posts: int = 10,
+    rate_per_hour: float = 360.0,
+    accounts: int = 1,
+    profiles: Optional[Dict[str, EndpointProfile]] = None,
+    clip_seconds: float = 3.0,
+    work_dir: Optional[Path] = None,
+    seed: int = 0,
+) -> LoadReport:
+    """Drive ``posts`` scheduler runs at ``rate_per_hour`` through the full pipeline.
+
+    Each account gets a :class:`SchedulerService` whose job is fired on the
+    test's own clock instead of apscheduler's; like ``max_instances=1``, a
+    slot for an account that is still posting is missed.
+
+    Without ``work_dir`` the run happens in a temporary directory that is
+    removed afterwards; pass one to keep the logs and ``runs.jsonl``.
+    """
+    from .scheduler import SchedulerService
+
+    if work_dir is None:
+        with tempfile.TemporaryDirectory(prefix="tiktok-loadtest-") as tmp:
+            return run_load_test(posts, rate_per_hour, accounts, profiles, clip_seconds, Path(tmp), seed)
+
+    root = work_dir
+    assets = generate_assets(root / "synthetic", backgrounds=((540, 960, clip_seconds),), audio_seconds=clip_seconds)
+    clips = [
+        make_background(root / "synthetic" / "pexels" / f"{source}.mp4", 540, 960, clip_seconds, source=source)
+        for source in CLIP_SOURCES
+    ]
+
+    with StandInServices(clips, profiles, seed=seed) as services:
+        config = loadtest_config(root, services.base_url)
+        paths = config.paths
+        for directory, files in (
+            (paths.videos_dir, list(assets.backgrounds.values())),
+            (paths.music_dir, assets.music),
+            (paths.featured_images_dir, assets.featured),
+            (paths.inline_images_dir, assets.inline),
+        ):
+            directory.mkdir(parents=True, exist_ok=True)
+            for path in files:
+                shutil.copy2(path, directory / path.name)
+
+        schedulers = [
+            SchedulerService(
+                dataclasses.replace(
+                    config,
+                    account_name=f"loadtest-{index}",
+                    paths=dataclasses.replace(paths, state_file=root / f"state-{index}.json"),
+                )
+            )
+            for index in range(accounts)
+        ]
+        busy = [threading.Lock() for _ in schedulers]
+        errors: List[str] = []
+        missed = 0
+
+        def fire(index: int) -> None:
+            try:
+                schedulers[index].run_job()
+            except Exception as exc:
+                logger.exception("Load test run for account %s failed", index)
+                errors.append(repr(exc))
+            finally:
+                busy[index].release()
+
+        started_at = datetime.utcnow().isoformat(timespec="seconds")
+        interval = 3600.0 / rate_per_hour if rate_per_hour > 0 else 0.0
+        started = time.perf_counter()
+        with _MemorySampler() as memory, ThreadPoolExecutor(max_workers=accounts) as pool:
+            for slot in range(posts):
+                delay = started + slot * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                index = slot % accounts
+                if not busy[index].acquire(blocking=False):
+                    missed += 1
+                    continue
+                pool.submit(fire, index)
+        wall_seconds = time.perf_counter() - started
+        for scheduler in schedulers:
+            scheduler.poster.replenisher.stop()
+            scheduler.poster.airtable.stop()
+
+    statuses: Counter = Counter()
+    stage_seconds: Dict[str, List[float]] = {}
+    runs_file = config.paths.logs_dir / "runs.jsonl"
+    if runs_file.exists():
+        for line in runs_file.read_text().splitlines():
+            record = json.loads(line)
+            if record.get("started_at", "") < started_at or not record.get("account", "").startswith("loadtest-"):
+                continue
+            statuses[record["status"]] += 1
+            for stage, seconds in record.get("stages", {}).items():
+                stage_seconds.setdefault(stage, []).append(seconds)
+
+    return LoadReport(
+        posts_requested=posts,
+        rate_per_hour=rate_per_hour,
+        accounts=accounts,
+        wall_seconds=wall_seconds,
+        statuses=dict(statuses),
+        missed_slots=missed,
+        errors=errors,
+        stage_seconds=stage_seconds,
+        peak_rss_bytes=memory.peak_self,
+        peak_total_rss_bytes=memory.peak_total,
+        services=services.stats(),
+    )
+
+
+__all__ = ["EndpointProfile", "LoadReport", "StandInServices", "loadtest_config", "run_load_test"]
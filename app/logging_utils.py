@@ -2,33 +2,130 @@
 
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Optional
 
+from .metrics import current_run, current_stage
 
-def configure_logging(logs_dir: Path, level: str = "INFO") -> None:
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    log_file = logs_dir / "tiktok_poster.log"
+_listener: Optional[QueueListener] = None
+_EXC_FORMATTER = logging.Formatter()
+
+
+class RunContextFilter(logging.Filter):
+    """Attach the active run ID, account and stage to each record.
+
+    Runs on the calling thread (before the record is queued) because run and
+    stage are tracked in context variables.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        run = current_run()
+        record.run_id = run.record.run_id if run else None
+        record.account = run.record.account if run else None
+        record.stage = current_stage()
+        return True
+
+
+class ExceptionPreservingQueueHandler(QueueHandler):
+    """Queue records with their traceback kept as ``exc_text``.
+
+    The stock ``prepare`` folds the traceback into the message and drops
+    ``exc_info``, which leaves formatters on the listener thread (the JSON
+    one in particular) nothing to put in a separate field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+        # Tracebacks hold frames alive; the queued copy only needs the text.
+        record.exc_info = None
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.fromtimestamp(record.created, timezone.utc)
+        payload = {
+            "ts": created.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "account": getattr(record, "account", None),
+            "stage": getattr(record, "stage", None),
+            "thread": record.threadName,
+        }
+        exc = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exc:
+            payload["exc"] = exc
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def configure_logging(logs_dir: Path, level: Optional[str] = None, json_lines: Optional[bool] = None) -> None:
+    """Route root logging through a queue drained by a background writer thread.
+
+    ``level`` defaults to the ``LOG_LEVEL`` env var and ``json_lines`` to
+    ``LOG_FORMAT=json``. Callers only pay for enqueueing a record; file writes
+    and rotation happen on the listener thread.
+    """
+    global _listener
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_lines is None:
+        json_lines = os.getenv("LOG_FORMAT", "text").lower() == "json"
 
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, level.upper(), logging.INFO))
 
     # Avoid duplicate handlers if configure_logging is called multiple times.
-    if not any(isinstance(h, RotatingFileHandler) for h in root_logger.handlers):
-        file_handler = RotatingFileHandler(log_file, maxBytes=2_000_000, backupCount=5)
-        file_formatter = logging.Formatter(
-            "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
-        )
-        file_handler.setFormatter(file_formatter)
-        root_logger.addHandler(file_handler)
-
-    if not any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers):
-        stream_handler = logging.StreamHandler()
-        stream_formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
-        stream_handler.setFormatter(stream_formatter)
-        root_logger.addHandler(stream_handler)
-
-
-__all__ = ["configure_logging"]
+    if _listener is not None or any(isinstance(h, QueueHandler) for h in root_logger.handlers):
+        return
+
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    log_file = logs_dir / ("tiktok_poster.jsonl" if json_lines else "tiktok_poster.log")
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=2_000_000, backupCount=5)
+    if json_lines:
+        file_handler.setFormatter(JsonLinesFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = ExceptionPreservingQueueHandler(log_queue)
+    queue_handler.addFilter(RunContextFilter())
+    root_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+__all__ = [
+    "configure_logging",
+    "stop_logging",
+    "ExceptionPreservingQueueHandler",
+    "JsonLinesFormatter",
+    "RunContextFilter",
+]
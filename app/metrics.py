@@ -0,0 +1,289 @@
+"""Per-stage run metrics and a small Prometheus/health HTTP endpoint."""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "tiktok"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: object) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    """Escape a label value as the Prometheus text exposition format requires."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values`` (0.0 when empty); ``fraction`` is in [0, 1]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and summaries rendered in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._summaries: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: object) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _labels(**labels)
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: object) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(**labels)] = value
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            stats = series.setdefault(_labels(**labels), [0.0, 0.0])
+            stats[0] += value
+            stats[1] += 1
+
+    def render_prometheus(self) -> str:
+        def fmt(labels: Labels) -> str:
+            if not labels:
+                return ""
+            body = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+            return "{" + body + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{METRIC_PREFIX}_{name}{fmt(labels)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+                for labels, value in series.items():
+                    lines.append(f"{METRIC_PREFIX}_{name}{fmt(labels)} {value}")
+            for name, series in sorted(self._summaries.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} summary")
+                for labels, (total, count) in series.items():
+                    lines.append(f"{METRIC_PREFIX}_{name}_sum{fmt(labels)} {total}")
+                    lines.append(f"{METRIC_PREFIX}_{name}_count{fmt(labels)} {int(count)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+@dataclass
+class RunRecord:
+    run_id: str
+    account: str
+    started_at: str
+    finished_at: str = ""
+    status: str = "running"
+    stages: Dict[str, float] = field(default_factory=dict)
+    counters: Dict[str, float] = field(default_factory=dict)
+    timeline: List[Dict[str, object]] = field(default_factory=list)
+
+
+# Called with (stage_name, entering) around every stage; used by the profiler.
+StageHook = Callable[[str, bool], None]
+STAGE_HOOKS: List[StageHook] = []
+
+_current_run: contextvars.ContextVar[Optional["RunMetrics"]] = contextvars.ContextVar("current_run", default=None)
+
+
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_stage", default=None)
+
+
+def current_run() -> Optional["RunMetrics"]:
+    return _current_run.get()
+
+
+def current_stage() -> Optional[str]:
+    return _current_stage.get()
+
+
+class RunMetrics:
+    """Collects stage timings and counters for one ``run_once`` invocation.
+
+    While a run is active it is reachable through :func:`current_run`, so
+    components such as ``VideoProcessor`` can record counters without extra
+    plumbing. Finished records are appended to ``runs.jsonl`` and folded into
+    :data:`REGISTRY`.
+    """
+
+    def __init__(self, account: str, runs_file: Optional[Path] = None, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.runs_file = runs_file
+        self._started = time.perf_counter()
+        self.record = RunRecord(
+            run_id=uuid.uuid4().hex[:12],
+            account=account,
+            started_at=datetime.utcnow().isoformat(timespec="seconds"),
+        )
+        self._token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> "RunMetrics":
+        self._token = _current_run.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.finish("error")
+        elif self.record.status == "running":
+            self.finish("ok")
+        if self._token is not None:
+            _current_run.reset(self._token)
+            self._token = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        offset = start - self._started
+        for hook in STAGE_HOOKS:
+            hook(name, True)
+        stage_token = _current_stage.set(name)
+        try:
+            yield
+        finally:
+            _current_stage.reset(stage_token)
+            for hook in STAGE_HOOKS:
+                hook(name, False)
+            elapsed = time.perf_counter() - start
+            self.record.stages[name] = self.record.stages.get(name, 0.0) + elapsed
+            self.record.timeline.append({"stage": name, "start": round(offset, 4), "duration": round(elapsed, 4)})
+            self.registry.observe("stage_duration_seconds", elapsed, stage=name, account=self.record.account)
+
+    def count(self, name: str, value: float = 1.0) -> None:
+        self.record.counters[name] = self.record.counters.get(name, 0.0) + value
+        self.registry.inc(f"{name}_total", value, account=self.record.account)
+
+    def gauge(self, name: str, value: float) -> None:
+        self.record.counters[name] = value
+        self.registry.set_gauge(name, value, account=self.record.account)
+
+    def finish(self, status: str) -> RunRecord:
+        self.record.status = status
+        self.record.finished_at = datetime.utcnow().isoformat(timespec="seconds")
+        total = time.perf_counter() - self._started
+        self.record.stages["total"] = total
+        self.registry.inc("runs_total", status=status, account=self.record.account)
+        self.registry.observe("run_duration_seconds", total, account=self.record.account)
+        self.registry.set_gauge("last_run_timestamp_seconds", time.time(), account=self.record.account)
+        if self.runs_file:
+            try:
+                self.runs_file.parent.mkdir(parents=True, exist_ok=True)
+                with self.runs_file.open("a") as handle:
+                    handle.write(json.dumps(asdict(self.record)) + "\n")
+            except Exception as exc:
+                logger.warning("Unable to persist run record: %s", exc)
+        return self.record
+
+
+def record_count(name: str, value: float = 1.0) -> None:
+    """Add to a counter on the active run, if any."""
+    run = current_run()
+    if run is not None:
+        run.count(name, value)
+
+
+@contextmanager
+def record_stage(name: str) -> Iterator[None]:
+    """Time a stage on the active run, if any."""
+    run = current_run()
+    if run is None:
+        yield
+        return
+    with run.stage(name):
+        yield
+
+
+HealthProvider = Callable[[], Dict[str, object]]
+
+
+class MetricsServer:
+    """Serves ``/metrics`` (Prometheus text) and ``/health`` (JSON) on a local port."""
+
+    def __init__(self, port: int, health: Optional[HealthProvider] = None, host: str = "0.0.0.0"):
+        self.port = port
+        self.host = host
+        self.health = health or (lambda: {})
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                if self.path.startswith("/metrics"):
+                    body = REGISTRY.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path.startswith("/health"):
+                    payload = {"status": "ok"}
+                    try:
+                        payload.update(server.health())
+                    except Exception as exc:
+                        payload = {"status": "error", "error": str(exc)}
+                    body = json.dumps(payload, default=str).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                logger.debug("metrics http: " + format, *args)
+
+        return Handler
+
+    def start(self) -> None:
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Metrics endpoint listening on %s:%s", self.host, self.port)
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+__all__ = [
+    "REGISTRY",
+    "STAGE_HOOKS",
+    "HealthProvider",
+    "MetricsRegistry",
+    "MetricsServer",
+    "RunMetrics",
+    "RunRecord",
+    "current_run",
+    "current_stage",
+    "percentile",
+    "record_count",
+    "record_stage",
+]
@@ -0,0 +1,213 @@
+"""Assemble a longer background from several short clips with ffmpeg."""
+
+from __future__ import annotations
+
+import logging
+import re
+import subprocess
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+)(?: \(([^)]*)\))?")
+_AUDIO = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+)")
+_SIZE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS = re.compile(r"([\d.]+) fps")
+_TBN = re.compile(r"([\d.]+k?) tbn")
+_RATE = re.compile(r"(\d+) Hz")
+_PARENS = re.compile(r"\([^()]*\)")
+
+
+class RenderInputError(Exception):
+    """A render input could not be read; ``path`` names the clip to blame.
+
+    Kept apart from ``OSError`` so failures on the output side (a full disk,
+    say) are not mistaken for a bad background.
+    """
+
+    def __init__(self, path: Path, reason: str):
+        # Both in ``args`` so the error survives pickling out of render workers.
+        super().__init__(path, reason)
+        self.path = path
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return f"{self.path.name}: {self.reason}"
+
+
+@dataclass(frozen=True)
+class ClipInfo:
+    """Stream parameters of a clip, as far as concat-by-copy cares."""
+
+    duration: float
+    video_codec: str
+    profile: str
+    pix_fmt: str
+    width: int
+    height: int
+    fps: str
+    timebase: str
+    audio: Optional[Tuple[str, str, str]]
+
+    @property
+    def concat_key(self) -> tuple:
+        """Clips with equal keys can be joined by the concat demuxer without re-encoding."""
+        return (
+            self.video_codec,
+            self.profile,
+            self.pix_fmt,
+            self.width,
+            self.height,
+            self.fps,
+            self.timebase,
+            self.audio,
+        )
+
+
+def _ffmpeg() -> str:
+    from moviepy.config import get_setting
+
+    return get_setting("FFMPEG_BINARY")
+
+
+def parse_probe(output: str) -> Optional[ClipInfo]:
+    """Parse the stream summary ``ffmpeg -i`` prints; ``None`` without a video stream."""
+    duration_match = _DURATION.search(output)
+    video_line = next((line for line in output.splitlines() if _VIDEO.search(line)), None)
+    if not duration_match or video_line is None:
+        return None
+    hours, minutes, seconds = duration_match.groups()
+    codec, profile = _VIDEO.search(video_line).groups()  # type: ignore[union-attr]
+    # Drop parenthesised details ("yuv420p(tv, bt709)") so fields split on commas.
+    flat = video_line.split(": Video: ", 1)[1]
+    while _PARENS.search(flat):
+        flat = _PARENS.sub("", flat)
+    fields = [field.strip() for field in flat.split(",")]
+    size = _SIZE.search(flat)
+    fps = _FPS.search(flat)
+    tbn = _TBN.search(flat)
+
+    audio = None
+    audio_line = next((line for line in output.splitlines() if _AUDIO.search(line)), None)
+    if audio_line is not None:
+        audio_flat = _PARENS.sub("", audio_line.split(": Audio: ", 1)[1])
+        audio_fields = [field.strip() for field in audio_flat.split(",")]
+        rate = _RATE.search(audio_flat)
+        audio = (
+            audio_fields[0].split()[0],
+            rate.group(1) if rate else "",
+            audio_fields[2] if len(audio_fields) > 2 else "",
+        )
+
+    return ClipInfo(
+        duration=int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        video_codec=codec,
+        profile=profile or "",
+        pix_fmt=fields[1] if len(fields) > 1 else "",
+        width=int(size.group(1)) if size else 0,
+        height=int(size.group(2)) if size else 0,
+        fps=fps.group(1) if fps else "",
+        timebase=tbn.group(1) if tbn else "",
+        audio=audio,
+    )
+
+
+@lru_cache(maxsize=512)
+def _probe(path: str, mtime_ns: int, size: int) -> Optional[ClipInfo]:
+    result = subprocess.run([_ffmpeg(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    return parse_probe(result.stderr)
+
+
+def probe_clip(path: Path) -> Optional[ClipInfo]:
+    """Probe ``path`` once per file version; ``None`` if it is unreadable."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return _probe(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _quote(path: Path) -> str:
+    # concat demuxer list syntax: single quotes, embedded quotes escaped.
+    return "'" + str(path.resolve()).replace("'", "'\\''") + "'"
+
+
+def _failed_input(clips: Sequence[Path], stderr: str) -> Optional[Path]:
+    """The clip a failed montage choked on, or ``None`` if every input decodes."""
+    unique = list(dict.fromkeys(clips))
+    for clip in unique:
+        if str(clip) in stderr or str(clip.resolve()) in stderr:
+            return clip
+    # ffmpeg does not always say which input broke; decode each one to find out.
+    for clip in unique:
+        check = subprocess.run(
+            [_ffmpeg(), "-v", "error", "-xerror", "-i", str(clip), "-map", "0:v", "-f", "null", "-"],
+            capture_output=True,
+        )
+        if check.returncode != 0:
+            return clip
+    return None
+
+
+def _run(command: List[str], clips: Sequence[Path]) -> None:
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        stderr = result.stderr.strip()
+        clip = _failed_input(clips, stderr)
+        if clip is None:
+            # The inputs are fine, so the output side failed.
+            raise RuntimeError(f"ffmpeg montage failed: {stderr}")
+        raise RenderInputError(clip, f"ffmpeg montage failed: {stderr}")
+
+
+def build_montage(clips: Sequence[Path], output_path: Path, fps: int) -> bool:
+    """Join ``clips`` (repeats allowed) into ``output_path``.
+
+    Clips whose stream parameters all match are joined by the concat demuxer
+    with stream copy: no decode, no encode. Otherwise they are scaled to the
+    first clip's size and re-encoded once. Returns ``True`` for stream copy.
+    """
+    infos = [probe_clip(clip) for clip in clips]
+    for clip, info in zip(clips, infos):
+        if info is None:
+            raise RenderInputError(clip, "unreadable clip in montage")
+    command = [_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y"]
+
+    if len({info.concat_key for info in infos}) == 1:  # type: ignore[union-attr]
+        listing = output_path.with_suffix(".txt")
+        listing.write_text("".join(f"file {_quote(clip)}\n" for clip in clips))
+        try:
+            _run(command + ["-f", "concat", "-safe", "0", "-i", str(listing), "-c", "copy", str(output_path)], clips)
+        finally:
+            listing.unlink(missing_ok=True)
+        return True
+
+    first = infos[0]
+    width, height = first.width, first.height  # type: ignore[union-attr]
+    inputs: List[str] = []
+    filters: List[str] = []
+    for index, clip in enumerate(clips):
+        inputs += ["-i", str(clip)]
+        filters.append(
+            f"[{index}:v]scale={width}:{height}:force_original_aspect_ratio=increase,"
+            f"crop={width}:{height},setsar=1,fps={fps},format=yuv420p[v{index}]"
+        )
+    joined = "".join(f"[v{index}]" for index in range(len(clips)))
+    filters.append(f"{joined}concat=n={len(clips)}:v=1:a=0[out]")
+    # Background audio is dropped here: clips without an audio stream cannot
+    # join the concat filter, and the music track is mixed in later anyway.
+    _run(
+        command
+        + inputs
+        + ["-filter_complex", ";".join(filters), "-map", "[out]", "-an"]
+        + ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", str(output_path)],
+        clips,
+    )
+    return False
+
+
+__all__ = ["ClipInfo", "RenderInputError", "build_montage", "parse_probe", "probe_clip"]
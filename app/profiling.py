@@ -0,0 +1,219 @@
+"""Profiling mode for run-once and batch rendering."""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .resources import child_pids, rss_bytes
+
+logger = logging.getLogger(__name__)
+
+_active: Optional["Profiler"] = None
+
+
+def active_profiler() -> Optional["Profiler"]:
+    return _active
+
+
+class Profiler:
+    """Captures a cProfile dump, sampled stacks, per-frame render timings and per-stage RSS.
+
+    Outputs written by :meth:`write` next to a target path:
+
+    * ``.prof`` - cProfile stats (snakeviz, gprof2dot, flameprof, ``pstats``)
+    * ``.folded`` - sampled collapsed stacks (flamegraph.pl, speedscope, inferno)
+    * ``.profile.json`` - sampled per-frame decode/composite/encode times and
+      peak RSS (self and child ffmpeg processes) per run stage
+    """
+
+    def __init__(self, frame_sample_every: int = 10, sample_interval: float = 0.005):
+        self.frame_sample_every = max(1, frame_sample_every)
+        self.sample_interval = sample_interval
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._target_thread = threading.get_ident()
+        self._stacks: Counter = Counter()
+        self._stage_stack: List[str] = []
+        self._stage_rss: Dict[str, Dict[str, int]] = {}
+        self._frames: List[Dict[str, float]] = []
+        self._totals = {"frames": 0, "decode": 0.0, "composite": 0.0, "encode": 0.0}
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def __enter__(self) -> "Profiler":
+        global _active
+        _active = self
+        self._target_thread = threading.get_ident()
+        metrics.STAGE_HOOKS.append(self._on_stage)
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        global _active
+        self._profile.disable()
+        self._elapsed = time.perf_counter() - self._started
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join(timeout=2)
+        if self._on_stage in metrics.STAGE_HOOKS:
+            metrics.STAGE_HOOKS.remove(self._on_stage)
+        _active = None
+
+    def _on_stage(self, name: str, entering: bool) -> None:
+        if threading.get_ident() != self._target_thread:
+            return
+        if entering:
+            self._stage_stack.append(name)
+        elif self._stage_stack and self._stage_stack[-1] == name:
+            self._stage_stack.pop()
+
+    def _sample_loop(self) -> None:
+        pid = os.getpid()
+        next_rss = 0.0
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is not None:
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+
+            now = time.perf_counter()
+            if now < next_rss:
+                continue
+            next_rss = now + 0.05
+            own = rss_bytes(pid)
+            children = sum(rss_bytes(child) for child in child_pids())
+            for stage in list(self._stage_stack) or ["(outside stages)"]:
+                peak = self._stage_rss.setdefault(stage, {"self": 0, "children": 0, "total": 0})
+                peak["self"] = max(peak["self"], own)
+                peak["children"] = max(peak["children"], children)
+                peak["total"] = max(peak["total"], own + children)
+
+    # ----------------------------
+    # Render loop instrumentation
+    # ----------------------------
+    def instrument_render(self, background: Any, video: Any) -> None:
+        """Wrap ``get_frame`` on the prepared background and the final composite.
+
+        Decode time is spent inside the background's ``get_frame``; composite
+        time is the rest of the composite's ``get_frame``; encode time is the
+        gap until the writer asks for the next frame.
+        """
+        decode_get = background.get_frame
+        composite_get = video.get_frame
+        state = {"decode": 0.0, "last_end": None, "index": 0}
+
+        def timed_decode(t):
+            start = time.perf_counter()
+            try:
+                return decode_get(t)
+            finally:
+                state["decode"] += time.perf_counter() - start
+
+        def timed_composite(t):
+            start = time.perf_counter()
+            encode = start - state["last_end"] if state["last_end"] is not None else 0.0
+            state["decode"] = 0.0
+            frame = composite_get(t)
+            end = time.perf_counter()
+            decode = state["decode"]
+            composite = end - start - decode
+            index = state["index"]
+            state["index"] = index + 1
+            state["last_end"] = end
+
+            self._totals["frames"] += 1
+            self._totals["decode"] += decode
+            self._totals["composite"] += composite
+            self._totals["encode"] += encode
+            if index % self.frame_sample_every == 0:
+                self._frames.append(
+                    {
+                        "frame": index,
+                        "t": round(float(t), 4),
+                        "decode_ms": round(decode * 1000, 3),
+                        "composite_ms": round(composite * 1000, 3),
+                        "prev_encode_ms": round(encode * 1000, 3),
+                    }
+                )
+            return frame
+
+        background.get_frame = timed_decode
+        video.get_frame = timed_composite
+
+    def frame_timings(self) -> Dict[str, Any]:
+        """Per-frame totals and samples, for a render worker process to hand back."""
+        return {"totals": dict(self._totals), "samples": list(self._frames)}
+
+    def merge_frame_timings(self, timings: Dict[str, Any], first_frame: int = 0) -> None:
+        """Fold a worker's :meth:`frame_timings` for frames starting at ``first_frame`` into this profile."""
+        for key, value in timings["totals"].items():
+            self._totals[key] += value
+        for sample in timings["samples"]:
+            self._frames.append({**sample, "frame": sample["frame"] + first_frame})
+
+    # ----------------------------
+    # Output
+    # ----------------------------
+    def write(self, target: Path) -> List[Path]:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        prof_path = target.with_suffix(".prof")
+        folded_path = target.with_suffix(".folded")
+        summary_path = target.with_suffix(".profile.json")
+
+        self._profile.dump_stats(str(prof_path))
+        folded_path.write_text("".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common()))
+
+        frames = self._totals["frames"]
+        per_frame = {
+            key: round(self._totals[key] / frames * 1000, 3) if frames else 0.0
+            for key in ("decode", "composite", "encode")
+        }
+        try:
+            import resource
+
+            children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+            self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:  # pragma: no cover - non-POSIX
+            children_peak = self_peak = 0
+        summary = {
+            "wall_seconds": round(self._elapsed, 3),
+            "stack_samples": sum(self._stacks.values()),
+            "frames": {
+                "count": frames,
+                "sample_every": self.frame_sample_every,
+                "mean_ms": per_frame,
+                "samples": self._frames,
+            },
+            "peak_rss_bytes": {
+                "process": self_peak,
+                "children": children_peak,
+                "by_stage": self._stage_rss,
+            },
+        }
+        summary_path.write_text(json.dumps(summary, indent=2))
+        logger.info("Profile written to %s, %s and %s", prof_path, folded_path, summary_path)
+        return [prof_path, folded_path, summary_path]
+
+
+__all__ = ["Profiler", "active_profiler"]
@@ -0,0 +1,126 @@
+"""Shared render worker pool with fair queuing across accounts."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from .resources import ResourceGovernor
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], object]
+
+
+class FairQueue:
+    """Per-account FIFO queues served round-robin.
+
+    One busy account can never starve the others: each ``get`` takes the next
+    job from the account after the one served last.
+    """
+
+    def __init__(self) -> None:
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._order: Deque[str] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, account: str, job: Job) -> None:
+        with self._cond:
+            if account not in self._queues:
+                self._queues[account] = deque()
+                self._order.append(account)
+            self._queues[account].append(job)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Job]]:
+        with self._cond:
+            while not self._closed:
+                for _ in range(len(self._order)):
+                    account = self._order[0]
+                    self._order.rotate(-1)
+                    queue = self._queues[account]
+                    if queue:
+                        return account, queue.popleft()
+                if not self._cond.wait(timeout):
+                    return None
+            return None
+
+    def pending(self, account: str) -> int:
+        with self._cond:
+            return len(self._queues.get(account, ()))
+
+    def __len__(self) -> int:
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class RenderPool:
+    """Fixed-size pool of render threads fed by a :class:`FairQueue`.
+
+    Like the single-account scheduler's ``max_instances=1``, an account that
+    already has a job queued or running is not given another one. With a
+    ``governor``, an idle worker only takes the next job once resources allow
+    another render, so jobs wait in the fair queue under memory pressure.
+    """
+
+    def __init__(self, size: int, governor: Optional["ResourceGovernor"] = None):
+        self.size = max(1, size)
+        self.governor = governor
+        self.queue = FairQueue()
+        self._busy: Set[str] = set()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def submit(self, account: str, job: Job) -> bool:
+        with self._lock:
+            if account in self._busy:
+                return False
+            self._busy.add(account)
+        self.queue.put(account, job)
+        return True
+
+    def start(self) -> None:
+        for index in range(self.size):
+            thread = threading.Thread(target=self._work, name=f"render-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started render pool with %s worker(s).", self.size)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads.clear()
+
+    def _work(self) -> None:
+        while True:
+            if self.governor is not None:
+                self.governor.wait_for_capacity()
+            item = self.queue.get()
+            if item is None:
+                return
+            account, job = item
+            try:
+                logger.info("Render worker picked up job for account %s.", account)
+                job()
+            except Exception as exc:
+                logger.exception("Job for account %s failed: %s", account, exc)
+            finally:
+                with self._lock:
+                    self._busy.discard(account)
+
+
+__all__ = ["FairQueue", "RenderPool"]
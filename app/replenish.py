@@ -0,0 +1,240 @@
+"""Background asset replenishment."""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .assets import download_pexels_videos
+from .clip_analysis import ClipAnalysisIndex
+from .config import AppConfig
+from .dedup import SignatureIndex, clip_signature
+from .dirlock import DirectoryLock, directory_lock
+from .http_client import shared_client
+from .metrics import REGISTRY
+from .state import StateManager
+from .video_processor import SUPPORTED_VIDEO_EXTENSIONS
+from .watchdog import stage_budget
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = ".replenish.lock"
+
+
+def inventory_lock(directory: Path) -> DirectoryLock:
+    """The process-wide lock for ``directory``; accounts sharing a VIDEOS_DIR share it."""
+    return directory_lock(directory, LOCK_NAME)
+
+
+class AssetReplenisher:
+    """Keeps the background video inventory above a low watermark.
+
+    Inventory is the number of clips in ``videos_dir`` that the state history
+    has not used or quarantined yet. When it drops below ``replenish.low_watermark`` the next
+    configured query is searched on Pexels and new clips are ingested. Queries
+    rotate and each one remembers the next result page, so repeated fetches
+    keep bringing in fresh clips. New clips that look like one already in the
+    inventory (perceptual signature within ``replenish.dedup_max_distance``
+    bits) are deleted or, with ``dedup=flag``, kept but not counted. Kept
+    clips, and any added by hand, are then analysed once for caption placement.
+
+    Replenishers of accounts sharing a ``videos_dir`` (in this process or
+    another) take turns through one :func:`inventory_lock`.
+    """
+
+    def __init__(self, config: AppConfig, state_manager: StateManager):
+        self.config = config
+        self.state_manager = state_manager
+        self.state_file = config.paths.base_dir / "replenish_state.json"
+        self.signatures_file = config.paths.base_dir / "background_signatures.json"
+        self._lock = inventory_lock(config.paths.videos_dir)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----------------------------
+    # Inventory
+    # ----------------------------
+    def list_backgrounds(self) -> List[Path]:
+        directory = self.config.paths.videos_dir
+        if not directory.exists():
+            return []
+        return [p for p in directory.glob("*") if p.suffix.lower() in SUPPORTED_VIDEO_EXTENSIONS and p.is_file()]
+
+    def inventory(self) -> int:
+        history = self.state_manager.load()
+        unavailable = set(history.used_videos) | set(history.quarantined_videos)
+        if self.config.replenish.dedup == "flag":
+            unavailable |= SignatureIndex(self.signatures_file).duplicates()
+        return sum(1 for p in self.list_backgrounds() if p.name not in unavailable)
+
+    def needs_replenish(self) -> bool:
+        return self.inventory() < self.config.replenish.low_watermark
+
+    # ----------------------------
+    # Replenishment
+    # ----------------------------
+    def replenish_if_needed(self) -> List[Path]:
+        settings = self.config.replenish
+        if not settings.enabled or not self.config.pexels_api_key or not settings.queries:
+            return []
+        if not self._lock.acquire():
+            logger.debug("Replenishment already in progress.")
+            return []
+        try:
+            available = self.inventory()
+            if available >= settings.low_watermark:
+                return []
+
+            state = self._load_state()
+            index = state.get("query_index", 0) % len(settings.queries)
+            query = settings.queries[index]
+            pages: Dict[str, int] = state.setdefault("pages", {})
+            page = pages.get(query, 1)
+
+            logger.info(
+                "Background inventory %s below watermark %s - fetching '%s' (page %s).",
+                available,
+                settings.low_watermark,
+                query,
+                page,
+            )
+            before = {p.name for p in self.list_backgrounds()}
+            with stage_budget("download", self.config.budgets.download_seconds):
+                download_pexels_videos(
+                    self.config.pexels_api_key,
+                    self.config.paths.videos_dir,
+                    query=query,
+                    count=settings.clips_per_fetch,
+                    page=page,
+                    client=shared_client(self.config.paths.http_cache_dir),
+                    api_url=self.config.pexels_api_url,
+                )
+            added = [p for p in self.list_backgrounds() if p.name not in before]
+            if settings.dedup != "off" and added:
+                added = self._dedupe(added)
+            logger.info("Replenishment ingested %s new clip(s).", len(added))
+
+            state["query_index"] = (index + 1) % len(settings.queries)
+            pages[query] = page + 1
+            self._save_state(state)
+            return added
+        except Exception as exc:
+            logger.warning("Background replenishment failed: %s", exc)
+            return []
+        finally:
+            self._lock.release()
+
+    def _dedupe(self, added: List[Path]) -> List[Path]:
+        """Compare new clips against the inventory (and each other); returns the ones kept."""
+        settings = self.config.replenish
+        index = SignatureIndex(self.signatures_file)
+        new_names = {clip.name for clip in added}
+        signed = index.refresh(p for p in self.list_backgrounds() if p.name not in new_names)
+        if signed:
+            logger.info("Signed %s existing background(s) for duplicate detection.", signed)
+
+        kept: List[Path] = []
+        for clip in added:
+            try:
+                signature = clip_signature(clip)
+            except OSError as exc:
+                logger.warning("Could not sign %s; keeping it unchecked: %s", clip.name, exc)
+                kept.append(clip)
+                continue
+            match = index.nearest(signature, settings.dedup_max_distance)
+            if match is None:
+                index.add(clip, signature)
+                kept.append(clip)
+                continue
+            original, distance = match
+            REGISTRY.inc("duplicate_backgrounds_total", account=self.config.account_name, action=settings.dedup)
+            if settings.dedup == "skip":
+                logger.info("Dropping %s: near duplicate of %s (%s bits apart).", clip.name, original, distance)
+                clip.unlink(missing_ok=True)
+            else:
+                logger.info("Flagging %s as a near duplicate of %s (%s bits apart).", clip.name, original, distance)
+                index.add(clip, signature, duplicate_of=original)
+        index.save()
+        return kept
+
+    def index_backgrounds(self) -> int:
+        """Analyse backgrounds missing from the caption placement index; returns how many were analysed."""
+        path = self.config.paths.clip_analysis_file
+        if path is None or self.config.caption_placement != "auto":
+            return 0
+        if not self._lock.acquire():
+            return 0
+        try:
+            index = ClipAnalysisIndex(path)
+            known = set(index.entries)
+            analysed = index.refresh(self.list_backgrounds())
+            if analysed or set(index.entries) != known:
+                index.save()
+            if analysed:
+                logger.info("Analysed %s background(s) for caption placement.", analysed)
+            return analysed
+        finally:
+            self._lock.release()
+
+    def maintain(self) -> List[Path]:
+        """Top up the inventory, then index whatever is not analysed yet."""
+        added = self.replenish_if_needed()
+        self.index_backgrounds()
+        return added
+
+    def request(self) -> None:
+        """Check the watermark in a background thread without blocking the caller."""
+        if self._lock.locked():
+            return
+        threading.Thread(target=self.maintain, name="asset-replenish", daemon=True).start()
+
+    # ----------------------------
+    # Daemon loop
+    # ----------------------------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="asset-replenisher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def run_forever(self) -> None:
+        logger.info(
+            "Asset replenisher running every %s minute(s) with watermark %s.",
+            self.config.replenish.check_interval_minutes,
+            self.config.replenish.low_watermark,
+        )
+        while not self._stop.is_set():
+            self.maintain()
+            # Read on every pass so a hot-reloaded REPLENISH_INTERVAL_MINUTES applies.
+            self._stop.wait(self.config.replenish.check_interval_minutes * 60)
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def _load_state(self) -> dict:
+        if not self.state_file.exists():
+            return {}
+        try:
+            return json.loads(self.state_file.read_text())
+        except Exception as exc:
+            logger.warning("Failed to read replenish state: %s", exc)
+            return {}
+
+    def _save_state(self, state: dict) -> None:
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            self.state_file.write_text(json.dumps(state, indent=2))
+        except Exception as exc:
+            logger.warning("Unable to persist replenish state: %s", exc)
+
+
+__all__ = ["AssetReplenisher", "inventory_lock"]
@@ -0,0 +1,317 @@
+"""Container-aware sizing of render concurrency and encoder threads."""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import AppConfig, GovernorConfig
+from .metrics import REGISTRY, record_count, record_stage
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# cgroup v1 reports "no limit" as a huge page-aligned number.
+_UNLIMITED = 1 << 60
+MAX_ENCODER_THREADS = 16
+# Limits are files on a pseudo filesystem; re-read at most this often.
+SAMPLE_SECONDS = 1.0
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def _meminfo() -> Dict[str, int]:
+    values: Dict[str, int] = {}
+    text = _read(Path("/proc/meminfo")) or ""
+    for line in text.splitlines():
+        name, _, rest = line.partition(":")
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            values[name] = int(parts[0]) * 1024
+    return values
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of ``pid``, or 0 if it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/statm") as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def child_pids() -> List[int]:
+    """Direct children of this process (ffmpeg and friends)."""
+    children: List[int] = []
+    try:
+        for tid in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{tid}/children") as handle:
+                children.extend(int(pid) for pid in handle.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def _stat_value(text: Optional[str], key: str) -> int:
+    for line in (text or "").splitlines():
+        name, _, value = line.partition(" ")
+        if name == key and value.strip().isdigit():
+            return int(value)
+    return 0
+
+
+@dataclass(frozen=True)
+class ResourceSample:
+    """CPU and memory as the container sees them."""
+
+    cpus: float
+    memory_limit: int
+    memory_used: int
+    # CPUs' worth of time the container used since the previous sample; None on the first.
+    cpu_busy: Optional[float] = None
+
+    @property
+    def memory_free(self) -> int:
+        return max(0, self.memory_limit - self.memory_used)
+
+
+class CgroupReader:
+    """Reads limits and usage from cgroup v2, then v1, then the host's /proc."""
+
+    def __init__(self, root: Path = CGROUP_ROOT):
+        self.root = root
+        self._last_cpu: Optional[Tuple[float, float]] = None
+
+    def cpus(self) -> float:
+        try:
+            available = float(len(os.sched_getaffinity(0)))
+        except (AttributeError, OSError):
+            available = float(os.cpu_count() or 1)
+        quota = self._cpu_quota()
+        return min(available, quota) if quota else available
+
+    def _cpu_quota(self) -> Optional[float]:
+        v2 = _read(self.root / "cpu.max")
+        if v2:
+            quota, _, period = v2.partition(" ")
+            if quota != "max" and period:
+                return int(quota) / int(period)
+            return None
+        quota_v1 = _read(self.root / "cpu" / "cpu.cfs_quota_us")
+        period_v1 = _read(self.root / "cpu" / "cpu.cfs_period_us")
+        if quota_v1 and period_v1 and int(quota_v1) > 0:
+            return int(quota_v1) / int(period_v1)
+        return None
+
+    def memory(self) -> Tuple[int, int]:
+        """``(limit, working set)`` in bytes; reclaimable page cache does not count as used."""
+        meminfo = _meminfo()
+        total = meminfo.get("MemTotal", 0)
+        v2 = _read(self.root / "memory.max")
+        if v2 is not None:
+            limit = total if v2 == "max" else min(int(v2), total or _UNLIMITED)
+            current = int(_read(self.root / "memory.current") or 0)
+            inactive = _stat_value(_read(self.root / "memory.stat"), "inactive_file")
+            return limit, max(0, current - inactive)
+        v1 = _read(self.root / "memory" / "memory.limit_in_bytes")
+        if v1 is not None and v1.isdigit():
+            limit = min(int(v1), total or _UNLIMITED)
+            usage = int(_read(self.root / "memory" / "memory.usage_in_bytes") or 0)
+            inactive = _stat_value(_read(self.root / "memory" / "memory.stat"), "total_inactive_file")
+            return limit, max(0, usage - inactive)
+        return total, max(0, total - meminfo.get("MemAvailable", total))
+
+    def _cpu_seconds(self) -> Optional[float]:
+        usage = _stat_value(_read(self.root / "cpu.stat"), "usage_usec")
+        if usage:
+            return usage / 1e6
+        usage_v1 = _read(self.root / "cpuacct" / "cpuacct.usage")
+        if usage_v1 and usage_v1.isdigit():
+            return int(usage_v1) / 1e9
+        return None
+
+    def cpu_busy(self) -> Optional[float]:
+        """CPUs in use since the last call, from cgroup CPU time; the load average without a cgroup."""
+        seconds = self._cpu_seconds()
+        if seconds is None:
+            try:
+                return os.getloadavg()[0]
+            except OSError:
+                return None
+        now = time.monotonic()
+        previous, self._last_cpu = self._last_cpu, (now, seconds)
+        if previous is None or now <= previous[0]:
+            return None
+        return (seconds - previous[1]) / (now - previous[0])
+
+    def sample(self) -> ResourceSample:
+        limit, used = self.memory()
+        return ResourceSample(cpus=self.cpus(), memory_limit=limit, memory_used=used, cpu_busy=self.cpu_busy())
+
+
+class ResourceGovernor:
+    """Decides how many renders may run at once and how many threads each encoder gets.
+
+    Concurrency is the smallest of ``max_renders``, the CPU quota divided by
+    ``cpus_per_render`` and the memory limit (less headroom) divided by
+    ``render_memory_mb``. A render holds a slot from :meth:`render_slot`;
+    new slots wait while the concurrency is reached, free memory is below one
+    more render plus headroom, or the CPUs are saturated. A render is always
+    admitted when none is running, so a small container still makes progress.
+    """
+
+    def __init__(self, settings: GovernorConfig, max_renders: int, reader: Optional[CgroupReader] = None):
+        self.settings = settings
+        self.max_renders = max(1, max_renders)
+        self.reader = reader or CgroupReader()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._sample: Optional[ResourceSample] = None
+        self._sampled_at = 0.0
+
+    # ----------------------------
+    # Sizing
+    # ----------------------------
+    def sample(self) -> ResourceSample:
+        now = time.monotonic()
+        if self._sample is None or now - self._sampled_at >= SAMPLE_SECONDS:
+            sample = self.reader.sample()
+            if sample.cpu_busy is None and self._sample is not None:
+                sample = ResourceSample(sample.cpus, sample.memory_limit, sample.memory_used, self._sample.cpu_busy)
+            self._sample, self._sampled_at = sample, now
+            REGISTRY.set_gauge("memory_free_bytes", sample.memory_free)
+            REGISTRY.set_gauge("cpu_limit", sample.cpus)
+        return self._sample
+
+    def concurrency(self) -> int:
+        if not self.settings.enabled:
+            return self.max_renders
+        sample = self.sample()
+        by_cpu = math.floor(sample.cpus / max(0.1, self.settings.cpus_per_render))
+        per_render = self.settings.render_memory_mb * 2**20
+        by_memory = (sample.memory_limit - self.settings.memory_headroom_mb * 2**20) // per_render
+        return max(1, min(self.max_renders, by_cpu, int(by_memory)))
+
+    def encoder_threads(self, share: int = 1) -> int:
+        """x264 threads for one of ``share`` encoders in a render, splitting the CPUs among active renders."""
+        if not self.settings.enabled:
+            return max(1, 4 // max(1, share))
+        renders = max(1, self._active)
+        threads = math.floor(self.sample().cpus / renders / max(1, share))
+        return max(1, min(MAX_ENCODER_THREADS, threads))
+
+    # ----------------------------
+    # Admission
+    # ----------------------------
+    def _blocked_by(self, weight: int, shared: bool = False) -> Optional[str]:
+        """Why another render of ``weight`` processes cannot start now, or ``None``.
+
+        With ``shared``, renders in other processes of the container count
+        too: memory and CPU are checked even when none runs in this one, as
+        long as the container is using at least one render's worth of memory.
+        """
+        if not self.settings.enabled:
+            return None
+        if self._active == 0 and not shared:
+            return None
+        if self._active >= self.concurrency():
+            return "concurrency"
+        sample = self.sample()
+        per_render = self.settings.render_memory_mb * weight * 2**20
+        busy = self._active > 0 or sample.memory_used >= per_render
+        if busy and sample.memory_free < per_render + self.settings.memory_headroom_mb * 2**20:
+            return "memory"
+        saturation = self.settings.cpu_saturation
+        if busy and saturation and sample.cpu_busy is not None and sample.cpu_busy > sample.cpus * saturation:
+            return "cpu"
+        return None
+
+    def has_capacity(self, weight: int = 1, shared: bool = False) -> bool:
+        with self._cond:
+            return self._blocked_by(weight, shared) is None
+
+    def wait_for_capacity(self, timeout: Optional[float] = None, weight: int = 1) -> bool:
+        """Block until another render could start; ``False`` if ``timeout`` passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._blocked_by(weight) is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Memory and CPU are polled; a finished render also wakes waiters.
+                wait = self.settings.poll_seconds if remaining is None else min(remaining, self.settings.poll_seconds)
+                self._cond.wait(wait)
+            return True
+
+    @contextmanager
+    def render_slot(self, weight: int = 1) -> Iterator[None]:
+        """Hold one of the render slots; waits (as stage ``render_wait``) while there is none."""
+        with self._cond:
+            reason = self._blocked_by(weight)
+            if reason is not None:
+                logger.info("Render waiting for resources (%s); %s render(s) active.", reason, self._active)
+                record_count(f"render_backpressure_{reason}")
+                REGISTRY.inc("render_backpressure_total", reason=reason)
+                with record_stage("render_wait"):
+                    while self._blocked_by(weight) is not None:
+                        self._cond.wait(self.settings.poll_seconds)
+            elif self.settings.enabled and self.sample().memory_free < self.settings.render_memory_mb * weight * 2**20:
+                # Admitted only because nothing else is rendering.
+                logger.warning("Starting a render with %.0f MiB free.", self.sample().memory_free / 2**20)
+            self._active += 1
+            REGISTRY.set_gauge("renders_active", self._active)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                REGISTRY.set_gauge("renders_active", self._active)
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, object]:
+        sample = self.sample()
+        return {
+            "cpus": round(sample.cpus, 2),
+            "cpu_busy": round(sample.cpu_busy, 2) if sample.cpu_busy is not None else None,
+            "memory_limit_bytes": sample.memory_limit,
+            "memory_free_bytes": sample.memory_free,
+            "renders_active": self._active,
+            "render_concurrency": self.concurrency(),
+            "encoder_threads": self.encoder_threads(),
+        }
+
+
+_governor: Optional[ResourceGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor(config: AppConfig) -> ResourceGovernor:
+    """The process-wide governor; every account in a process shares its render slots."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = ResourceGovernor(config.governor, config.render_workers)
+            sample = _governor.sample()
+            logger.info(
+                "Resources: %.1f CPU(s), %.0f MiB memory limit - up to %s concurrent render(s).",
+                sample.cpus,
+                sample.memory_limit / 2**20,
+                _governor.concurrency(),
+            )
+        return _governor
+
+
+__all__ = ["CgroupReader", "ResourceGovernor", "ResourceSample", "child_pids", "get_governor", "rss_bytes"]
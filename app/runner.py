@@ -6,20 +6,30 @@ import logging
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 
+from .airtable import AirtableSync
 from .auth import OpenAIClient
 from .config import AppConfig, load_config
-from .assets import download_pexels_videos
-
 from .content import generate_content
+from .journal import Journal, RunJournal, file_sha256
 from .logging_utils import configure_logging
-from .state import StateManager
+from .metrics import REGISTRY, RunMetrics
+from .montage import RenderInputError
+from .replenish import AssetReplenisher
+from .resources import get_governor
+from .state import PostHistory, StateManager
 from .upload import VideoUploader
-from .video_processor import VideoProcessor
+from .video_processor import RenderResult, VideoProcessor
+from .watchdog import StageTimeout, stage_budget
 
 logger = logging.getLogger(__name__)
 
+# Run outcomes that did not produce the post they were asked for. An upload
+# timeout may or may not have posted: retrying it resumes the journal, which
+# checks the upload registry before uploading again.
+FAILED_STATUSES = frozenset({"no_background", "render_failed", "lease_lost", "upload_timeout"})
+
 
 class AutoPoster:
     def __init__(self, config: Optional[AppConfig] = None):
@@ -28,7 +38,12 @@ class AutoPoster:
         self.state_manager = StateManager(self.config.paths.state_file, self.config.paths.backups_dir)
         self.video_processor = VideoProcessor(self.config)
         self.uploader = VideoUploader(self.config)
-
+        self.replenisher = AssetReplenisher(self.config, self.state_manager)
+        self.airtable = AirtableSync(self.config)
+        self.governor = get_governor(self.config)
+        state_file = self.config.paths.state_file
+        # Keyed by account too: accounts may share a data root.
+        self.journal = Journal(state_file.with_name(f"{state_file.stem}.{self.config.account_name}.journal.json"))
 
         for path in [
             self.config.paths.assets_dir,
@@ -52,79 +67,271 @@ class AutoPoster:
                 self.openai_client = None
         else:
             self.openai_client = None
+        self.last_status: Optional[str] = None
+
+    def on_config_changed(self, config: AppConfig, changed: Set[str]) -> None:
+        """Refresh components that cache values derived from reloaded settings."""
+        if "openai_api_key" in changed:
+            self.openai_client = OpenAIClient(config) if config.openai_api_key else None
+        if changed & {"google_font_family", "google_font_weight", "font_max_age_days"}:
+            self.video_processor.reload_font()
+
+    def run_once(self, may_upload: Optional[Callable[[], bool]] = None) -> Optional[Path]:
+        """Run one post; the outcome is left in ``last_status``.
 
-    def run_once(self) -> Optional[Path]:
-        history = self.state_manager.load()
-        history.reset_if_new_day()
+        ``may_upload`` is asked right before uploading; returning ``False``
+        abandons the run (e.g. a queue worker that lost its lease).
+        """
+        runs_file = self.config.paths.logs_dir / "runs.jsonl"
+        post: Dict[str, Any] = {}
+        with RunMetrics(self.config.account_name, runs_file) as run:
+            output = self._run(run, post, may_upload)
+            if run.record.status == "running":
+                run.finish("posted" if output else "skipped")
+        self.last_status = run.record.status
+        if post:
+            self.airtable.record_post(run.record, post)
+        return output
+
+    def _run(
+        self, run: RunMetrics, post: Dict[str, Any], may_upload: Optional[Callable[[], bool]] = None
+    ) -> Optional[Path]:
+        """Run one post; fills ``post`` with what was rendered for the Airtable log."""
+        with run.stage("load_state"):
+            history = self.state_manager.load()
+            history.reset_if_new_day()
 
         if history.posts_today >= self.config.max_posts_per_day:
             logger.info(
                 "Daily post limit of %s reached. Skipping run.",
                 self.config.max_posts_per_day,
             )
+            run.finish("limit_reached")
             return None
 
-        background = self.video_processor.pick_background(history.used_videos)
-        if not background:
-            if self.config.pexels_api_key:
-                downloads = download_pexels_videos(
-                    self.config.pexels_api_key,
-                    self.config.paths.videos_dir,
-                    query="motivation inspiration",
-                )
-                if downloads:
-                    background = self.video_processor.pick_background(history.used_videos)
+        # Never wait on asset acquisition: top up the inventory in the background.
+        self.replenisher.request()
 
+        journal = self.journal.resume()
+        if journal is not None:
+            logger.info(
+                "Resuming interrupted run %s after stage '%s' (resume %s).",
+                journal.run_id,
+                journal.last_stage or "start",
+                journal.resumes,
+            )
+            run.count("resumed")
+            REGISTRY.inc("runs_resumed_total", account=self.config.account_name)
+        else:
+            journal = self.journal.start(run.record.run_id)
+
+        output = self._run_stages(run, post, history, journal, may_upload)
+        # An exception leaves the journal for the next run; so does an upload
+        # timeout, which is retried from the finished render, and a lost lease,
+        # whose job another worker now owns.
+        if run.record.status not in ("upload_timeout", "lease_lost"):
+            journal.close()
+        return output
+
+    def _run_stages(
+        self,
+        run: RunMetrics,
+        post: Dict[str, Any],
+        history: PostHistory,
+        journal: RunJournal,
+        may_upload: Optional[Callable[[], bool]] = None,
+    ) -> Optional[Path]:
+        budgets = self.config.budgets
+        assets = journal.get("assets") if journal.done("assets") else None
+        if assets:
+            background: Optional[Path] = Path(assets["background"])
+        else:
+            with run.stage("pick_background"):
+                background = self.video_processor.pick_background(history.used_videos, history.quarantined_videos)
         if not background:
-            logger.error("No background videos available. Please add files to %s", self.config.paths.videos_dir)
+            logger.error(
+                "No background videos available. Please add files to %s (replenishment requested).",
+                self.config.paths.videos_dir,
+            )
+            run.finish("no_background")
             return None
 
-        content = generate_content(self.config, self.openai_client)
-        quote = content["quote"]
-        caption = content["caption"]
-        if content.get("keywords"):
-            logger.info("SEO keywords: %s", content["keywords"])
+        if journal.done("content"):
+            quote = journal.get("content")["quote"]
+            caption = journal.get("content")["caption"]
+        else:
+            tokens_before = self.openai_client.usage.total_tokens if self.openai_client else 0
+            try:
+                with run.stage("content"), stage_budget("content", budgets.content_seconds):
+                    content = generate_content(self.config, self.openai_client)
+            except StageTimeout as exc:
+                logger.warning("%s - using a fallback quote.", exc)
+                content = generate_content(self.config, None)
+            if self.openai_client:
+                run.count("openai_tokens", self.openai_client.usage.total_tokens - tokens_before)
+            quote = content["quote"]
+            caption = content["caption"]
+            if content.get("keywords"):
+                logger.info("SEO keywords: %s", content["keywords"])
 
-        if quote in history.used_quotes:
-            logger.info("Quote already used today - selecting fallback.")
-            history.used_quotes = [q for q in history.used_quotes if q != quote]
-            fallback = generate_content(self.config, None)
-            quote = fallback["quote"]
-            caption = fallback["caption"]
+            if quote in history.used_quotes:
+                logger.info("Quote already used today - selecting fallback.")
+                history.used_quotes = [q for q in history.used_quotes if q != quote]
+                fallback = generate_content(self.config, None)
+                quote = fallback["quote"]
+                caption = fallback["caption"]
+            journal.record("content", quote=quote, caption=caption)
 
-        music = self.video_processor.pick_music()
-        featured_image = self.video_processor.pick_featured_image()
-        inline_images = self.video_processor.pick_inline_images()
+        if assets:
+            music = _optional_path(assets["music"])
+            featured_image = _optional_path(assets["featured_image"])
+            inline_images = [Path(path) for path in assets["inline_images"]]
+            output_path = Path(assets["output_path"])
+        else:
+            with run.stage("pick_assets"):
+                music = self.video_processor.pick_music()
+                featured_image = self.video_processor.pick_featured_image()
+                inline_images = self.video_processor.pick_inline_images()
+
+            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            output_path = self.config.paths.output_dir / f"motivation_{timestamp}.mp4"
+            journal.record(
+                "assets",
+                background=background,
+                music=music,
+                featured_image=featured_image,
+                inline_images=[str(path) for path in inline_images],
+                output_path=output_path,
+            )
+
+        render: Optional[RenderResult] = None
+        if journal.done("render"):
+            rendered = journal.get("render")
+            rendered_path = Path(rendered["output"])
+            if rendered_path.exists() and file_sha256(rendered_path) == rendered["sha256"]:
+                background = Path(rendered["background"])
+                render = RenderResult(
+                    output_path=rendered_path,
+                    background_video=background,
+                    music_track=music,
+                    featured_image=featured_image,
+                    inline_images=inline_images,
+                )
+            else:
+                logger.warning("Rendered video %s is missing or changed - rendering again.", rendered_path)
 
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        output_path = self.config.paths.output_dir / f"motivation_{timestamp}.mp4"
+        resumed_render = render is not None
+        tried: List[str] = []
+        for attempt in range(1, budgets.render_attempts + 1):
+            if render is not None:
+                break
+            try:
+                # Taken first so that waiting for resources is not charged to the render budget.
+                with self.governor.render_slot(weight=self.config.render_segments):
+                    with run.stage("render"), stage_budget("render", budgets.render_seconds):
+                        background_clips = self.video_processor.plan_montage(
+                            background, history.used_videos, [*history.quarantined_videos, *tried]
+                        )
+                        render = self.video_processor.render_video(
+                            quote=quote,
+                            caption=caption,
+                            background_path=background,
+                            output_path=output_path,
+                            music_path=music,
+                            featured_image=featured_image,
+                            inline_images=inline_images,
+                            background_clips=background_clips,
+                        )
+            except (StageTimeout, RenderInputError) as exc:
+                # Hung or undecodable backgrounds are the usual cause; take this
+                # one out of rotation and try another. Anything else (a full
+                # disk, say) is not the background's fault and propagates.
+                culprit = exc.path if isinstance(exc, RenderInputError) else background
+                self._quarantine(history, culprit, exc)
+                run.count("render_retries")
+                tried.append(culprit.name)
+                # A bad montage filler only costs that clip; the next plan leaves it out.
+                if culprit.name == background.name:
+                    background = self.video_processor.pick_background(
+                        history.used_videos, [*history.quarantined_videos, *tried]
+                    )
+                if background is None or attempt == budgets.render_attempts:
+                    break
+                logger.info("Retrying render (attempt %s) with %s.", attempt + 1, background.name)
+        if render is None:
+            run.finish("render_failed")
+            return None
+        if not resumed_render:
+            journal.record(
+                "render", output=render.output_path, sha256=file_sha256(render.output_path), background=background
+            )
 
-        render = self.video_processor.render_video(
+        post.update(
             quote=quote,
             caption=caption,
-            background_path=background,
-            output_path=output_path,
-            music_path=music,
+            background=background,
+            music=music,
             featured_image=featured_image,
             inline_images=inline_images,
+            output=render.output_path,
         )
 
-        backup_path = self._backup_video(render.output_path)
+        if journal.done("backup"):
+            backup_path = Path(journal.get("backup")["path"])
+        else:
+            with run.stage("backup"):
+                backup_path = self._backup_video(render.output_path)
+            journal.record("backup", path=backup_path)
         logger.info("Backup saved to %s", backup_path)
 
-        uploaded = self.uploader.upload(render.output_path, caption)
+        if journal.done("upload"):
+            uploaded = journal.get("upload")["uploaded"]
+        elif journal.resumes and self.uploader.already_uploaded(render.output_path, caption):
+            # The interrupted run got the upload through but crashed before journaling it.
+            uploaded = True
+            journal.record("upload", uploaded=uploaded)
+        elif may_upload is not None and not may_upload():
+            logger.warning("Not uploading %s: this run may no longer post.", render.output_path)
+            run.finish("lease_lost")
+            return None
+        else:
+            try:
+                with run.stage("upload"), stage_budget("upload", budgets.upload_seconds):
+                    uploaded = self.uploader.upload(render.output_path, caption)
+            except StageTimeout as exc:
+                logger.error("%s - leaving %s for a later run.", exc, render.output_path)
+                run.finish("upload_timeout")
+                return render.output_path
+            journal.record("upload", uploaded=uploaded)
 
         if uploaded:
-            history.posts_today += 1
-            history.used_videos.append(background.name)
-            history.used_quotes.append(quote)
-            self.state_manager.save(history)
+            # A resumed run may already have saved this post before it crashed.
+            if history.last_run_id != journal.run_id:
+                history.posts_today += 1
+                for clip in dict.fromkeys([background, *render.background_clips]):
+                    history.used_videos.append(clip.name)
+                    history.background_usage[clip.name] = history.background_usage.get(clip.name, 0) + 1
+                history.used_quotes.append(quote)
+                history.last_run_id = journal.run_id
+                with run.stage("save_state"):
+                    self.state_manager.save(history)
+                usage = history.background_usage
+                self.video_processor.refresh_frame_cache(
+                    {name: uses for name, uses in usage.items() if name not in history.quarantined_videos}
+                )
             logger.info("Successfully processed post #%s", history.posts_today)
         else:
             logger.warning("Upload skipped for %s", render.output_path)
+            run.finish("upload_skipped")
 
         return render.output_path
 
+    def _quarantine(self, history: PostHistory, background: Path, exc: Exception) -> None:
+        logger.error("Quarantining background %s: %s", background.name, exc)
+        history.quarantined_videos[background.name] = f"{datetime.utcnow().isoformat(timespec='seconds')} {exc}"
+        self.state_manager.save(history)
+        REGISTRY.inc("quarantined_backgrounds_total", account=self.config.account_name)
+
     def _backup_video(self, video_path: Path) -> Path:
         self.config.paths.backups_dir.mkdir(parents=True, exist_ok=True)
         backup_path = self.config.paths.backups_dir / video_path.name
@@ -135,4 +342,8 @@ class AutoPoster:
         return backup_path
 
 
-__all__ = ["AutoPoster"]
+def _optional_path(value: Optional[str]) -> Optional[Path]:
+    return Path(value) if value else None
+
+
+__all__ = ["AutoPoster", "FAILED_STATUSES"]
@@ -3,43 +3,273 @@
 from __future__ import annotations
 
 import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-from pytz import timezone
-
-from .config import AppConfig
+from .config import AppConfig, ScheduleConfig, load_config
+from .config_service import ConfigService, validate_config
+from .jobqueue import JobQueue, open_queue
+from .metrics import HealthProvider, MetricsServer
+from .render_pool import RenderPool
+from .resources import get_governor
 from .runner import AutoPoster
+from .worker import job_payload
 
 logger = logging.getLogger(__name__)
 
 
+def build_trigger(schedule: ScheduleConfig, start_date: Optional[datetime] = None):
+    from apscheduler.triggers.interval import IntervalTrigger
+    from pytz import timezone
+
+    return IntervalTrigger(
+        hours=max(1, schedule.interval_hours),
+        jitter=schedule.jitter_minutes * 60,
+        timezone=timezone(schedule.timezone),
+        start_date=start_date,
+    )
+
+
+def _trigger_key(schedule: ScheduleConfig) -> tuple:
+    return (max(1, schedule.interval_hours), schedule.jitter_minutes, schedule.timezone)
+
+
 class SchedulerService:
     def __init__(self, config: AppConfig):
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        from pytz import timezone
+
         self.config = config
         self.poster = AutoPoster(config)
+        self.queue: Optional[JobQueue] = open_queue(config) if config.job_queue.enabled else None
         self.scheduler = BlockingScheduler(timezone=timezone(config.schedule.timezone))
+        self.config_service = ConfigService(config=config)
+        self.config_service.add_listener(self._on_config_changed)
+        self._trigger_key = _trigger_key(config.schedule)
+
+    def _on_config_changed(self, config: AppConfig, changed: set) -> None:
+        self.poster.on_config_changed(config, changed)
+        key = _trigger_key(config.schedule)
+        if key != self._trigger_key and self.scheduler.get_job("tiktok-auto-post"):
+            self.scheduler.reschedule_job("tiktok-auto-post", trigger=build_trigger(config.schedule))
+            logger.info(
+                "Rescheduled auto-post job: every %s hour(s), up to %s minutes jitter (%s).",
+                *key,
+            )
+        self._trigger_key = key
+
+    def health(self) -> Dict[str, object]:
+        job = self.scheduler.get_job("tiktok-auto-post")
+        return {
+            "account": self.config.account_name,
+            "next_run_time": job.next_run_time.isoformat() if job and job.next_run_time else None,
+            "queue_depth": self.queue.depth() if self.queue is not None else 0,
+            "resources": self.poster.governor.snapshot(),
+        }
+
+    def run_job(self) -> None:
+        """Post in-process, or hand the post to the worker queue when it is enabled."""
+        if self.queue is None:
+            self.poster.run_once()
+            return
+        enqueue_post(self.queue, self.config)
 
     def start(self) -> None:
         interval_hours = max(1, self.config.schedule.interval_hours)
-        trigger = IntervalTrigger(hours=interval_hours, jitter=self.config.schedule.jitter_minutes * 60)
+        trigger = build_trigger(self.config.schedule)
         logger.info(
             "Scheduling auto-post job every %s hour(s) with up to %s minutes jitter.",
             interval_hours,
             self.config.schedule.jitter_minutes,
         )
-        self.scheduler.add_job(self.poster.run_once, trigger=trigger, id="tiktok-auto-post", max_instances=1)
+        self.scheduler.add_job(self.run_job, trigger=trigger, id="tiktok-auto-post", max_instances=1)
+
+        if self.config.replenish.enabled:
+            self.poster.replenisher.start()
+
+        metrics_server = start_metrics_server(self.config.metrics_port, self.health)
+        self.config_service.start()
 
         if self.config.schedule.start_immediately:
             logger.info("Running first job immediately before entering scheduler loop.")
-            self.poster.run_once()
+            self.run_job()
+        elif self.poster.journal.pending():
+            logger.info("Resuming an interrupted run before entering scheduler loop.")
+            self.run_job()
+
+        try:
+            self.scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Scheduler stopped by user.")
+        finally:
+            self.config_service.stop()
+            self.poster.replenisher.stop()
+            self.poster.airtable.stop()
+            if metrics_server:
+                metrics_server.stop()
+            self.scheduler.shutdown(wait=False)
+
+
+def start_metrics_server(port: int, health: HealthProvider) -> Optional[MetricsServer]:
+    if not port:
+        return None
+    server = MetricsServer(port, health=health)
+    try:
+        server.start()
+    except OSError as exc:
+        logger.warning("Unable to start metrics endpoint on port %s: %s", port, exc)
+        return None
+    return server
+
+
+def enqueue_post(queue: JobQueue, config: AppConfig) -> Optional[int]:
+    # Mirror max_instances=1: one outstanding job per account.
+    if queue.has_pending(config.account_name):
+        logger.warning("Account %s already has a queued or running job - skipping this slot.", config.account_name)
+        return None
+    job_id = queue.enqueue(config.account_name, job_payload(config), max_attempts=config.job_queue.max_attempts)
+    logger.info("Enqueued post job %s for account %s.", job_id, config.account_name)
+    return job_id
+
+
+def load_account_configs(paths: Sequence[Path]) -> List[AppConfig]:
+    """Load and validate one config per account file; file values win over the environment."""
+    configs = [load_config(path, prefer_file=True) for path in paths]
+    for path, config in zip(paths, configs):
+        try:
+            validate_config(config)
+        except ValueError as exc:
+            raise ValueError(f"{path}: {exc}") from exc
+    names = [config.account_name for config in configs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate ACCOUNT_NAME in account configs: {', '.join(duplicates)}")
+    # A shared state file would count posts (and the daily limit) across accounts.
+    owners: Dict[Path, str] = {}
+    for config in configs:
+        state_file = config.paths.state_file.resolve()
+        if state_file in owners:
+            raise ValueError(
+                f"Accounts {owners[state_file]} and {config.account_name} share the state file {state_file}"
+            )
+        owners[state_file] = config.account_name
+    return configs
+
+
+class MultiAccountScheduler:
+    """Schedules several accounts in one process around a shared render pool.
+
+    Each account keeps its own interval, jitter, timezone and daily post limit;
+    its trigger only enqueues a job, and a size-limited :class:`RenderPool`
+    renders jobs fairly across accounts. Running in one process means moviepy,
+    resolved fonts and loaded font faces are shared, and accounts pointing at
+    the same ``VIDEOS_DIR`` share one background inventory and replenisher.
+    When ``queue`` is given, jobs go to the durable queue for render workers
+    instead of the in-process pool.
+    """
+
+    def __init__(
+        self,
+        configs: Sequence[AppConfig],
+        workers: Optional[int] = None,
+        queue: Optional[JobQueue] = None,
+    ):
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        from pytz import utc
+
+        if not configs:
+            raise ValueError("MultiAccountScheduler requires at least one account config")
+        self.configs = list(configs)
+        self.posters: Dict[str, AutoPoster] = {c.account_name: AutoPoster(c) for c in self.configs}
+        self.governor = get_governor(self.configs[0])
+        self.pool = RenderPool(workers or self.configs[0].render_workers, governor=self.governor)
+        self.queue = queue
+        self.config_services: Dict[str, ConfigService] = {}
+        self._trigger_keys: Dict[str, tuple] = {}
+        for config in self.configs:
+            service = ConfigService(config=config)
+            service.add_listener(lambda cfg, changed, name=config.account_name: self._on_config_changed(name, cfg, changed))
+            self.config_services[config.account_name] = service
+            self._trigger_keys[config.account_name] = _trigger_key(config.schedule)
+        self.scheduler = BlockingScheduler(timezone=utc)
+
+    def _on_config_changed(self, account: str, config: AppConfig, changed: set) -> None:
+        self.posters[account].on_config_changed(config, changed)
+        key = _trigger_key(config.schedule)
+        job_id = f"tiktok-auto-post-{account}"
+        if key != self._trigger_keys[account] and self.scheduler.get_job(job_id):
+            self.scheduler.reschedule_job(job_id, trigger=build_trigger(config.schedule))
+            logger.info("Rescheduled account %s: every %s hour(s), up to %s minutes jitter (%s).", account, *key)
+        self._trigger_keys[account] = key
+
+    def health(self) -> Dict[str, object]:
+        next_runs = {}
+        for account in self.posters:
+            job = self.scheduler.get_job(f"tiktok-auto-post-{account}")
+            next_runs[account] = job.next_run_time.isoformat() if job and job.next_run_time else None
+        return {
+            "next_run_time": min((t for t in next_runs.values() if t), default=None),
+            "accounts": next_runs,
+            "queue_depth": self.queue.depth() if self.queue is not None else self.pool.depth,
+            "resources": self.governor.snapshot(),
+        }
+
+    def dispatch(self, account: str) -> None:
+        poster = self.posters[account]
+        if self.queue is not None:
+            enqueue_post(self.queue, poster.config)
+            return
+        if not self.pool.submit(account, poster.run_once):
+            logger.warning("Account %s still has a job queued or running - skipping this slot.", account)
+
+    def start(self) -> None:
+        replenished_dirs = set()
+        for config in self.configs:
+            schedule = config.schedule
+            interval_hours = max(1, schedule.interval_hours)
+            trigger = build_trigger(schedule)
+            logger.info(
+                "Scheduling account %s every %s hour(s) (%s) with up to %s minutes jitter.",
+                config.account_name,
+                interval_hours,
+                schedule.timezone,
+                schedule.jitter_minutes,
+            )
+            self.scheduler.add_job(
+                self.dispatch,
+                trigger=trigger,
+                args=[config.account_name],
+                id=f"tiktok-auto-post-{config.account_name}",
+                max_instances=1,
+            )
+            if config.replenish.enabled and config.paths.videos_dir not in replenished_dirs:
+                replenished_dirs.add(config.paths.videos_dir)
+                self.posters[config.account_name].replenisher.start()
+
+        if self.queue is None:
+            self.pool.start()
+        metrics_server = start_metrics_server(self.configs[0].metrics_port, self.health)
+        for service in self.config_services.values():
+            service.start()
+        for config in self.configs:
+            if config.schedule.start_immediately or self.posters[config.account_name].journal.pending():
+                self.dispatch(config.account_name)
 
         try:
             self.scheduler.start()
         except (KeyboardInterrupt, SystemExit):
             logger.info("Scheduler stopped by user.")
         finally:
+            for service in self.config_services.values():
+                service.stop()
+            for poster in self.posters.values():
+                poster.replenisher.stop()
+                poster.airtable.stop()
+            self.pool.stop()
+            if metrics_server:
+                metrics_server.stop()
             self.scheduler.shutdown(wait=False)
 
 
-__all__ = ["SchedulerService"]
+__all__ = ["SchedulerService", "build_trigger", "MultiAccountScheduler", "enqueue_post", "load_account_configs", "start_metrics_server"]
@@ -0,0 +1,380 @@
+"""Virtual-clock simulation of the scheduler for capacity planning.
+
+Drives the real interval triggers (including jitter), the one-job-per-account
+rule, the fair render queue, ``max_posts_per_day`` and the ``PostHistory``
+daily reset against simulated time, so a day or a week of scheduling finishes
+in seconds. Run durations are replayed from ``runs.jsonl`` or drawn from
+per-stage distributions.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import AppConfig
+from .metrics import percentile
+from .render_pool import FairQueue
+from .scheduler import build_trigger
+from .state import PostHistory
+
+logger = logging.getLogger(__name__)
+
+# Run statuses that went through render and upload; limit/no-background runs
+# are too short to say anything about capacity.
+FULL_RUN_STATUSES = ("posted", "upload_skipped")
+
+DEFAULT_DISTRIBUTIONS = (
+    "load_state=fixed:0.01",
+    "content=uniform:1,5",
+    "render=lognormal:90,0.3",
+    "upload=uniform:5,30",
+)
+
+
+@dataclass
+class StageDistribution:
+    """Duration distribution for one run stage, parsed from ``stage=kind:a,b``.
+
+    Kinds: ``fixed:seconds``, ``uniform:low,high``, ``normal:mean,stddev``,
+    ``lognormal:median,sigma`` and ``exponential:mean``.
+    """
+
+    stage: str
+    kind: str
+    params: Tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "StageDistribution":
+        try:
+            stage, rest = spec.split("=", 1)
+            kind, _, raw = rest.partition(":")
+            params = tuple(float(value) for value in raw.split(",") if value)
+        except ValueError as exc:
+            raise ValueError(f"Invalid stage distribution '{spec}' (expected stage=kind:a,b)") from exc
+        arity = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if kind not in arity:
+            raise ValueError(f"Unknown distribution '{kind}' in '{spec}'")
+        if len(params) != arity[kind]:
+            raise ValueError(f"Distribution '{kind}' takes {arity[kind]} parameter(s): '{spec}'")
+        return cls(stage.strip(), kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            value = rng.lognormvariate(math.log(median), sigma)
+        else:
+            value = rng.expovariate(1 / self.params[0])
+        return max(0.0, value)
+
+
+class DurationModel(ABC):
+    """Produces stage durations (seconds) for one full run."""
+
+    description = ""
+
+    @abstractmethod
+    def sample(self, rng: random.Random) -> Dict[str, float]:
+        ...
+
+
+class DistributionDurations(DurationModel):
+    def __init__(self, distributions: Sequence[StageDistribution]):
+        self.distributions = list(distributions)
+        self.description = "distributions: " + ", ".join(
+            f"{d.stage}={d.kind}:{','.join(f'{p:g}' for p in d.params)}" for d in self.distributions
+        )
+
+    def sample(self, rng: random.Random) -> Dict[str, float]:
+        return {d.stage: d.sample(rng) for d in self.distributions}
+
+
+class ReplayDurations(DurationModel):
+    """Replays whole recorded runs so correlated stage timings stay together."""
+
+    def __init__(self, runs: Sequence[Dict[str, float]], source: str = ""):
+        if not runs:
+            raise ValueError("No recorded runs to replay")
+        self.runs = list(runs)
+        self.description = f"replay of {len(self.runs)} recorded runs" + (f" from {source}" if source else "")
+
+    def sample(self, rng: random.Random) -> Dict[str, float]:
+        return dict(rng.choice(self.runs))
+
+
+def load_recorded_runs(runs_file: Path, account: Optional[str] = None) -> List[Dict[str, float]]:
+    """Top-level stage durations of completed runs in a ``runs.jsonl`` file."""
+    runs: List[Dict[str, float]] = []
+    if not runs_file.exists():
+        return runs
+    for line in runs_file.read_text().splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") not in FULL_RUN_STATUSES:
+            continue
+        if account and record.get("account") != account:
+            continue
+        stages = {
+            name: float(seconds)
+            for name, seconds in record.get("stages", {}).items()
+            if "." not in name and name != "total"
+        }
+        if stages:
+            runs.append(stages)
+    return runs
+
+
+@dataclass
+class AccountStats:
+    slots: int = 0
+    missed_slots: int = 0
+    runs: int = 0
+    posts: int = 0
+    limit_reached: int = 0
+    queue_delays: List[float] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "slots": self.slots,
+            "missed_slots": self.missed_slots,
+            "runs": self.runs,
+            "posts": self.posts,
+            "limit_reached": self.limit_reached,
+            "queue_delay_seconds": {
+                "mean": sum(self.queue_delays) / len(self.queue_delays) if self.queue_delays else 0.0,
+                "p95": percentile(self.queue_delays, 0.95),
+                "max": max(self.queue_delays, default=0.0),
+            },
+        }
+
+
+@dataclass
+class SimulationReport:
+    start: datetime
+    days: float
+    workers: int
+    durations: str
+    accounts: Dict[str, AccountStats]
+    busy_seconds: float
+
+    @property
+    def horizon_seconds(self) -> float:
+        return self.days * 86400
+
+    @property
+    def utilization(self) -> float:
+        return self.busy_seconds / (self.workers * self.horizon_seconds) if self.horizon_seconds else 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        posts = sum(stats.posts for stats in self.accounts.values())
+        return {
+            "start": self.start.isoformat(),
+            "days": self.days,
+            "workers": self.workers,
+            "durations": self.durations,
+            "posts": posts,
+            "posts_per_day": posts / self.days if self.days else 0.0,
+            "missed_slots": sum(stats.missed_slots for stats in self.accounts.values()),
+            "worker_utilization": self.utilization,
+            "accounts": {name: stats.as_dict() for name, stats in self.accounts.items()},
+        }
+
+    def format(self) -> str:
+        summary = self.as_dict()
+        lines = [
+            f"Simulated {self.days:g} day(s) from {self.start:%Y-%m-%d %H:%M} UTC "
+            f"with {self.workers} render worker(s); {self.durations}.",
+            f"{'account':20} {'slots':>6} {'missed':>7} {'limit':>6} {'posts':>6} "
+            f"{'delay mean':>11} {'p95':>8} {'max':>8}",
+        ]
+        for name, stats in self.accounts.items():
+            delay = stats.as_dict()["queue_delay_seconds"]
+            lines.append(
+                f"{name:20} {stats.slots:6d} {stats.missed_slots:7d} {stats.limit_reached:6d} {stats.posts:6d} "
+                f"{delay['mean']:10.1f}s {delay['p95']:7.1f}s {delay['max']:7.1f}s"  # type: ignore[index]
+            )
+        lines.append(
+            f"Total: {summary['posts']} posts ({summary['posts_per_day']:.1f}/day), "
+            f"{summary['missed_slots']} missed slots, worker utilization {self.utilization:.1%}."
+        )
+        return "\n".join(lines)
+
+
+class SchedulerSimulation:
+    """Discrete-event replay of :class:`MultiAccountScheduler` on a virtual clock.
+
+    With one account and one worker this is the single-account
+    :class:`SchedulerService`, whose ``max_instances=1`` job behaves like a
+    one-slot pool. Daily resets follow the host-local date, as
+    ``date.today()`` does in the real run.
+    """
+
+    def __init__(
+        self,
+        configs: Sequence[AppConfig],
+        workers: int,
+        durations: DurationModel,
+        start: Optional[datetime] = None,
+        seed: Optional[int] = None,
+    ):
+        if not configs:
+            raise ValueError("SchedulerSimulation requires at least one account config")
+        self.configs = {config.account_name: config for config in configs}
+        self.workers = max(1, workers)
+        self.durations = durations
+        self.start = start or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.seed = seed
+
+    def run(self, days: float) -> SimulationReport:
+        # apscheduler draws jitter from the global ``random`` module: seed it for
+        # the run and hand the caller's sequence back afterwards.
+        state = random.getstate()
+        random.seed(self.seed)
+        try:
+            return self._simulate(days)
+        finally:
+            random.setstate(state)
+
+    def _simulate(self, days: float) -> SimulationReport:
+        rng = random.Random(self.seed)
+        origin = self.start.timestamp()
+        horizon = origin + days * 86400
+
+        events: List[Tuple[float, int, str, str]] = []
+        sequence = 0
+
+        def push(at: float, kind: str, account: str) -> None:
+            nonlocal sequence
+            heapq.heappush(events, (at, sequence, kind, account))
+            sequence += 1
+
+        stats = {name: AccountStats() for name in self.configs}
+        histories = {name: PostHistory(last_post_date=self._local_date(origin).isoformat()) for name in self.configs}
+        triggers = {}
+        previous_fire: Dict[str, Optional[datetime]] = {}
+        for name, config in self.configs.items():
+            interval = timedelta(hours=max(1, config.schedule.interval_hours))
+            # add_job() without a start date fires first one interval after startup.
+            triggers[name] = build_trigger(config.schedule, start_date=self.start + interval)
+            previous_fire[name] = None
+            self._schedule_next(push, name, triggers[name], previous_fire, horizon)
+            if config.schedule.start_immediately:
+                push(origin, "fire_immediately", name)
+
+        queue = FairQueue()
+        pending: set = set()
+        idle = self.workers
+        busy_seconds = 0.0
+
+        def start_jobs(now: float) -> None:
+            nonlocal idle, busy_seconds
+            while idle:
+                item = queue.get(timeout=0)
+                if item is None:
+                    return
+                account, dispatched_at = item
+                idle -= 1
+                stats[account].queue_delays.append(now - dispatched_at())
+                duration = self._run_once(account, histories[account], stats[account], now, rng)
+                busy_seconds += max(0.0, min(now + duration, horizon) - now)
+                push(now + duration, "finish", account)
+
+        while events:
+            now, _, kind, account = heapq.heappop(events)
+            if kind == "finish":
+                pending.discard(account)
+                idle += 1
+            else:
+                if kind == "fire":
+                    self._schedule_next(push, account, triggers[account], previous_fire, horizon)
+                stats[account].slots += 1
+                if account in pending:
+                    stats[account].missed_slots += 1
+                else:
+                    pending.add(account)
+                    queue.put(account, lambda at=now: at)
+            start_jobs(now)
+
+        queue.close()
+        return SimulationReport(
+            start=self.start,
+            days=days,
+            workers=self.workers,
+            durations=self.durations.description,
+            accounts=stats,
+            busy_seconds=busy_seconds,
+        )
+
+    @staticmethod
+    def _local_date(timestamp: float) -> date:
+        return datetime.fromtimestamp(timestamp).date()
+
+    def _schedule_next(
+        self,
+        push: Callable[[float, str, str], None],
+        account: str,
+        trigger,
+        previous_fire: Dict[str, Optional[datetime]],
+        horizon: float,
+    ) -> None:
+        # Like apscheduler, the next fire time is computed from the previous
+        # (jittered) one, so jitter drifts the schedule over time.
+        fire = trigger.get_next_fire_time(previous_fire[account], self.start)
+        if fire is None or fire.timestamp() >= horizon:
+            return
+        previous_fire[account] = fire
+        push(fire.timestamp(), "fire", account)
+
+    def _run_once(
+        self, account: str, history: PostHistory, stats: AccountStats, now: float, rng: random.Random
+    ) -> float:
+        """Mirror ``AutoPoster._run``'s limit check and bookkeeping; returns the run's duration."""
+        stages = self.durations.sample(rng)
+        stats.runs += 1
+        history.reset_if_new_day(self._local_date(now))
+        if history.posts_today >= self.configs[account].max_posts_per_day:
+            stats.limit_reached += 1
+            return stages.get("load_state", 0.0)
+        history.posts_today += 1
+        stats.posts += 1
+        return sum(stages.values())
+
+
+def duration_model(
+    runs_file: Optional[Path], specs: Sequence[str], account: Optional[str] = None
+) -> DurationModel:
+    """Explicit ``specs`` win; otherwise replay ``runs_file`` if it has completed runs."""
+    if not specs and runs_file is not None:
+        runs = load_recorded_runs(runs_file, account)
+        if runs:
+            return ReplayDurations(runs, str(runs_file))
+        logger.info("No completed runs in %s; using default stage distributions.", runs_file)
+    return DistributionDurations([StageDistribution.parse(spec) for spec in specs or DEFAULT_DISTRIBUTIONS])
+
+
+__all__ = [
+    "DEFAULT_DISTRIBUTIONS",
+    "DistributionDurations",
+    "ReplayDurations",
+    "SchedulerSimulation",
+    "SimulationReport",
+    "StageDistribution",
+    "duration_model",
+    "load_recorded_runs",
+]
@@ -7,7 +7,7 @@ import logging
 from dataclasses import dataclass, field
 from datetime import date
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +18,16 @@ class PostHistory:
     posts_today: int = 0
     used_videos: List[str] = field(default_factory=list)
     used_quotes: List[str] = field(default_factory=list)
+    # Backgrounds that hung or failed to render, with the reason; kept across days.
+    quarantined_videos: Dict[str, str] = field(default_factory=dict)
+    # Journal id of the last run counted above; lets a resumed run tell whether it was already saved.
+    last_run_id: str = ""
+    # Posts each background has appeared in, across days; ranks clips for the frame cache.
+    background_usage: Dict[str, int] = field(default_factory=dict)
 
-    def reset_if_new_day(self) -> None:
-        today = date.today().isoformat()
+    def reset_if_new_day(self, today: Optional[date] = None) -> None:
+        """Clear the daily counters when ``today`` (default: the current date) is a new day."""
+        today = (today or date.today()).isoformat()
         if self.last_post_date != today:
             logger.debug("Resetting post history for new day %s", today)
             self.last_post_date = today
@@ -0,0 +1,146 @@
+"""Synthetic media generation for benchmarks and local load tests."""
+
+from __future__ import annotations
+
+import logging
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHORT_QUOTE = "Discipline beats motivation."
+LONG_QUOTE = (
+    "Success is the sum of small efforts repeated day in and day out, even when nobody is "
+    "watching and the results are slow to show up."
+)
+
+DEFAULT_BACKGROUNDS: Tuple[Tuple[int, int, float], ...] = (
+    (540, 960, 5.0),
+    (1080, 1920, 5.0),
+    (1920, 1080, 10.0),
+)
+
+
+def ffmpeg_exe() -> str:
+    import imageio_ffmpeg
+
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _run_ffmpeg(args: Sequence[str]) -> None:
+    subprocess.run([ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+
+def make_background(
+    path: Path, width: int, height: int, duration: float, fps: int = 30, source: str = "testsrc2"
+) -> Path:
+    """Encode an H.264 clip of an ffmpeg test ``source``, similar in shape to a Pexels download."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"{source}=size={width}x{height}:rate={fps}:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-pix_fmt",
+            "yuv420p",
+            str(path),
+        ]
+    )
+    return path
+
+
+def make_tone(path: Path, duration: float, frequency: int = 440) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency={frequency}:duration={duration}",
+            "-c:a",
+            "aac",
+            str(path),
+        ]
+    )
+    return path
+
+
+def make_image(path: Path, width: int, height: int, seed: int = 0) -> Path:
+    """Write a gradient PNG with an alpha channel."""
+    import numpy as np
+    from PIL import Image
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    pixels[..., 0] = (x * 255 // max(1, width - 1) + seed * 40) % 256
+    pixels[..., 1] = (y * 255 // max(1, height - 1)) % 256
+    pixels[..., 2] = (seed * 97) % 256
+    pixels[..., 3] = 255
+    Image.fromarray(pixels, "RGBA").save(path)
+    return path
+
+
+@dataclass
+class SyntheticAssets:
+    backgrounds: Dict[str, Path] = field(default_factory=dict)
+    music: List[Path] = field(default_factory=list)
+    featured: List[Path] = field(default_factory=list)
+    inline: List[Path] = field(default_factory=list)
+
+
+def generate_assets(
+    root: Path,
+    backgrounds: Sequence[Tuple[int, int, float]] = DEFAULT_BACKGROUNDS,
+    audio_seconds: float = 60.0,
+    inline_count: int = 3,
+) -> SyntheticAssets:
+    """Generate (or reuse) a set of synthetic assets under ``root``.
+
+    Files are named after their parameters and are only generated when
+    missing, so repeated runs reuse the same inputs.
+    """
+    assets = SyntheticAssets()
+    for width, height, duration in backgrounds:
+        name = f"bg_{width}x{height}_{duration:g}s"
+        path = root / "videos" / f"{name}.mp4"
+        if not path.exists():
+            logger.info("Generating synthetic background %s", name)
+            make_background(path, width, height, duration)
+        assets.backgrounds[name] = path
+
+    tone = root / "music" / f"tone_{audio_seconds:g}s.m4a"
+    if not tone.exists():
+        make_tone(tone, audio_seconds)
+    assets.music.append(tone)
+
+    featured = root / "featured" / "featured_0.png"
+    if not featured.exists():
+        make_image(featured, 900, 900)
+    assets.featured.append(featured)
+
+    for index in range(inline_count):
+        inline = root / "inline" / f"inline_{index}.png"
+        if not inline.exists():
+            make_image(inline, 800, 600, seed=index + 1)
+        assets.inline.append(inline)
+    return assets
+
+
+__all__ = [
+    "LONG_QUOTE",
+    "SHORT_QUOTE",
+    "SyntheticAssets",
+    "ffmpeg_exe",
+    "generate_assets",
+    "make_background",
+    "make_image",
+    "make_tone",
+]
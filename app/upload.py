@@ -9,6 +9,7 @@ from dataclasses import dataclass
 from pathlib import Path
 
 from .config import AppConfig
+from .http_client import shared_client
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +87,22 @@ class VideoUploader:
             self.mark_uploaded(video_path, caption)
             return True
 
+        upload_url = self.config.tiktok_upload_url
+        if upload_url:
+            logger.info("Uploading %s to %s.", video_path.name, upload_url)
+            # Read up front: a retried POST must resend the whole body.
+            response = shared_client().post(
+                upload_url,
+                cookies={"sessionid": session_id},
+                files={"video": (video_path.name, video_path.read_bytes(), "video/mp4")},
+                data={"caption": caption},
+                timeout=300,
+            )
+            # Raising leaves the run journaled, so the next run retries the upload.
+            response.raise_for_status()
+            self.mark_uploaded(video_path, caption)
+            return True
+
         # Placeholder for real upload logic.
         logger.info("Uploading %s to TikTok with provided session.", video_path)
         # TODO: integrate with TikTok uploader or third-party library.
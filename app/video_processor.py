@@ -2,30 +2,72 @@
 
 from __future__ import annotations
 
+import contextlib
 import logging
 import random
-from dataclasses import dataclass
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List, Optional
-
-import numpy as np
-from moviepy.editor import (
-    AudioFileClip,
-    CompositeAudioClip,
-    CompositeVideoClip,
-    ImageClip,
-    VideoFileClip,
-)
-from PIL import Image, ImageDraw, ImageFont
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from .caption_atlas import BACKING_PADDING, AnimatedCaption, build_atlas, word_timeline
+from .clip_analysis import DEFAULT_STYLE, CaptionStyle, ClipAnalysisIndex, choose_caption_style
 from .config import AppConfig
 from .fonts import ensure_google_font
+from .frame_cache import FrameCache, open_cached
+from .http_client import shared_client
+from .metrics import current_run, record_count, record_stage
+from .montage import RenderInputError, build_montage, probe_clip
+from .profiling import Profiler, active_profiler
+from .resources import get_governor
+from .video_templates import (
+    CaptionPlan,
+    ImagePlan,
+    LayerTiming,
+    RenderPlan,
+    TemplateLibrary,
+    VideoTemplate,
+    compile_plan,
+)
+
+# moviepy, numpy and PIL are imported inside the rendering helpers so that
+# asset discovery (and commands that never render) stay cheap to import.
+if TYPE_CHECKING:
+    from moviepy.editor import AudioClip, CompositeAudioClip, ImageClip, VideoClip, VideoFileClip
+    from PIL import Image, ImageFont
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv")
 SUPPORTED_AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a")
 SUPPORTED_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RENDER_FPS = 30
+FULL_FRAME = (1080, 1920)
+FEED_CROP = (1080, 1350)
+# Segmented renders cut the timeline on whole seconds so every chunk starts
+# on a keyframe at a round timestamp.
+SEGMENT_ALIGN_FRAMES = RENDER_FPS
+# Upper bound on montage entries when looping a few very short clips.
+MAX_MONTAGE_ENTRIES = 64
+
+
+def _pillow_compat() -> None:
+    # moviepy 1.0.3 resizes with Image.ANTIALIAS, which Pillow 10 removed.
+    from PIL import Image
+
+    if not hasattr(Image, "ANTIALIAS"):
+        Image.ANTIALIAS = Image.LANCZOS  # type: ignore[attr-defined]
+
+
+@lru_cache(maxsize=32)
+def load_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a TrueType font once per process; shared by all processors."""
+    from PIL import ImageFont
+
+    return ImageFont.truetype(font_path, size)
 
 
 @dataclass
@@ -35,13 +77,141 @@ class RenderResult:
     music_track: Optional[Path]
     featured_image: Optional[Path]
     inline_images: List[Path]
+    variant: Optional[str] = None
+    # Every clip in the background when it was a montage (repeats included).
+    background_clips: List[Path] = field(default_factory=list)
+
+
+@dataclass
+class RenderVariant:
+    """One output of :meth:`VideoProcessor.render_variants`.
+
+    ``size`` must fit inside the prepared 1080x1920 background; smaller sizes
+    (e.g. :data:`FEED_CROP`) are centre crops of it. ``template`` names the
+    layout, defaulting to ``VIDEO_TEMPLATE``.
+    """
+
+    name: str
+    quote: str
+    font_path: Optional[Path] = None
+    featured_image: Optional[Path] = None
+    inline_images: List[Path] = field(default_factory=list)
+    size: Tuple[int, int] = FULL_FRAME
+    template: Optional[str] = None
+
+
+def _apply_timing(clip: VideoClip, timing: LayerTiming) -> VideoClip:
+    clip = clip.set_duration(timing.duration)
+    if timing.start:
+        clip = clip.set_start(timing.start)
+    if timing.fade_in:
+        clip = clip.crossfadein(timing.fade_in)
+    if timing.fade_out:
+        clip = clip.crossfadeout(timing.fade_out)
+    return clip
+
+
+def _segment_bounds(frames: int, segments: int, align: int = SEGMENT_ALIGN_FRAMES) -> List[Tuple[int, int]]:
+    """Split ``frames`` into at most ``segments`` ``[first, last)`` ranges cut on ``align``."""
+    units = -(-frames // align)
+    segments = max(1, min(segments, units))
+    edges = [min(frames, round(units * i / segments) * align) for i in range(segments + 1)]
+    return [(first, last) for first, last in zip(edges, edges[1:]) if last > first]
+
+
+def _encode_segment(
+    config: AppConfig,
+    font_path: Optional[Path],
+    background_path: Path,
+    quote: str,
+    featured_image: Optional[Path],
+    inline_images: List[Path],
+    first: int,
+    last: int,
+    output_path: Path,
+    threads: int,
+    style: CaptionStyle = DEFAULT_STYLE,
+    template: Optional[VideoTemplate] = None,
+    profile_every: int = 0,
+) -> Optional[Dict[str, Any]]:
+    """Render frames ``[first, last)`` of the full composite into ``output_path`` (video only).
+
+    Runs in a worker process. The composite is built for the whole timeline so
+    overlay start times and fades line up across chunk boundaries. With
+    ``profile_every`` the frames are timed and the timings returned for the
+    parent's profiler.
+    """
+    from moviepy.editor import CompositeVideoClip
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    _pillow_compat()
+    processor = VideoProcessor(config, font_path=font_path)
+    with processor._open_background(background_path) as clip:
+        duration = clip.duration or 30
+        plan = processor.render_plan(
+            template or processor.template(), clip.w, clip.h, duration, featured_image, inline_images
+        )
+        overlays = processor._build_overlays(quote, plan, featured_image, inline_images, style=style)
+        video = CompositeVideoClip([clip, *overlays])
+        profiler = Profiler(frame_sample_every=profile_every) if profile_every else None
+        if profiler is not None:
+            profiler.instrument_render(clip, video)
+        writer = FFMPEG_VideoWriter(str(output_path), video.size, RENDER_FPS, codec="libx264", threads=threads)
+        try:
+            for index in range(first, last):
+                writer.write_frame(video.get_frame(index / RENDER_FPS))
+        finally:
+            writer.close()
+    return profiler.frame_timings() if profiler is not None else None
+
+
+def _concat_segments(chunks: List[Path], audio_path: Optional[str], output_path: Path) -> None:
+    """Join encoded chunks by stream copy and mux the audio track once.
+
+    The background was already decoded into the chunks, so a failed join is
+    an output-side problem (disk, a killed encoder) and not the background's.
+    """
+    from moviepy.config import get_setting
+
+    listing = chunks[0].parent / "segments.txt"
+    listing.write_text("".join(f"file '{chunk.name}'\n" for chunk in chunks))
+    command = [get_setting("FFMPEG_BINARY"), "-hide_banner", "-loglevel", "error", "-y"]
+    command += ["-f", "concat", "-safe", "0", "-i", str(listing)]
+    if audio_path:
+        command += ["-i", audio_path, "-map", "0:v", "-map", "1:a"]
+    command += ["-c", "copy", "-movflags", "+faststart", str(output_path)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat failed: {result.stderr.strip()}")
 
 
 class VideoProcessor:
-    def __init__(self, config: AppConfig):
+    def __init__(self, config: AppConfig, font_path: Optional[Path] = None):
         self.config = config
+        self.frame_cache: Optional[FrameCache] = None
+        if config.frame_cache_mb and config.paths.frame_cache_dir:
+            self.frame_cache = FrameCache(
+                config.paths.frame_cache_dir,
+                config.frame_cache_mb * 2**20,
+                config.frame_cache_fps,
+                min_uses=config.frame_cache_min_uses,
+                account=config.account_name,
+            )
+        self.templates = TemplateLibrary(config.paths.templates_dir)
+        self._analysis: Optional[ClipAnalysisIndex] = None
+        self._analysis_stamp: Optional[int] = None
+        if font_path is None:
+            self.reload_font()
+        else:
+            self.font_path = font_path
+
+    def reload_font(self) -> None:
         self.font_path = ensure_google_font(
-            config.paths.fonts_dir, config.google_font_family, config.google_font_weight
+            self.config.paths.fonts_dir,
+            self.config.google_font_family,
+            self.config.google_font_weight,
+            max_age_days=self.config.font_max_age_days,
+            client=shared_client(self.config.paths.http_cache_dir),
         )
 
     # ----------------------------
@@ -66,14 +236,51 @@ class VideoProcessor:
     def list_inline_images(self) -> List[Path]:
         return self._iter_files(self.config.paths.inline_images_dir, SUPPORTED_IMAGE_EXTENSIONS)
 
-    def pick_background(self, used: List[str]) -> Optional[Path]:
-        candidates = [p for p in self.list_background_videos() if p.name not in used]
-        if not candidates:
-            candidates = self.list_background_videos()
+    def pick_background(self, used: List[str], exclude: Iterable[str] = ()) -> Optional[Path]:
+        """Prefer backgrounds not ``used`` today; never return one in ``exclude``."""
+        excluded = set(exclude)
+        available = [p for p in self.list_background_videos() if p.name not in excluded]
+        candidates = [p for p in available if p.name not in used] or available
         if not candidates:
             return None
         return random.choice(candidates)
 
+    def plan_montage(self, background: Path, used: List[str], exclude: Iterable[str] = ()) -> List[Path]:
+        """Clips to play back to back so the background lasts ``montage_seconds``.
+
+        Starts with ``background``; adds clips that can be stream-copied with
+        it first, unused ones before used ones, and loops the selection when
+        the inventory runs out. ``[background]`` when no montage is needed.
+        """
+        target = self.config.montage_seconds
+        first = probe_clip(background) if target else None
+        if first is None or first.duration >= target:
+            return [background]
+
+        excluded = set(exclude) | {background.name}
+        candidates = [p for p in self.list_background_videos() if p.name not in excluded]
+        random.shuffle(candidates)
+        probed = [(path, probe_clip(path)) for path in candidates]
+        ranked = sorted(
+            ((path, info) for path, info in probed if info is not None and info.duration > 0),
+            key=lambda item: (item[1].concat_key != first.concat_key, item[0].name in used),
+        )
+
+        clips, durations = [background], [first.duration]
+        for path, info in ranked:
+            if sum(durations) >= target or len(clips) >= self.config.montage_max_clips:
+                break
+            clips.append(path)
+            durations.append(info.duration)
+        selection = list(zip(clips, durations))
+        index = 0
+        while sum(durations) < target and len(clips) < MAX_MONTAGE_ENTRIES:
+            path, duration = selection[index % len(selection)]
+            clips.append(path)
+            durations.append(duration)
+            index += 1
+        return clips
+
     def pick_music(self) -> Optional[Path]:
         tracks = self.list_music_tracks()
         return random.choice(tracks) if tracks else None
@@ -99,43 +306,124 @@ class VideoProcessor:
         music_path: Optional[Path] = None,
         featured_image: Optional[Path] = None,
         inline_images: Optional[List[Path]] = None,
+        background_clips: Optional[Sequence[Path]] = None,
+        caption_style: Optional[CaptionStyle] = None,
+        template: Optional[VideoTemplate] = None,
     ) -> RenderResult:
+        from moviepy.editor import CompositeVideoClip
+
+        _pillow_compat()
         inline_images = inline_images or []
+        template = template or self.template()
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        logger.info("Rendering video using %s", background_path.name)
+        if background_clips and len(background_clips) > 1:
+            import tempfile
+
+            # Joined at the container level so the background is decoded once,
+            # by the render below, rather than decoded and re-encoded first.
+            with tempfile.TemporaryDirectory(dir=output_path.parent, prefix=".montage-") as scratch:
+                montage_path = Path(scratch) / "background.mp4"
+                with record_stage("render.montage"):
+                    copied = build_montage(background_clips, montage_path, RENDER_FPS)
+                record_count("montage_stream_copy" if copied else "montage_reencoded")
+                logger.info(
+                    "Built background montage from %s clips (%s).",
+                    len(background_clips),
+                    "stream copy" if copied else "re-encoded",
+                )
+                style = self.caption_style(
+                    background_clips, featured_image=featured_image, inline_images=inline_images, template=template
+                )
+                try:
+                    result = self.render_video(
+                        quote,
+                        caption,
+                        montage_path,
+                        output_path,
+                        music_path,
+                        featured_image,
+                        inline_images,
+                        caption_style=style,
+                        template=template,
+                    )
+                except RenderInputError as exc:
+                    if exc.path != montage_path:
+                        raise
+                    # The scratch montage is ours; report the clip it was built around.
+                    raise RenderInputError(background_path, f"montage {exc.reason}") from exc
+            result.background_video = background_path
+            result.background_clips = list(background_clips)
+            return result
+
+        style = caption_style or self.caption_style(
+            [background_path], featured_image=featured_image, inline_images=inline_images, template=template
+        )
+        logger.info(
+            "Rendering video using %s (template %s, caption %s)", background_path.name, template.name, style.placement
+        )
+        font_hits_before = load_font.cache_info().hits
+        font_path = self._template_font(template) or self.font_path
 
-        with VideoFileClip(str(background_path)) as clip:
-            clip = self._prepare_background(clip)
+        with self._open_background(background_path) as clip:
             duration = clip.duration or 30
-
-            caption_clip = self._build_caption_clip(quote, clip.w, clip.h, duration)
-
-            overlays = [clip, caption_clip]
-
-            if featured_image:
-                overlays.append(self._build_featured_clip(featured_image, duration, clip.w, clip.h))
-
-            if inline_images:
-                overlays.extend(self._build_inline_clips(inline_images, duration, clip.w, clip.h))
-
-            video = CompositeVideoClip(overlays)
-
-            if music_path:
-                audio = self._build_audio_track(music_path, duration)
-                if audio:
-                    video = video.set_audio(audio)
-
-            logger.info("Writing rendered video to %s", output_path)
-            video.write_videofile(
-                str(output_path),
-                codec="libx264",
-                audio_codec="aac",
-                fps=30,
-                threads=4,
-                verbose=False,
-                logger=None,
-            )
+            bounds = _segment_bounds(int(round(duration * RENDER_FPS)), self.config.render_segments)
+
+            if len(bounds) > 1:
+                encode_started = time.perf_counter()
+                self._render_segmented(
+                    quote,
+                    background_path,
+                    output_path,
+                    duration,
+                    bounds,
+                    music_path,
+                    featured_image,
+                    inline_images,
+                    style,
+                    template,
+                    font_path,
+                    clip.audio,
+                )
+                encode_seconds = time.perf_counter() - encode_started
+            else:
+                with record_stage("render.overlays"):
+                    plan = self.render_plan(template, clip.w, clip.h, duration, featured_image, inline_images)
+                    overlays = self._build_overlays(
+                        quote, plan, featured_image, inline_images, font_path=font_path, style=style
+                    )
+                    video = CompositeVideoClip([clip, *overlays])
+
+                    if music_path:
+                        audio = self._build_audio_track(music_path, duration)
+                        if audio:
+                            video = video.set_audio(audio)
+
+                profiler = active_profiler()
+                if profiler is not None:
+                    profiler.instrument_render(clip, video)
+
+                logger.info("Writing rendered video to %s", output_path)
+                encode_started = time.perf_counter()
+                with record_stage("render.encode"):
+                    video.write_videofile(
+                        str(output_path),
+                        codec="libx264",
+                        audio_codec="aac",
+                        fps=RENDER_FPS,
+                        threads=get_governor(self.config).encoder_threads(),
+                        verbose=False,
+                        logger=None,
+                    )
+                encode_seconds = time.perf_counter() - encode_started
+
+        frames = int(round(duration * RENDER_FPS))
+        record_count("frames_encoded", frames)
+        record_count("bytes_written", output_path.stat().st_size if output_path.exists() else 0)
+        record_count("font_cache_hits", load_font.cache_info().hits - font_hits_before)
+        run = current_run()
+        if run is not None and encode_seconds > 0:
+            run.gauge("render_fps", frames / encode_seconds)
 
         return RenderResult(
             output_path=output_path,
@@ -145,6 +433,330 @@ class VideoProcessor:
             inline_images=inline_images,
         )
 
+    def _render_segmented(
+        self,
+        quote: str,
+        background_path: Path,
+        output_path: Path,
+        duration: float,
+        bounds: List[Tuple[int, int]],
+        music_path: Optional[Path],
+        featured_image: Optional[Path],
+        inline_images: List[Path],
+        style: CaptionStyle = DEFAULT_STYLE,
+        template: Optional[VideoTemplate] = None,
+        font_path: Optional[Path] = None,
+        background_audio: Optional[AudioClip] = None,
+    ) -> None:
+        """Encode each chunk in its own process, then concat by stream copy.
+
+        The audio is written once and muxed in by the concat: the music bed,
+        or else ``background_audio`` as the single-pass composite would keep.
+        An active profiler gets the frame timings measured in each worker.
+        """
+        import multiprocessing
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+
+        threads = get_governor(self.config).encoder_threads(share=len(bounds))
+        logger.info(
+            "Writing rendered video to %s in %s segments (%s encoder threads each)",
+            output_path,
+            len(bounds),
+            threads,
+        )
+        with tempfile.TemporaryDirectory(dir=output_path.parent, prefix=".segments-") as scratch:
+            scratch_dir = Path(scratch)
+            audio_path = self._write_audio_track(scratch_dir / "audio.m4a", duration, music_path, background_audio)
+
+            profiler = active_profiler()
+            profile_every = profiler.frame_sample_every if profiler is not None else 0
+
+            chunks = [scratch_dir / f"chunk_{index:03d}.mp4" for index in range(len(bounds))]
+            # Spawned rather than forked: the parent runs logging, scheduler and
+            # heartbeat threads whose locks must not be copied into children.
+            context = multiprocessing.get_context("spawn")
+            with record_stage("render.encode"), ProcessPoolExecutor(len(bounds), mp_context=context) as pool:
+                futures = [
+                    pool.submit(
+                        _encode_segment,
+                        self.config,
+                        font_path or self.font_path,
+                        background_path,
+                        quote,
+                        featured_image,
+                        inline_images,
+                        first,
+                        last,
+                        chunk,
+                        threads,
+                        style,
+                        template,
+                        profile_every,
+                    )
+                    for (first, last), chunk in zip(bounds, chunks)
+                ]
+                for (first, _), future in zip(bounds, futures):
+                    timings = future.result()
+                    if profiler is not None and timings is not None:
+                        profiler.merge_frame_timings(timings, first)
+
+            with record_stage("render.concat"):
+                _concat_segments(chunks, audio_path, output_path)
+
+    def render_variants(
+        self,
+        background_path: Path,
+        variants: Sequence[RenderVariant],
+        output_dir: Path,
+        music_path: Optional[Path] = None,
+        workers: Optional[int] = None,
+    ) -> List[RenderResult]:
+        """Render several variants of one post from a single background decode.
+
+        Each background frame is decoded and scaled once, then handed to every
+        variant's compositor; each variant streams into its own ffmpeg encoder
+        so compositing and encoding run in parallel across variants. The music
+        bed (or, without one, the background's own audio) is encoded once and
+        muxed into every output.
+        """
+        import tempfile
+
+        from moviepy.editor import CompositeVideoClip, VideoClip
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+        if not variants:
+            return []
+        if len({variant.name for variant in variants}) != len(variants):
+            raise ValueError("Variant names must be unique")
+
+        _pillow_compat()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Rendering %s variants using %s", len(variants), background_path.name)
+        font_hits_before = load_font.cache_info().hits
+        shared: dict = {"frame": None}
+
+        def cropped(width: int, height: int):
+            def make_frame(t):
+                frame = shared["frame"]
+                top = (frame.shape[0] - height) // 2
+                left = (frame.shape[1] - width) // 2
+                return frame[top : top + height, left : left + width]
+
+            return make_frame
+
+        with self._open_background(background_path) as clip, tempfile.TemporaryDirectory(
+            dir=output_dir, prefix=".variants-"
+        ) as scratch:
+            duration = clip.duration or 30
+            for variant in variants:
+                if variant.size[0] > clip.w or variant.size[1] > clip.h:
+                    raise ValueError(f"Variant {variant.name} size {variant.size} exceeds {clip.w}x{clip.h}")
+
+            audio_path = self._write_audio_track(Path(scratch) / "audio.m4a", duration, music_path, clip.audio)
+
+            # VideoClip probes its size from frame 0, so prime the shared slot.
+            shared["frame"] = clip.get_frame(0)
+            with record_stage("render.overlays"):
+                composites = []
+                for variant in variants:
+                    width, height = variant.size
+                    base = VideoClip(make_frame=cropped(width, height), duration=duration)
+                    template = self.template(variant.template)
+                    # The variant shows the middle rows of the prepared frame.
+                    top = (clip.h - height) // 2
+                    style = self.caption_style(
+                        [background_path],
+                        visible=(top / clip.h, (top + height) / clip.h),
+                        featured_image=variant.featured_image,
+                        inline_images=variant.inline_images,
+                        template=template,
+                    )
+                    plan = self.render_plan(
+                        template, width, height, duration, variant.featured_image, variant.inline_images
+                    )
+                    overlays = self._build_overlays(
+                        variant.quote,
+                        plan,
+                        variant.featured_image,
+                        variant.inline_images,
+                        font_path=variant.font_path or self._template_font(template),
+                        style=style,
+                    )
+                    composites.append(CompositeVideoClip([base, *overlays], size=(width, height)))
+
+            outputs = [output_dir / f"{variant.name}.mp4" for variant in variants]
+            threads = get_governor(self.config).encoder_threads(share=len(variants))
+            writers = [
+                FFMPEG_VideoWriter(
+                    str(path),
+                    variant.size,
+                    RENDER_FPS,
+                    codec="libx264",
+                    audiofile=audio_path,
+                    threads=threads,
+                )
+                for path, variant in zip(outputs, variants)
+            ]
+
+            def composite_and_write(index: int, t: float) -> None:
+                writers[index].write_frame(composites[index].get_frame(t))
+
+            frames = int(duration * RENDER_FPS)
+            encode_started = time.perf_counter()
+            try:
+                with record_stage("render.encode"), ThreadPoolExecutor(
+                    max_workers=workers or len(variants), thread_name_prefix="variant"
+                ) as pool:
+                    for index in range(frames):
+                        t = index / RENDER_FPS
+                        shared["frame"] = clip.get_frame(t)
+                        # Wait for every variant before decoding the next frame so
+                        # the shared frame is never swapped out mid-composite.
+                        for future in [pool.submit(composite_and_write, i, t) for i in range(len(variants))]:
+                            future.result()
+            finally:
+                for writer in writers:
+                    writer.close()
+            encode_seconds = time.perf_counter() - encode_started
+
+        record_count("frames_decoded", frames)
+        record_count("frames_encoded", frames * len(variants))
+        record_count("bytes_written", sum(path.stat().st_size for path in outputs if path.exists()))
+        record_count("font_cache_hits", load_font.cache_info().hits - font_hits_before)
+        run = current_run()
+        if run is not None and encode_seconds > 0:
+            run.gauge("render_fps", frames * len(variants) / encode_seconds)
+
+        return [
+            RenderResult(
+                output_path=path,
+                background_video=background_path,
+                music_track=music_path,
+                featured_image=variant.featured_image,
+                inline_images=list(variant.inline_images),
+                variant=variant.name,
+            )
+            for path, variant in zip(outputs, variants)
+        ]
+
+    # ----------------------------
+    # Templates
+    # ----------------------------
+    def template(self, name: Optional[str] = None) -> VideoTemplate:
+        """The named layout (default ``VIDEO_TEMPLATE``), re-read only when its file changes."""
+        return self.templates.get(name or self.config.video_template)
+
+    def render_plan(
+        self,
+        template: VideoTemplate,
+        width: int,
+        height: int,
+        duration: float,
+        featured_image: Optional[Path],
+        inline_images: Sequence[Path],
+    ) -> RenderPlan:
+        return compile_plan(template, (width, height), duration, featured_image is not None, len(inline_images))
+
+    def _template_font(self, template: VideoTemplate) -> Optional[Path]:
+        """The caption font the template asks for, or ``None`` to use the configured one."""
+        caption = template.caption
+        if not caption.font_family:
+            return None
+        return ensure_google_font(
+            self.config.paths.fonts_dir,
+            caption.font_family,
+            caption.font_weight or self.config.google_font_weight,
+            max_age_days=self.config.font_max_age_days,
+            client=shared_client(self.config.paths.http_cache_dir),
+        )
+
+    # ----------------------------
+    # Caption styling
+    # ----------------------------
+    def caption_style(
+        self,
+        clips: Sequence[Path],
+        visible: Tuple[float, float] = (0.0, 1.0),
+        featured_image: Optional[Path] = None,
+        inline_images: Sequence[Path] = (),
+        template: Optional[VideoTemplate] = None,
+    ) -> CaptionStyle:
+        """Caption slot and colours for ``clips`` from their ingest-time analysis; reads no frames.
+
+        Clips that have not been analysed yet get the white style in the
+        template's first caption slot (the bottom, unless it pins another).
+        """
+        template = template or self.template()
+        slots = template.caption.slots()
+        fallback = replace(DEFAULT_STYLE, placement=next(iter(slots)))
+        if self.config.caption_placement != "auto":
+            return fallback
+        index = self._analysis_index()
+        analyses = [index.get(clip) for clip in clips] if index is not None else []
+        if not analyses or any(analysis is None for analysis in analyses):
+            logger.debug("No analysis for %s - using the default caption style.", [clip.name for clip in clips])
+            return fallback
+        # Keep clear of the slots the template's image layers cover.
+        avoid = template.occupied(featured=featured_image is not None, inline=bool(inline_images))
+        return choose_caption_style(analyses, visible, avoid, slots)  # type: ignore[arg-type]
+
+    def _analysis_index(self) -> Optional[ClipAnalysisIndex]:
+        path = self.config.paths.clip_analysis_file
+        try:
+            stamp = path.stat().st_mtime_ns if path else None
+        except OSError:
+            stamp = None
+        if stamp is None:
+            return None
+        if stamp != self._analysis_stamp:
+            self._analysis = ClipAnalysisIndex(path)  # type: ignore[arg-type]
+            self._analysis_stamp = stamp
+        return self._analysis
+
+    # ----------------------------
+    # Frame cache
+    # ----------------------------
+    @contextlib.contextmanager
+    def _open_background(self, background_path: Path) -> Iterator[VideoClip]:
+        """The prepared background, from the frame cache when it holds this clip."""
+        cached = self.frame_cache.lookup(background_path) if self.frame_cache else None
+        if cached is not None:
+            record_count("frame_cache_hits")
+            with open_cached(cached, background_path) as clip:
+                yield clip
+            return
+        if self.frame_cache is not None:
+            record_count("frame_cache_misses")
+        with contextlib.ExitStack() as stack:
+            try:
+                clip, _ = stack.enter_context(self._open_prepared(background_path))
+            except (OSError, IndexError, KeyError, ValueError) as exc:
+                # Only opening is the input's fault; errors from the body propagate as they are.
+                raise RenderInputError(background_path, f"could not decode: {exc}") from exc
+            yield clip
+
+    @contextlib.contextmanager
+    def _open_prepared(self, background_path: Path) -> Iterator[Tuple[VideoClip, bool]]:
+        """Decode and prepare ``background_path``; yields the clip and whether it has audio."""
+        from moviepy.editor import VideoFileClip
+
+        with VideoFileClip(str(background_path)) as source:
+            with record_stage("render.prepare_background"):
+                clip = self._prepare_background(source)
+            yield clip, source.audio is not None
+
+    def refresh_frame_cache(self, usage: Dict[str, int], wait: bool = False) -> None:
+        """Re-plan the frame cache from background ``usage`` counts, in a background thread unless ``wait``."""
+        if self.frame_cache is None:
+            return
+        _pillow_compat()
+        sources = self.list_background_videos()
+        if wait:
+            self.frame_cache.refresh(usage, sources, self._open_prepared)
+        else:
+            self.frame_cache.request_refresh(usage, sources, self._open_prepared)
+
     # ----------------------------
     # Helpers
     # ----------------------------
@@ -157,20 +769,85 @@ class VideoProcessor:
             clip = clip.subclip(0, max_length)
         return clip
 
-    def _build_caption_clip(self, text: str, width: int, height: int, duration: float) -> ImageClip:
-        img = self._create_caption_image(text, width, height)
-        clip = ImageClip(np.array(img))
-        return clip.set_duration(duration).set_position(("center", "bottom")).margin(
-            bottom=int(height * 0.08), opacity=0
-        )
-
-    def _create_caption_image(self, text: str, width: int, height: int) -> Image.Image:
-        img_width = int(width * 0.9)
-        img_height = int(height * 0.28)
+    def _build_overlays(
+        self,
+        quote: str,
+        plan: RenderPlan,
+        featured_image: Optional[Path],
+        inline_images: List[Path],
+        font_path: Optional[Path] = None,
+        style: CaptionStyle = DEFAULT_STYLE,
+    ) -> List[VideoClip]:
+        """One clip per plan layer, in the template's drawing order."""
+        overlays: List[VideoClip] = []
+        for layer in plan.layers:
+            if isinstance(layer, CaptionPlan):
+                overlays.append(self._build_caption_clip(quote, layer, font_path=font_path, style=style))
+            elif layer.source == "featured" and featured_image:
+                overlays.extend(self._build_image_clips([featured_image], layer))
+            elif layer.source == "inline":
+                overlays.extend(self._build_image_clips(inline_images, layer))
+        return overlays
+
+    def _build_caption_clip(
+        self,
+        text: str,
+        caption: CaptionPlan,
+        font_path: Optional[Path] = None,
+        style: CaptionStyle = DEFAULT_STYLE,
+    ) -> VideoClip:
+        import numpy as np
+        from moviepy.editor import ImageClip
+
+        if self.config.caption_mode == "animated":
+            clip = self._build_animated_caption_clip(text, caption, font_path=font_path, style=style)
+        else:
+            img = self._create_caption_image(text, caption, font_path=font_path, style=style)
+            clip = ImageClip(np.array(img))
+        clip = _apply_timing(clip, caption.timing)
+        # Positioned directly rather than with margin(), which would pad every frame.
+        return clip.set_position(("center", caption.top(style.placement, clip.h)))
+
+    def _build_animated_caption_clip(
+        self,
+        text: str,
+        caption: CaptionPlan,
+        font_path: Optional[Path] = None,
+        style: CaptionStyle = DEFAULT_STYLE,
+    ) -> VideoClip:
+        """Karaoke caption: same layout as the static one, words lit in turn.
+
+        Words are rasterized once into a cached atlas; frames only blit atlas
+        slices, so this costs about as much as the static caption.
+        """
+        from moviepy.editor import VideoClip
+
+        font_file = self._font_file(font_path)
+        options = (style.text_color, style.highlight_color, caption.padding)
+        duration = caption.timing.duration
+        try:
+            atlas = build_atlas(text, font_file, caption.font_size, caption.box, *options)
+        except OSError as exc:
+            logger.warning("Failed to load custom font: %s", exc)
+            atlas = build_atlas(text, "DejaVuSans.ttf", caption.font_size, caption.box, *options)
+        animated = AnimatedCaption(atlas, word_timeline(text.split(), duration), backing=style.backing)
+        mask = VideoClip(animated.mask, ismask=True, duration=duration)
+        return VideoClip(animated.rgb, duration=duration).set_mask(mask)
+
+    def _create_caption_image(
+        self,
+        text: str,
+        caption: CaptionPlan,
+        font_path: Optional[Path] = None,
+        style: CaptionStyle = DEFAULT_STYLE,
+    ) -> Image.Image:
+        from PIL import Image, ImageDraw
+
+        img_width, img_height = caption.box
         image = Image.new("RGBA", (img_width, img_height), (0, 0, 0, 0))
         draw = ImageDraw.Draw(image)
 
-        font = self._load_font(size=int(height * 0.045))
+        font = self._load_font(size=caption.font_size, font_path=font_path)
 
         words = text.split()
         lines: List[str] = []
@@ -178,7 +855,7 @@ class VideoProcessor:
         for word in words:
             test = (current + " " + word).strip()
             bbox = draw.textbbox((0, 0), test, font=font)
-            if bbox[2] - bbox[0] > img_width - 40 and current:
+            if bbox[2] - bbox[0] > img_width - caption.padding and current:
                 lines.append(current)
                 current = word
             else:
@@ -195,50 +872,81 @@ class VideoProcessor:
             line_heights.append(height)
 
         y = (img_height - total_height) // 2
+        placed: List[Tuple[int, int, str]] = []
         for line, line_height in zip(lines, line_heights):
             bbox = draw.textbbox((0, 0), line, font=font)
             x = (img_width - (bbox[2] - bbox[0])) // 2
-            draw.text((x, y), line, font=font, fill="white")
+            placed.append((x, y, line))
             y += line_height
-        return image
 
-    def _load_font(self, size: int) -> ImageFont.ImageFont:
-        if self.font_path and Path(self.font_path).exists():
+        for x, y, line in placed:
+            draw.text((x, y), line, font=font, fill=style.text_color)
+        if style.backing is None or not placed:
+            return image
+
+        ink = [draw.textbbox((x, y), line, font=font) for x, y, line in placed]
+        box = (
+            max(0, min(b[0] for b in ink) - BACKING_PADDING),
+            max(0, min(b[1] for b in ink) - BACKING_PADDING),
+            min(img_width - 1, max(b[2] for b in ink) + BACKING_PADDING),
+            min(img_height - 1, max(b[3] for b in ink) + BACKING_PADDING),
+        )
+        # A separate layer: ImageDraw replaces RGBA pixels rather than blending them.
+        backing = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        ImageDraw.Draw(backing).rounded_rectangle(box, radius=BACKING_PADDING, fill=style.backing)
+        return Image.alpha_composite(backing, image)
+
+    def _font_file(self, font_path: Optional[Path] = None) -> str:
+        font_path = font_path or self.font_path
+        if font_path and Path(font_path).exists():
+            return str(font_path)
+        return "DejaVuSans.ttf"
+
+    def _load_font(self, size: int, font_path: Optional[Path] = None) -> ImageFont.ImageFont:
+        font_file = self._font_file(font_path)
+        if font_file != "DejaVuSans.ttf":
             try:
-                return ImageFont.truetype(str(self.font_path), size)
+                return load_font(font_file, size)
             except Exception as exc:
                 logger.warning("Failed to load custom font: %s", exc)
-        return ImageFont.truetype("DejaVuSans.ttf", size)
+        return load_font("DejaVuSans.ttf", size)
 
-    def _build_featured_clip(self, image_path: Path, duration: float, width: int, height: int) -> ImageClip:
-        image = Image.open(image_path).convert("RGBA")
-        image.thumbnail((int(width * 0.7), int(height * 0.6)))
-        clip = ImageClip(np.array(image)).set_duration(min(duration, 5))
-        return clip.set_position(("center", int(height * 0.12))).crossfadeout(1)
+    def _build_image_clips(self, image_paths: Sequence[Path], layer: ImagePlan) -> List[ImageClip]:
+        """One clip per image, fitted, placed and timed by ``layer``."""
+        import numpy as np
+        from moviepy.editor import ImageClip
+        from PIL import Image
 
-    def _build_inline_clips(self, image_paths: List[Path], duration: float, width: int, height: int) -> List[ImageClip]:
-        num_images = len(image_paths)
-        if num_images == 0:
-            return []
-        segment = max(duration / (num_images + 1), 3)
         clips: List[ImageClip] = []
-        start_time = segment
-        for path in image_paths:
+        for path, timing in zip(image_paths, layer.timings):
             image = Image.open(path).convert("RGBA")
-            image.thumbnail((int(width * 0.8), int(height * 0.5)))
-            clip = (
-                ImageClip(np.array(image))
-                .set_duration(segment)
-                .set_start(start_time)
-                .set_position(("center", "center"))
-                .crossfadein(0.5)
-                .crossfadeout(0.5)
-            )
-            clips.append(clip)
-            start_time += segment * 0.9
+            image.thumbnail(layer.fit)
+            clip = _apply_timing(ImageClip(np.array(image)), timing)
+            clips.append(clip.set_position(layer.position))
         return clips
 
+    def _write_audio_track(
+        self,
+        path: Path,
+        duration: float,
+        music_path: Optional[Path],
+        background_audio: Optional[AudioClip],
+    ) -> Optional[str]:
+        """Encode the audio for renders that mux it separately; ``None`` when there is none.
+
+        Same choice as the single-pass composite: the music bed, or else the
+        background's own audio.
+        """
+        audio = self._build_audio_track(music_path, duration) if music_path else None
+        audio = audio or background_audio
+        if audio is None:
+            return None
+        audio.write_audiofile(str(path), fps=44100, codec="aac", verbose=False, logger=None)
+        return str(path)
+
     def _build_audio_track(self, music_path: Path, duration: float) -> Optional[CompositeAudioClip]:
+        from moviepy.editor import AudioFileClip, CompositeAudioClip
+
         try:
             track = AudioFileClip(str(music_path)).volumex(0.6)
             track = track.set_duration(duration)
@@ -248,4 +956,4 @@ class VideoProcessor:
             return None
 
 
-__all__ = ["VideoProcessor", "RenderResult"]
+__all__ = ["FEED_CROP", "FULL_FRAME", "RenderResult", "RenderVariant", "VideoProcessor"]
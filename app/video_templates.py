@@ -0,0 +1,447 @@
+"""Declarative video templates and the render plans compiled from them.
+
+A template is a JSON file listing layers in drawing order::
+
+    {
+      "name": "default",
+      "layers": [
+        {"type": "caption", "box": [0.9, 0.28], "margin": 0.08, "padding_px": 40,
+         "placement": "auto", "font": {"size": 0.045}},
+        {"type": "featured_image", "fit": [0.7, 0.6], "position": ["center", 0.12],
+         "duration": 5, "fade_out": 1},
+        {"type": "inline_images", "fit": [0.8, 0.5], "position": ["center", "center"],
+         "min_seconds": 3, "overlap": 0.1, "fade_in": 0.5, "fade_out": 0.5}
+      ]
+    }
+
+Geometry is in fractions of the output frame so one template serves every
+variant size; timings are in seconds. Templates are validated once when
+loaded; :func:`compile_plan` turns one into pixel geometry and a timeline
+for a given frame size and duration, cached by the template's hash.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from .clip_analysis import CAPTION_HEIGHT, CAPTION_MARGIN, PLACEMENTS, caption_slots
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_NAME = "default"
+# The layout renders had before templates existed; also used when no file overrides it.
+DEFAULT_TEMPLATE: Dict[str, object] = {
+    "name": DEFAULT_TEMPLATE_NAME,
+    "layers": [
+        {
+            "type": "caption",
+            "box": [0.9, CAPTION_HEIGHT],
+            "margin": CAPTION_MARGIN,
+            "padding_px": 40,
+            "placement": "auto",
+            "font": {"size": 0.045},
+        },
+        {
+            "type": "featured_image",
+            "fit": [0.7, 0.6],
+            "position": ["center", 0.12],
+            "duration": 5,
+            "fade_out": 1,
+        },
+        {
+            "type": "inline_images",
+            "fit": [0.8, 0.5],
+            "position": ["center", "center"],
+            "min_seconds": 3,
+            "overlap": 0.1,
+            "fade_in": 0.5,
+            "fade_out": 0.5,
+        },
+    ],
+}
+
+TEMPLATE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+IMAGE_SOURCES = {"featured_image": "featured", "inline_images": "inline"}
+_TIMING_KEYS = {"start", "duration", "fade_in", "fade_out"}
+_LAYER_KEYS = {
+    "caption": {"type", "box", "margin", "padding_px", "placement", "font"} | _TIMING_KEYS,
+    "featured_image": {"type", "fit", "position"} | _TIMING_KEYS,
+    # Inline images are spread over the video, so they take spacing instead of start/duration.
+    "inline_images": {"type", "fit", "position", "min_seconds", "overlap", "fade_in", "fade_out"},
+}
+_X_KEYWORDS = ("left", "center", "right")
+_Y_KEYWORDS = ("top", "center", "bottom")
+
+Coordinate = Union[str, float]
+PixelCoordinate = Union[str, int]
+
+
+class TemplateError(ValueError):
+    """A template file that cannot be used."""
+
+
+@dataclass(frozen=True)
+class CaptionLayer:
+    box: Tuple[float, float]
+    margin: float
+    padding_px: int
+    # "auto" lets the clip analysis choose among the slots; otherwise the slot to use.
+    placement: str
+    font_size: float
+    font_family: Optional[str]
+    font_weight: Optional[str]
+    start: float
+    duration: Optional[float]
+    fade_in: float
+    fade_out: float
+
+    def slots(self) -> Dict[str, Tuple[float, float]]:
+        """Caption slots as ``(top, bottom)`` fractions that this layer may use."""
+        slots = caption_slots(self.box[1], self.margin)
+        return slots if self.placement == "auto" else {self.placement: slots[self.placement]}
+
+
+@dataclass(frozen=True)
+class ImageLayer:
+    source: str
+    fit: Tuple[float, float]
+    position: Tuple[Coordinate, Coordinate]
+    start: float = 0.0
+    duration: Optional[float] = None
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+    min_seconds: float = 3.0
+    overlap: float = 0.1
+
+    @property
+    def slot(self) -> str:
+        """Caption slot this layer's top edge falls in."""
+        y = self.position[1]
+        if isinstance(y, str):
+            return y
+        return "top" if y < 1 / 3 else "center" if y < 2 / 3 else "bottom"
+
+
+@dataclass(frozen=True)
+class VideoTemplate:
+    """A validated template; equal (and hashed) by name and content digest only."""
+
+    name: str
+    digest: str
+    caption: CaptionLayer = field(compare=False)
+    # Drawing order; the caption is one of them.
+    layers: Tuple[Union[CaptionLayer, ImageLayer], ...] = field(compare=False)
+
+    def occupied(self, featured: bool, inline: bool) -> List[str]:
+        """Caption slots covered by image layers that will have an image."""
+        present = {"featured": featured, "inline": inline}
+        return sorted({layer.slot for layer in self.layers if isinstance(layer, ImageLayer) and present[layer.source]})
+
+
+@dataclass(frozen=True)
+class LayerTiming:
+    start: float
+    duration: float
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+
+
+@dataclass(frozen=True)
+class CaptionPlan:
+    box: Tuple[int, int]
+    font_size: int
+    # Lines wrap this many pixels short of the box width.
+    padding: int
+    margin: int
+    frame_height: int
+    timing: LayerTiming
+
+    def top(self, placement: str, caption_height: int) -> int:
+        """Caption ``y`` for a caption ``caption_height`` pixels tall in ``placement``."""
+        if placement == "top":
+            return self.margin
+        if placement == "center":
+            return (self.frame_height - caption_height) // 2
+        return self.frame_height - self.margin - caption_height
+
+
+@dataclass(frozen=True)
+class ImagePlan:
+    source: str
+    fit: Tuple[int, int]
+    position: Tuple[PixelCoordinate, PixelCoordinate]
+    # One per image drawn by this layer.
+    timings: Tuple[LayerTiming, ...]
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """A template resolved to pixels and seconds for one frame size and duration."""
+
+    template: str
+    digest: str
+    size: Tuple[int, int]
+    duration: float
+    caption: CaptionPlan
+    layers: Tuple[Union[CaptionPlan, ImagePlan], ...]
+
+
+# ----------------------------
+# Parsing and validation
+# ----------------------------
+def _number(
+    where: str, raw: dict, key: str, default: Optional[float], low: float = 0.0, high: Optional[float] = None
+) -> Optional[float]:
+    value = raw.get(key, default)
+    if value is None and default is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TemplateError(f"{where}: {key} must be a number, got {value!r}")
+    if value < low or (high is not None and value > high):
+        bound = f"between {low} and {high}" if high is not None else f"at least {low}"
+        raise TemplateError(f"{where}: {key} must be {bound}, got {value!r}")
+    return float(value)
+
+
+def _fractions(where: str, raw: dict, key: str, default: Optional[Tuple[float, float]] = None) -> Tuple[float, float]:
+    value = raw.get(key, default)
+    if (
+        not isinstance(value, (list, tuple))
+        or len(value) != 2
+        or not all(isinstance(v, (int, float)) and not isinstance(v, bool) and 0 < v <= 1 for v in value)
+    ):
+        raise TemplateError(f"{where}: {key} must be two fractions of the frame in (0, 1], got {value!r}")
+    return float(value[0]), float(value[1])
+
+
+def _position(where: str, raw: dict) -> Tuple[Coordinate, Coordinate]:
+    value = raw.get("position", ["center", "center"])
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise TemplateError(f"{where}: position must be [x, y], got {value!r}")
+    coordinates: List[Coordinate] = []
+    for axis, keywords, coordinate in (("x", _X_KEYWORDS, value[0]), ("y", _Y_KEYWORDS, value[1])):
+        if isinstance(coordinate, str) and coordinate in keywords:
+            coordinates.append(coordinate)
+        elif isinstance(coordinate, (int, float)) and not isinstance(coordinate, bool) and 0 <= coordinate < 1:
+            coordinates.append(float(coordinate))
+        else:
+            raise TemplateError(
+                f"{where}: position {axis} must be one of {', '.join(keywords)} or a fraction in [0, 1), "
+                f"got {coordinate!r}"
+            )
+    return coordinates[0], coordinates[1]
+
+
+def _timing(where: str, raw: dict) -> Dict[str, Optional[float]]:
+    return {
+        "start": _number(where, raw, "start", 0.0),
+        "duration": _number(where, raw, "duration", None, low=0.1),
+        "fade_in": _number(where, raw, "fade_in", 0.0),
+        "fade_out": _number(where, raw, "fade_out", 0.0),
+    }
+
+
+def _caption_layer(where: str, raw: dict) -> CaptionLayer:
+    font = raw.get("font", {})
+    if not isinstance(font, dict) or set(font) - {"size", "family", "weight"}:
+        raise TemplateError(f"{where}: font takes size, family and weight, got {font!r}")
+    if font.get("family") is not None and not isinstance(font["family"], str):
+        raise TemplateError(f"{where}: font family must be a string, got {font['family']!r}")
+    if font.get("weight") is not None and not isinstance(font["weight"], (str, int)):
+        raise TemplateError(f"{where}: font weight must be a string such as \"600\", got {font['weight']!r}")
+    placement = raw.get("placement", "auto")
+    if placement != "auto" and placement not in PLACEMENTS:
+        raise TemplateError(f"{where}: placement must be auto or one of {', '.join(PLACEMENTS)}, got {placement!r}")
+    box = _fractions(where, raw, "box", (0.9, CAPTION_HEIGHT))
+    margin = _number(where, raw, "margin", CAPTION_MARGIN, high=0.5)
+    if margin + box[1] > 1:
+        raise TemplateError(f"{where}: margin plus box height must fit in the frame")
+    padding = raw.get("padding_px", 40)
+    if isinstance(padding, bool) or not isinstance(padding, int) or padding < 0:
+        raise TemplateError(f"{where}: padding_px must be a whole number of pixels, got {padding!r}")
+    return CaptionLayer(
+        box=box,
+        margin=margin,
+        padding_px=padding,
+        placement=placement,
+        font_size=_number(where, font, "size", 0.045, low=0.005, high=0.5),
+        font_family=font.get("family"),
+        font_weight=str(font["weight"]) if font.get("weight") is not None else None,
+        **_timing(where, raw),  # type: ignore[arg-type]
+    )
+
+
+def _image_layer(where: str, kind: str, raw: dict) -> ImageLayer:
+    common = {"source": IMAGE_SOURCES[kind], "fit": _fractions(where, raw, "fit"), "position": _position(where, raw)}
+    if kind == "inline_images":
+        return ImageLayer(
+            **common,  # type: ignore[arg-type]
+            fade_in=_number(where, raw, "fade_in", 0.0),
+            fade_out=_number(where, raw, "fade_out", 0.0),
+            min_seconds=_number(where, raw, "min_seconds", 3.0, low=0.1),
+            overlap=_number(where, raw, "overlap", 0.1, high=0.9),
+        )
+    return ImageLayer(**common, **_timing(where, raw))  # type: ignore[arg-type]
+
+
+def parse_template(raw: object, name: str) -> VideoTemplate:
+    """Validate a decoded template; raises :class:`TemplateError` naming the offending layer and key."""
+    if not isinstance(raw, dict) or not isinstance(raw.get("layers"), list):
+        raise TemplateError(f"Template {name}: expected an object with a layers list")
+    unknown = set(raw) - {"name", "description", "layers"}
+    if unknown:
+        raise TemplateError(f"Template {name}: unknown keys {', '.join(sorted(unknown))}")
+    layers: List[Union[CaptionLayer, ImageLayer]] = []
+    for index, layer in enumerate(raw["layers"]):
+        where = f"Template {name} layer {index}"
+        kind = layer.get("type") if isinstance(layer, dict) else None
+        if kind not in _LAYER_KEYS:
+            raise TemplateError(f"{where}: type must be one of {', '.join(_LAYER_KEYS)}, got {kind!r}")
+        unknown = set(layer) - _LAYER_KEYS[kind]
+        if unknown:
+            raise TemplateError(f"{where} ({kind}): unknown keys {', '.join(sorted(unknown))}")
+        layers.append(_caption_layer(where, layer) if kind == "caption" else _image_layer(where, kind, layer))
+    captions = [layer for layer in layers if isinstance(layer, CaptionLayer)]
+    if len(captions) != 1:
+        raise TemplateError(f"Template {name}: needs exactly one caption layer, found {len(captions)}")
+    # Canonical JSON, so formatting-only edits keep the digest (and cached plans).
+    digest = hashlib.sha1(json.dumps(raw, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+    return VideoTemplate(name=name, digest=digest, caption=captions[0], layers=tuple(layers))
+
+
+def load_template(directory: Optional[Path], name: str) -> VideoTemplate:
+    """``<directory>/<name>.json``; the built-in default when ``name`` is ``default`` and there is no such file."""
+    if not TEMPLATE_NAME.match(name):
+        raise TemplateError(f"Template names may only use letters, digits, '-' and '_': {name!r}")
+    path = directory / f"{name}.json" if directory else None
+    if path is None or not path.exists():
+        if name == DEFAULT_TEMPLATE_NAME:
+            return parse_template(DEFAULT_TEMPLATE, name)
+        raise TemplateError(f"Template {name!r} not found in {directory}")
+    try:
+        raw = json.loads(path.read_text())
+    except (OSError, ValueError) as exc:
+        raise TemplateError(f"Template {name}: cannot read {path}: {exc}") from exc
+    return parse_template(raw, name)
+
+
+class TemplateLibrary:
+    """Templates by name, re-read only when their file changes.
+
+    A file that turns invalid keeps serving its last good version (or the
+    default) so a bad edit never fails a scheduled render.
+    """
+
+    def __init__(self, directory: Optional[Path]):
+        self.directory = directory
+        self._loaded: Dict[str, Tuple[Optional[int], VideoTemplate]] = {}
+
+    def _stamp(self, name: str) -> Optional[int]:
+        if self.directory is None:
+            return None
+        try:
+            return (self.directory / f"{name}.json").stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, name: str) -> VideoTemplate:
+        stamp = self._stamp(name)
+        cached = self._loaded.get(name)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            template = load_template(self.directory, name)
+        except TemplateError as exc:
+            fallback = cached[1] if cached else load_template(None, DEFAULT_TEMPLATE_NAME)
+            logger.error("%s - rendering with template %s.", exc, fallback.name)
+            template = fallback
+        else:
+            logger.info("Loaded video template %s (%s).", name, template.digest)
+        self._loaded[name] = (stamp, template)
+        return template
+
+
+# ----------------------------
+# Compilation
+# ----------------------------
+def _layer_timing(layer: Union[CaptionLayer, ImageLayer], duration: float) -> LayerTiming:
+    start = min(layer.start, duration)
+    length = duration - start if layer.duration is None else min(layer.duration, duration - start)
+    return LayerTiming(start, length, layer.fade_in, layer.fade_out)
+
+
+def _pixels(coordinate: Coordinate, extent: int) -> PixelCoordinate:
+    return coordinate if isinstance(coordinate, str) else int(extent * coordinate)
+
+
+@lru_cache(maxsize=128)
+def compile_plan(
+    template: VideoTemplate, size: Tuple[int, int], duration: float, featured: bool, inline_count: int
+) -> RenderPlan:
+    """Pixel geometry and timeline of ``template`` at ``size`` for ``duration`` seconds.
+
+    Cached on the template's digest and the arguments, so renders of the same
+    layout, size and length (every segment worker and retry) reuse one plan.
+    """
+    width, height = size
+    caption: Optional[CaptionPlan] = None
+    layers: List[Union[CaptionPlan, ImagePlan]] = []
+    for layer in template.layers:
+        if isinstance(layer, CaptionLayer):
+            caption = CaptionPlan(
+                box=(int(width * layer.box[0]), int(height * layer.box[1])),
+                font_size=int(height * layer.font_size),
+                padding=layer.padding_px,
+                margin=int(height * layer.margin),
+                frame_height=height,
+                timing=_layer_timing(layer, duration),
+            )
+            layers.append(caption)
+            continue
+        if layer.source == "featured":
+            if not featured:
+                continue
+            timings: Tuple[LayerTiming, ...] = (_layer_timing(layer, duration),)
+        else:
+            if not inline_count:
+                continue
+            # Evenly spread, each shown for one slot and overlapping the next a little.
+            segment = max(duration / (inline_count + 1), layer.min_seconds)
+            step = segment * (1 - layer.overlap)
+            timings = tuple(
+                LayerTiming(segment + index * step, segment, layer.fade_in, layer.fade_out)
+                for index in range(inline_count)
+            )
+        layers.append(
+            ImagePlan(
+                source=layer.source,
+                fit=(int(width * layer.fit[0]), int(height * layer.fit[1])),
+                position=(_pixels(layer.position[0], width), _pixels(layer.position[1], height)),
+                timings=timings,
+            )
+        )
+    assert caption is not None  # parse_template guarantees one
+    return RenderPlan(template.name, template.digest, (width, height), duration, caption, tuple(layers))
+
+
+__all__ = [
+    "CaptionPlan",
+    "DEFAULT_TEMPLATE",
+    "DEFAULT_TEMPLATE_NAME",
+    "ImagePlan",
+    "LayerTiming",
+    "RenderPlan",
+    "TemplateError",
+    "TemplateLibrary",
+    "VideoTemplate",
+    "compile_plan",
+    "load_template",
+    "parse_template",
+]
@@ -0,0 +1,154 @@
+"""Per-stage time budgets with cancellation of stuck work."""
+
+from __future__ import annotations
+
+import ctypes
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from .metrics import REGISTRY, current_run
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeout(Exception):
+    """Raised in place of whatever a stage was doing when its budget ran out."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Stage '{stage}' exceeded its {budget:g}s budget")
+        self.stage = stage
+        self.budget = budget
+
+
+class _Cancelled(BaseException):
+    # Injected into the stalled thread. A BaseException so it is not swallowed
+    # by ``except Exception`` fallbacks on the way out; stage_budget turns it
+    # into a StageTimeout.
+    pass
+
+
+def _children(pid: int) -> List[int]:
+    children: List[int] = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as handle:
+                children.extend(int(child) for child in handle.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def thread_descendants(native_id: int) -> List[int]:
+    """PIDs started by one thread of this process (ffmpeg, pool workers) and their descendants."""
+    try:
+        with open(f"/proc/self/task/{native_id}/children") as handle:
+            pending = [int(child) for child in handle.read().split()]
+    except OSError:
+        return []
+    found: List[int] = []
+    while pending:
+        pid = pending.pop()
+        found.append(pid)
+        pending.extend(_children(pid))
+    return found
+
+
+def _kill(pids: List[int]) -> None:
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class _Guard:
+    def __init__(self, stage: str, budget: float):
+        self.stage = stage
+        self.budget = budget
+        self.thread_ident = threading.get_ident()
+        self.native_id = threading.get_native_id()
+        self.run = current_run()
+        self.fired = False
+        self.done = False
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(budget, self._fire)
+        self._timer.daemon = True
+
+    def arm(self) -> None:
+        self._timer.start()
+
+    def disarm(self) -> bool:
+        """Stop the timer; returns ``True`` if the budget was exceeded."""
+        self._timer.cancel()
+        with self._lock:
+            self.done = True
+            if self.fired:
+                # Drop the injected exception if it has not been delivered yet.
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_ident), None)
+            return self.fired
+
+    def _fire(self) -> None:
+        with self._lock:
+            if self.done:
+                return
+            self.fired = True
+            account = self.run.record.account if self.run else ""
+            REGISTRY.inc("stage_overruns_total", stage=self.stage, account=account)
+            if self.run is not None:
+                self.run.count("stage_overruns")
+                self.run.record.counters[f"overrun.{self.stage}"] = self.budget
+            # Killing the thread's subprocesses unblocks pipe reads/writes so the
+            # injected exception is raised promptly.
+            children = thread_descendants(self.native_id)
+            logger.error(
+                "Stage '%s' exceeded its %ss budget - cancelling (killing %s subprocess(es)).",
+                self.stage,
+                self.budget,
+                len(children),
+            )
+            _kill(children)
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(self.thread_ident), ctypes.py_object(_Cancelled)
+            )
+
+
+@contextmanager
+def stage_budget(stage: str, seconds: Optional[float]) -> Iterator[None]:
+    """Cancel the enclosed block with :class:`StageTimeout` after ``seconds``.
+
+    Cancellation kills subprocesses started by the calling thread and raises
+    in that thread as soon as it runs Python code again; a thread blocked in C
+    without a subprocess to kill (e.g. a socket read with no timeout) is only
+    interrupted once that call returns. ``seconds`` of 0 or ``None`` disables
+    the budget.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    guard = _Guard(stage, seconds)
+    guard.arm()
+    try:
+        yield
+    except BaseException as exc:
+        if _disarm(guard):
+            cause = None if isinstance(exc, _Cancelled) else exc
+            raise StageTimeout(stage, seconds) from cause
+        raise
+    if _disarm(guard):
+        raise StageTimeout(stage, seconds)
+
+
+def _disarm(guard: _Guard) -> bool:
+    try:
+        return guard.disarm()
+    except _Cancelled:
+        # Delivered while disarming; the second call cannot be interrupted again.
+        guard.disarm()
+        return True
+
+
+__all__ = ["StageTimeout", "stage_budget", "thread_descendants"]
@@ -0,0 +1,139 @@
+"""Render worker processes fed by the durable job queue."""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from .config import AppConfig
+from .config_service import ConfigService
+from .jobqueue import Job, JobQueue
+from .resources import get_governor
+from .runner import FAILED_STATUSES, AutoPoster
+
+logger = logging.getLogger(__name__)
+
+
+def job_payload(config: AppConfig) -> dict:
+    """Describe how a worker should rebuild ``config`` for a post job."""
+    return {
+        "config_file": str(config.config_file) if config.config_file else None,
+        "prefer_file": config.prefer_file,
+    }
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class RenderWorker:
+    """Leases post jobs, runs ``AutoPoster.run_once`` and reports the outcome.
+
+    Posters are cached per config file so fonts and other warm state survive
+    across jobs. A heartbeat thread keeps the lease alive while rendering; if
+    the worker dies the lease expires and another worker retries the job.
+    """
+
+    def __init__(self, config: AppConfig, queue: JobQueue, worker_id: Optional[str] = None):
+        self.config = config
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self._posters: Dict[str, AutoPoster] = {}
+        self._config_services: Dict[str, ConfigService] = {}
+        self._stop = threading.Event()
+        self.governor = get_governor(config)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _poster_for(self, job: Job) -> AutoPoster:
+        config_file = job.payload.get("config_file") or ""
+        poster = self._posters.get(config_file)
+        if poster is None:
+            if config_file:
+                service = ConfigService(Path(config_file), prefer_file=bool(job.payload.get("prefer_file")))
+            else:
+                service = ConfigService(config=self.config)
+            poster = AutoPoster(service.get())
+            service.add_listener(poster.on_config_changed)
+            self._config_services[config_file] = service
+            self._posters[config_file] = poster
+        else:
+            # Pick up config edits between jobs without restarting the worker.
+            self._config_services[config_file].refresh()
+        return poster
+
+    def _heartbeat(self, job: Job, done: threading.Event, lost: threading.Event) -> None:
+        settings = self.config.job_queue
+        while not done.wait(settings.heartbeat_seconds):
+            try:
+                if not self.queue.heartbeat(job.id, self.worker_id, settings.lease_seconds):
+                    logger.warning("Lost lease on job %s; another worker may retry it.", job.id)
+                    lost.set()
+                    return
+            except Exception as exc:
+                logger.warning("Heartbeat for job %s failed: %s", job.id, exc)
+
+    def _holds_lease(self, job: Job, lost: threading.Event) -> bool:
+        """Renew the lease once more before posting; a job we no longer own must not post."""
+        if lost.is_set():
+            return False
+        try:
+            return self.queue.heartbeat(job.id, self.worker_id, self.config.job_queue.lease_seconds)
+        except Exception as exc:
+            logger.warning("Could not confirm the lease on job %s: %s", job.id, exc)
+            return False
+
+    def run_one(self) -> bool:
+        """Process a single job if one is available. Returns ``True`` if a job was leased."""
+        # Leave the job queued for another worker (or later) while this
+        # container is short of memory or CPU; renders in sibling worker
+        # processes count too.
+        if not self.governor.has_capacity(weight=self.config.render_segments, shared=True):
+            logger.debug("Not leasing: container resources are busy.")
+            return False
+        job = self.queue.lease(self.worker_id, self.config.job_queue.lease_seconds)
+        if job is None:
+            return False
+
+        logger.info(
+            "Worker %s leased job %s for account %s (attempt %s/%s).",
+            self.worker_id,
+            job.id,
+            job.account,
+            job.attempts,
+            job.max_attempts,
+        )
+        done = threading.Event()
+        lost = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done, lost), daemon=True)
+        heartbeat.start()
+        try:
+            poster = self._poster_for(job)
+            poster.run_once(may_upload=lambda: self._holds_lease(job, lost))
+        except Exception as exc:
+            logger.exception("Job %s failed: %s", job.id, exc)
+            self.queue.fail(job.id, self.worker_id, repr(exc))
+        else:
+            if poster.last_status in FAILED_STATUSES:
+                logger.warning("Job %s did not post: %s.", job.id, poster.last_status)
+                self.queue.fail(job.id, self.worker_id, poster.last_status)
+            else:
+                self.queue.complete(job.id, self.worker_id)
+        finally:
+            done.set()
+            heartbeat.join(timeout=5)
+        return True
+
+    def run_forever(self) -> None:
+        logger.info("Render worker %s polling for jobs.", self.worker_id)
+        while not self._stop.is_set():
+            if not self.run_one():
+                self._stop.wait(self.config.job_queue.poll_seconds)
+
+
+__all__ = ["RenderWorker", "default_worker_id", "job_payload"]
@@ -0,0 +1,63 @@
+"""Run the render benchmark suite or compare results against a baseline."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from contextlib import ExitStack
+from pathlib import Path
+
+from app.benchmarks import compare, load_results, run_suite, save_results
+from app.profiling import Profiler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the TikTok poster render path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Generate synthetic inputs and run the suite.")
+    run.add_argument("--output", type=Path, default=Path("bench_results.json"), help="Where to write results JSON.")
+    run.add_argument("--work-dir", type=Path, help="Directory for synthetic assets and renders (reused if present).")
+    run.add_argument("--repeats", type=int, default=5, help="Repeats for the fast benchmarks.")
+    run.add_argument("--render-repeats", type=int, default=1, help="Repeats for each full render.")
+    run.add_argument("--skip-render", action="store_true", help="Only run the bookkeeping benchmarks.")
+    run.add_argument("--profile", action="store_true", help="Write profiles next to the results file.")
+    run.add_argument("--baseline", type=Path, help="Compare against this results file after running.")
+    run.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown treated as a regression.")
+
+    cmp = sub.add_parser("compare", help="Compare two results files.")
+    cmp.add_argument("baseline", type=Path)
+    cmp.add_argument("current", type=Path)
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown treated as a regression.")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    if args.command == "run":
+        with ExitStack() as stack:
+            profiler = stack.enter_context(Profiler()) if args.profile else None
+            results = run_suite(
+                work_dir=args.work_dir,
+                repeats=args.repeats,
+                render_repeats=args.render_repeats,
+                include_render=not args.skip_render,
+            )
+        if profiler:
+            profiler.write(args.output)
+        save_results(results, args.output)
+        for name, stats in results["results"].items():
+            print(f"{name:40} median {stats['median']:.4f}s")
+        if not args.baseline:
+            return
+        baseline, current = load_results(args.baseline), results
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    report, regressions = compare(baseline, current, threshold=args.threshold)
+    print(report)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
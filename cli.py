@@ -3,18 +3,20 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
 
 from app.config import AppConfig, load_config
-from app.runner import AutoPoster
-from app.scheduler import SchedulerService
+
+# Command implementations import their dependencies lazily: show-config must not
+# pay for moviepy/openai, and only the scheduler needs apscheduler.
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="AI-powered TikTok auto poster")
     parser.add_argument(
         "command",
-        choices=["run-once", "schedule", "show-config"],
+        choices=["run-once", "schedule", "worker", "replenish", "simulate", "loadtest", "show-config"],
         help="Action to perform.",
     )
     parser.add_argument(
@@ -22,6 +24,77 @@ def parse_args() -> argparse.Namespace:
         type=Path,
         help="Path to config.txt file (overrides CONFIG_FILE env).",
     )
+    parser.add_argument(
+        "--account",
+        type=Path,
+        action="append",
+        default=[],
+        help="Per-account config file for 'schedule'; repeat to run several accounts on a shared render pool.",
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="Identifier recorded on leased jobs by 'worker' (defaults to hostname-pid).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="For 'run-once': write cProfile, folded-stack and per-frame/RSS profiles next to the output video.",
+    )
+    parser.add_argument(
+        "--days",
+        type=float,
+        default=1.0,
+        help="For 'simulate': length of the simulated period in days.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="For 'simulate': render workers (defaults to RENDER_WORKERS with --account, otherwise 1).",
+    )
+    parser.add_argument(
+        "--clones",
+        type=int,
+        default=1,
+        help="For 'simulate': simulate this many copies of each account; for 'loadtest': accounts to drive.",
+    )
+    parser.add_argument(
+        "--stage",
+        action="append",
+        default=[],
+        help="For 'simulate': stage duration distribution such as render=lognormal:90,0.3; "
+        "repeat per stage. Without it, durations are replayed from runs.jsonl.",
+    )
+    parser.add_argument(
+        "--runs-file",
+        type=Path,
+        help="For 'simulate': recorded run metrics to replay (defaults to LOGS_DIR/runs.jsonl).",
+    )
+    parser.add_argument("--posts", type=int, default=10, help="For 'loadtest': number of scheduled runs to fire.")
+    parser.add_argument("--rate", type=float, default=360.0, help="For 'loadtest': runs fired per hour.")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="For 'loadtest': seconds added to every stand-in response."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="For 'loadtest': fraction of stand-in requests that fail."
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0.0,
+        help="For 'loadtest': KiB/s for stand-in downloads and uploads (0 is unthrottled).",
+    )
+    parser.add_argument(
+        "--clip-seconds", type=float, default=3.0, help="For 'loadtest': length of the synthetic background clips."
+    )
+    parser.add_argument(
+        "--seed", type=int, help="For 'simulate'/'loadtest': random seed for jitter, durations and injected errors."
+    )
+    parser.add_argument("--json", action="store_true", help="For 'simulate'/'loadtest': print the report as JSON.")
+    parser.add_argument(
+        "--import-report",
+        action="store_true",
+        help="Re-run the command under -X importtime and print a summary of import costs.",
+    )
     return parser.parse_args()
 
 
@@ -33,19 +106,121 @@ def load_app_config(path: Path | None) -> AppConfig:
 
 def main() -> None:
     args = parse_args()
+
+    if args.import_report:
+        from app.importtime import run_with_import_report
+
+        argv = [arg for arg in sys.argv if arg != "--import-report"]
+        raise SystemExit(run_with_import_report(argv))
+
     config = load_app_config(args.config)
 
     if args.command == "show-config":
         print(config.config_json)
         return
 
-    poster = AutoPoster(config)
+    if args.command in ("run-once", "schedule", "worker"):
+        from app.config_service import validate_config
+
+        # The same checks a hot reload gets, so a bad value fails here rather than at the first render.
+        try:
+            validate_config(config)
+        except ValueError as exc:
+            raise SystemExit(f"Invalid configuration: {exc}") from exc
+
+    if args.command == "replenish":
+        from app.logging_utils import configure_logging
+        from app.replenish import AssetReplenisher
+        from app.state import StateManager
+
+        configure_logging(config.paths.logs_dir)
+        state_manager = StateManager(config.paths.state_file, config.paths.backups_dir)
+        try:
+            AssetReplenisher(config, state_manager).run_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.command == "simulate":
+        import dataclasses
+        import json
 
-    if args.command == "run-once":
-        poster.run_once()
+        from app.scheduler import load_account_configs
+        from app.simulation import SchedulerSimulation, duration_model
+
+        accounts = load_account_configs(args.account) if args.account else [config]
+        if args.clones > 1:
+            accounts = [
+                dataclasses.replace(account, account_name=f"{account.account_name}-{index}")
+                for account in accounts
+                for index in range(1, args.clones + 1)
+            ]
+        workers = args.workers or (config.render_workers if args.account else 1)
+        durations = duration_model(args.runs_file or config.paths.logs_dir / "runs.jsonl", args.stage)
+        report = SchedulerSimulation(accounts, workers, durations, seed=args.seed).run(args.days)
+        print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+        return
+
+    if args.command == "loadtest":
+        import dataclasses
+        import json
+
+        from app.loadtest import ENDPOINTS, EndpointProfile, run_load_test
+
+        profile = EndpointProfile(latency_seconds=args.latency, error_rate=args.error_rate)
+        throttled = dataclasses.replace(profile, bandwidth_bytes_per_second=args.bandwidth * 1024)
+        profiles = {name: throttled if name in ("pexels_download", "upload") else profile for name in ENDPOINTS}
+        report = run_load_test(
+            posts=args.posts,
+            rate_per_hour=args.rate,
+            accounts=max(1, args.clones),
+            profiles=profiles,
+            clip_seconds=args.clip_seconds,
+            seed=args.seed or 0,
+        )
+        print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+        return
+
+    if args.command == "run-once" and args.profile:
+        from datetime import datetime
+
+        from app.profiling import Profiler
+        from app.runner import AutoPoster
+
+        poster = AutoPoster(config)
+        with Profiler() as profiler:
+            output = poster.run_once()
+        stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        profiler.write(output or config.paths.output_dir / f"profile_{stamp}.mp4")
+    elif args.command == "run-once":
+        from app.runner import AutoPoster
+
+        AutoPoster(config).run_once()
+    elif args.command == "schedule" and args.account:
+        from app.jobqueue import open_queue
+        from app.scheduler import MultiAccountScheduler, load_account_configs
+
+        queue = open_queue(config) if config.job_queue.enabled else None
+        MultiAccountScheduler(load_account_configs(args.account), workers=config.render_workers, queue=queue).start()
     elif args.command == "schedule":
+        from app.scheduler import SchedulerService
+
         scheduler = SchedulerService(config)
         scheduler.start()
+    elif args.command == "worker":
+        from app.jobqueue import open_queue
+        from app.logging_utils import configure_logging
+        from app.scheduler import start_metrics_server
+        from app.worker import RenderWorker
+
+        configure_logging(config.paths.logs_dir)
+        queue = open_queue(config)
+        worker = RenderWorker(config, queue, worker_id=args.worker_id)
+        start_metrics_server(config.metrics_port, lambda: {"worker": worker.worker_id, "queue_depth": queue.depth()})
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
@@ -2,12 +2,18 @@
 
 from __future__ import annotations
 
+import dataclasses
 from pathlib import Path
 from typing import Optional
 
+from app.config_service import get_config_service
+from app.upload import VideoUploader
+
+
 def upload_to_tiktok(video_path: str, caption: str, session_id: Optional[str] = None) -> bool:
-    config = load_config()
+    # The cached service only re-parses config.txt when it changes on disk.
+    config = get_config_service().get()
     if session_id:
-        config.tiktok_session_id = session_id  # type: ignore[attr-defined]
+        config = dataclasses.replace(config, tiktok_session_id=session_id)
     uploader = VideoUploader(config)
     return uploader.upload(Path(video_path), caption)